@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+"""Cold-start benchmark with a startup budget.
+
+Starts fresh interpreters for ``main.py --help`` and ``import downloader``
+and compares their median wall time, minus that of a bare interpreter, with
+a budget in milliseconds. ``-X importtime`` additionally checks that none of
+the heavy dependencies (yt-dlp, Playwright, requests, curl_cffi, rich's
+table) are imported at start-up; they are loaded on first use.
+
+The exit code is 1 if a budget is exceeded or a heavy module is imported
+eagerly, so the script can guard against regressions in CI. With ``--out``
+the result is also appended as one line to a JSONL file.
+
+Run with: ``python bench_startup.py --runs 9 --out startup.jsonl``
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent
+
+# modules that must only be imported once they are actually used
+HEAVY = ("yt_dlp", "playwright", "requests", "curl_cffi", "rich.table")
+
+# name -> interpreter arguments
+COMMANDS = {
+    "help": ["main.py", "--help"],
+    "import_downloader": ["-c", "import downloader"],
+}
+
+
+def _run(args: list[str], env: dict) -> float:
+    start = time.perf_counter()
+    subprocess.run([sys.executable, *args], cwd=ROOT, env=env, capture_output=True, check=False)
+    return time.perf_counter() - start
+
+
+def _median_ms(args: list[str], runs: int, env: dict) -> float:
+    _run(args, env)  # warm the OS file cache and write bytecode
+    return statistics.median(_run(args, env) for _ in range(runs)) * 1000
+
+
+def _heavy_imports(args: list[str], env: dict) -> list[str]:
+    """Return the heavy top-level modules imported by ``args``."""
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", *args], cwd=ROOT, env=env, capture_output=True, text=True
+    )
+    found = set()
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        name = line.rsplit("|", 1)[-1].strip()
+        found.update(h for h in HEAVY if name == h or name.startswith(h + "."))
+    return sorted(found)
+
+
+def run(args) -> dict:
+    env = dict(os.environ)
+    # bytecode caching is part of a normal start
+    env.pop("PYTHONDONTWRITEBYTECODE", None)
+    bare = _median_ms(["-c", "pass"], args.runs, env)
+    budgets = {"help": args.help_budget, "import_downloader": args.import_budget}
+    result = {"ts": time.time(), "python_ms": round(bare, 1), "commands": {}, "failures": []}
+    for name, cmd in COMMANDS.items():
+        overhead = _median_ms(cmd, args.runs, env) - bare
+        heavy = _heavy_imports(cmd, env)
+        result["commands"][name] = {"ms": round(overhead, 1), "budget_ms": budgets[name], "heavy": heavy}
+        if overhead > budgets[name]:
+            result["failures"].append(f"{name}: {overhead:.0f} ms > {budgets[name]:.0f} ms")
+        if heavy:
+            result["failures"].append(f"{name}: lädt {', '.join(heavy)} beim Start")
+    return result
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Startzeit-Benchmark mit Budget")
+    parser.add_argument("--runs", type=int, default=7, help="Starts pro Befehl (Median)")
+    parser.add_argument("--help-budget", type=float, default=150, help="ms für main.py --help")
+    parser.add_argument("--import-budget", type=float, default=250, help="ms für import downloader")
+    parser.add_argument("--out", help="Ergebnis als Zeile an diese JSONL-Datei anhängen")
+    args = parser.parse_args()
+    result = run(args)
+    print(json.dumps(result, indent=2, ensure_ascii=False))
+    if args.out:
+        with open(args.out, "a", encoding="utf-8") as f:
+            f.write(json.dumps(result, ensure_ascii=False) + "\n")
+    if result["failures"]:
+        for failure in result["failures"]:
+            print(f"Startbudget verletzt – {failure}", file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,466 @@
+#!/usr/bin/env python3
+"""Offline benchmark against a local stand-in media site.
+
+A local HTTP server plays the video site: ``/page/<n>`` serves an HTML page
+whose iframes point at several mirrors under paths matching registered
+extractor hosts. Some iframes link the manifest directly, others a player
+page (``embed``, one of them lazily via ``data-src``) whose JSON config names
+it. ``/obfuscated/<n>`` only embeds a player whose linked script hides the
+manifest in packed and base64-encoded code, for the light sniff. Each
+mirror offers an HLS master playlist with 480p/720p/1080p variants
+and H.264 segments encoded once with ffmpeg, so downloads pass the
+verification; one mirror offers a DASH manifest as well. All stream URLs carry
+expiring tokens. Mirrors differ in behaviour: ``fast``, ``slow`` (throttled)
+and ``flaky`` (a share of requests fails with 503).
+
+The harness drives ``resolve_url()`` (cold and warm probe cache),
+``process()`` and ``upload_to_koofr()`` against ``webdav_stub``. It prints
+latency percentiles, throughput, per-phase timings (from ``metrics`` spans)
+and probe/sniff counts as JSON. With ``--out`` the result is also appended
+as one line to a JSONL file, so runs can be compared over time. The exit
+code is 1 unless every page of the ``process`` phase was uploaded.
+
+Run with: ``python benchmark.py --pages 10 --process 3 --out bench.jsonl``
+"""
+
+from __future__ import annotations
+
+import argparse
+import base64
+import json
+import random
+import re
+import secrets
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Optional
+from urllib.parse import parse_qsl, urlsplit
+
+import webdav_stub
+
+_DIGITS = "0123456789abcdefghijklmnopqrstuvwxyz"
+HEIGHTS = (480, 720, 1080)
+SEGMENTS = 6
+SEGMENT_SECONDS = 4.0
+# mirror name -> (hint the URL path carries, bytes/s limit or 0, failure rate)
+MIRRORS = {
+    "fast": ("supervideo.cc", 0, 0.0),
+    "slow": ("supervideo.cc", 2 * 1048576, 0.0),
+    "flaky": ("p2pplay", 0, 0.3),
+}
+DASH_MIRROR = "fast"
+
+
+def make_segments(work: Path) -> dict[tuple[int, int], bytes]:
+    """Encode a short H.264 test video per height with ffmpeg and return
+    its HLS segments by ``(height, index)``.
+
+    Downloads must pass the verification (video stream, duration, height),
+    so the segments have to be real, decodable transport streams.
+    """
+    if not shutil.which("ffmpeg"):
+        raise SystemExit("ffmpeg fehlt – es wird für die Testsegmente der Phase process gebraucht")
+    segments = {}
+    for h in HEIGHTS:
+        out = work / f"v{h}"
+        out.mkdir(parents=True, exist_ok=True)
+        subprocess.run(
+            [
+                "ffmpeg", "-v", "error", "-y",
+                "-f", "lavfi", "-i", f"testsrc=size={h * 16 // 9}x{h}:rate=25:duration={SEGMENTS * SEGMENT_SECONDS}",
+                "-c:v", "libx264", "-preset", "ultrafast", "-pix_fmt", "yuv420p", "-b:v", f"{h * 4}k",
+                "-force_key_frames", f"expr:gte(t,n_forced*{SEGMENT_SECONDS})",
+                "-f", "hls", "-hls_time", str(SEGMENT_SECONDS), "-hls_list_size", "0",
+                "-hls_segment_filename", str(out / "s%d.ts"), str(out / "index.m3u8"),
+            ],
+            check=True,
+        )
+        for i in range(SEGMENTS):
+            segments[h, i] = (out / f"s{i}.ts").read_bytes()
+    return segments
+
+
+def pack(code: str) -> str:
+    """Obfuscate ``code`` like Dean Edwards' packer (radix 36)."""
+
+    def base36(n: int) -> str:
+        out = ""
+        while True:
+            n, d = divmod(n, 36)
+            out = _DIGITS[d] + out
+            if not n:
+                return out
+
+    words = list(dict.fromkeys(re.findall(r"\b\w+\b", code)))
+    index = {w: base36(i) for i, w in enumerate(words)}
+    payload = re.sub(r"\b\w+\b", lambda m: index[m.group(0)], code)
+    payload = payload.replace("\\", "\\\\").replace("'", "\\'")
+    return (
+        "eval(function(p,a,c,k,e,d){e=function(c){return c.toString(36)};"
+        "while(c--){if(k[c]){p=p.replace(new RegExp('\\b'+e(c)+'\\b','g'),k[c])}}return p}"
+        f"('{payload}',36,{len(words)},'{'|'.join(words)}'.split('|'),0,{{}}))"
+    )
+
+
+class SiteHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    server: "MediaSite"
+
+    def log_message(self, *args) -> None:
+        pass
+
+    def _reply(self, code: int, body: bytes = b"", ctype: str = "text/plain", rate: float = 0) -> None:
+        self.send_response(code)
+        self.send_header("Content-Type", ctype)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        if self.command == "HEAD":
+            return
+        step = 64 * 1024
+        for i in range(0, len(body), step):
+            self.wfile.write(body[i:i + step])
+            if rate:
+                time.sleep(step / rate)
+        self.server.count("bytes", len(body))
+
+    def do_HEAD(self) -> None:
+        self.do_GET()
+
+    def do_GET(self) -> None:
+        parts = urlsplit(self.path)
+        path = parts.path.strip("/").split("/")
+        query = dict(parse_qsl(parts.query))
+        if path[0] == "page" and len(path) == 2:
+            self.server.count("pages")
+            return self._reply(200, self.server.page(path[1]).encode(), "text/html")
+        if path[0] == "obfuscated" and len(path) == 2:
+            self.server.count("pages")
+            return self._reply(200, self.server.obfuscated(path[1]).encode(), "text/html")
+        # /<hint>/<mirror>/<id>/<file>
+        if len(path) != 4 or path[1] not in MIRRORS:
+            return self._reply(404)
+        hint, mirror, vid, name = path
+        _, rate, fail_rate = MIRRORS[mirror]
+        if name == "embed":
+            self.server.count("embeds")
+            return self._reply(200, self.server.player(hint, mirror, vid).encode(), "text/html")
+        if name == "packed":
+            self.server.count("embeds")
+            return self._reply(200, b'<html><body><script src="player.js"></script></body></html>', "text/html")
+        if name == "player.js":
+            self.server.count("scripts")
+            return self._reply(200, self.server.packed_script(hint, mirror, vid).encode(), "text/javascript")
+        if float(query.get("expires", 0)) < time.time():
+            self.server.count("expired")
+            return self._reply(403)
+        if random.random() < fail_rate:
+            self.server.count("failed")
+            return self._reply(503)
+        qs = "?" + parts.query
+        if name == "master.m3u8":
+            self.server.count("manifests")
+            lines = ["#EXTM3U"]
+            for h in HEIGHTS:
+                w = h * 16 // 9
+                lines.append(
+                    f'#EXT-X-STREAM-INF:BANDWIDTH={h * 4000},RESOLUTION={w}x{h},CODECS="avc1.640028,mp4a.40.2"'
+                )
+                lines.append(f"v{h}.m3u8{qs}")
+            return self._reply(200, "\n".join(lines).encode() + b"\n", "application/vnd.apple.mpegurl")
+        if name.startswith("v") and name.endswith(".m3u8"):
+            self.server.count("manifests")
+            h = int(name[1:-5])
+            lines = ["#EXTM3U", "#EXT-X-VERSION:3", f"#EXT-X-TARGETDURATION:{int(SEGMENT_SECONDS)}"]
+            for i in range(SEGMENTS):
+                lines += [f"#EXTINF:{SEGMENT_SECONDS:.1f},", f"s{h}_{i}.ts{qs}"]
+            lines.append("#EXT-X-ENDLIST")
+            return self._reply(200, "\n".join(lines).encode() + b"\n", "application/vnd.apple.mpegurl")
+        if name.startswith("s") and name.endswith(".ts"):
+            self.server.count("segments")
+            h, i = (int(x) for x in name[1:-3].split("_"))
+            data = self.server.segments.get((h, i))
+            if data is None:
+                return self._reply(404)
+            return self._reply(200, data, "video/mp2t", rate)
+        if name == "manifest.mpd":
+            self.server.count("manifests")
+            duration = SEGMENTS * SEGMENT_SECONDS
+            reps = "".join(
+                f'<Representation id="v{h}" bandwidth="{h * 4000}" width="{h * 16 // 9}" height="{h}"/>'
+                for h in HEIGHTS[:-1]
+            )
+            mpd = (
+                '<?xml version="1.0"?><MPD xmlns="urn:mpeg:dash:schema:mpd:2011" '
+                f'mediaPresentationDuration="PT{duration:.0f}S"><Period>'
+                f'<AdaptationSet mimeType="video/mp4">{reps}</AdaptationSet>'
+                "</Period></MPD>"
+            )
+            return self._reply(200, mpd.encode(), "application/dash+xml")
+        self._reply(404)
+
+
+class MediaSite(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, addr, token_ttl: float = 120, segments: Optional[dict] = None):
+        super().__init__(addr, SiteHandler)
+        self.token_ttl = token_ttl
+        self.segments = segments or {}
+        self.base = f"http://127.0.0.1:{self.server_port}"
+        self.counters: Counter = Counter()
+        self._lock = threading.Lock()
+
+    def count(self, key: str, n: int = 1) -> None:
+        with self._lock:
+            self.counters[key] += n
+
+    def _signed(self, hint: str, mirror: str, vid: str, name: str) -> str:
+        expires = int(time.time() + self.token_ttl)
+        return f"{self.base}/{hint}/{mirror}/{vid}/{name}?expires={expires}&token={secrets.token_hex(8)}"
+
+    def page(self, vid: str) -> str:
+        hint = MIRRORS["fast"][0]
+        frames = [
+            f'<iframe src="{self._signed(hint, "fast", vid, "master.m3u8")}"></iframe>',
+            f'<iframe src="{self.base}/{MIRRORS["slow"][0]}/slow/{vid}/embed"></iframe>',
+            f'<iframe data-src="{self.base}/{MIRRORS["flaky"][0]}/flaky/{vid}/embed"></iframe>',
+            f'<iframe src="{self._signed(MIRRORS[DASH_MIRROR][0], DASH_MIRROR, vid, "manifest.mpd")}"></iframe>',
+        ]
+        return f"<html><head><title>Video {vid}</title></head><body>{''.join(frames)}</body></html>"
+
+    def player(self, hint: str, mirror: str, vid: str) -> str:
+        # relative, like most players' configs
+        src = self._signed(hint, mirror, vid, "master.m3u8").rsplit("/", 1)[1]
+        return f'<html><body><script>player.setup({{"sources":[{{"file":"{src}"}}]}});</script></body></html>'
+
+    def obfuscated(self, vid: str) -> str:
+        frame = f'<iframe src="{self.base}/{MIRRORS["fast"][0]}/fast/{vid}/packed"></iframe>'
+        return f"<html><head><title>Video {vid}</title></head><body>{frame}</body></html>"
+
+    def packed_script(self, hint: str, mirror: str, vid: str) -> str:
+        src = base64.b64encode(self._signed(hint, mirror, vid, "master.m3u8").encode()).decode()
+        return pack(f'var src=atob("{src}");jwplayer("player").setup({{file:src}});')
+
+
+def serve_site(token_ttl: float = 120, port: int = 0, segments: Optional[dict] = None) -> MediaSite:
+    """Start the stand-in site in a background thread and return it."""
+    site = MediaSite(("127.0.0.1", port), token_ttl, segments)
+    threading.Thread(target=site.serve_forever, daemon=True).start()
+    return site
+
+
+class BenchUI:
+    """Non-interactive UI that counts notable log lines instead of printing."""
+
+    class _Console:
+        def print(self, *args, **kwargs) -> None:
+            pass
+
+        def input(self, prompt: str = "") -> str:
+            return ""
+
+    def __init__(self, verbose: bool = False):
+        self.console = self._Console()
+        self.verbose = verbose
+        self.counts: Counter = Counter()
+
+    def log(self, msg, level: int = 20) -> None:
+        msg = str(msg)
+        if msg.startswith("Sniff "):
+            self.counts["sniffs"] += 1
+        elif "frische Stream-URL" in msg:
+            self.counts["token_refreshes"] += 1
+        elif "Probe(s) für" in msg:
+            self.counts["resolutions"] += 1
+        if self.verbose:
+            print(msg, file=sys.stderr)
+
+    def update_progress(self, *args, **kwargs) -> None:
+        pass
+
+    def set_phase(self, phase) -> None:
+        pass
+
+
+def percentiles(samples: list[float]) -> dict:
+    if not samples:
+        return {"count": 0}
+    s = sorted(samples)
+
+    def pick(q: float) -> float:
+        return round(s[min(len(s) - 1, int(round(q * (len(s) - 1))))], 4)
+
+    return {
+        "count": len(s),
+        "mean": round(sum(s) / len(s), 4),
+        "p50": pick(0.5),
+        "p90": pick(0.9),
+        "p99": pick(0.99),
+        "max": round(s[-1], 4),
+    }
+
+
+def _phases(spans_path: Path) -> dict:
+    """Per-phase duration percentiles from the run's span file."""
+    durations: dict[str, list[float]] = {}
+    failed: Counter = Counter()
+    with spans_path.open(encoding="utf-8") as f:
+        for line in f:
+            sp = json.loads(line)
+            durations.setdefault(sp["phase"], []).append(sp["duration"])
+            if sp["outcome"] != "ok":
+                failed[sp["phase"]] += 1
+    return {p: {**percentiles(d), "failed": failed[p]} for p, d in durations.items()}
+
+
+def _commit() -> str:
+    try:
+        out = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True)
+        return out.stdout.strip()
+    except OSError:
+        return ""
+
+
+def run(args) -> dict:
+    # imported here so ``--help`` works without the full environment
+    import downloader
+    import light_sniff
+    from config import load_config
+    from downloader import ProbeMemo, process, resolve_url, upload_to_koofr
+
+    work = Path(tempfile.mkdtemp(prefix="bench-"))
+    try:
+        segments = make_segments(work / "media") if args.process else {}
+    except BaseException:
+        shutil.rmtree(work, ignore_errors=True)
+        raise
+    site = serve_site(args.token_ttl, segments=segments)
+    dav = webdav_stub.serve(str(work / "dav"), fail_rate=args.upload_fail_rate)
+    cfg = load_config([])
+    cfg.out = str(work / "out")
+    cfg.min_height = 1080
+    cfg.koofr_user, cfg.koofr_password, cfg.koofr_base = "bench", "bench", "bench"
+    cfg.koofr_dav_url = f"http://127.0.0.1:{dav.server_port}"
+    cfg.probe_cache_path = str(work / "probe.sqlite")
+    cfg.host_stats_path = str(work / "hosts.sqlite")
+    cfg.metrics_spans_path = str(work / "spans.jsonl")
+    cfg.metrics_prom_path = ""
+    cfg.token_refresh_margin = min(cfg.token_refresh_margin, args.token_ttl / 3)
+    downloader.configure(cfg)
+    if not args.sniff:
+        downloader.PLAYWRIGHT_AVAILABLE = False
+    ui = BenchUI(args.verbose)
+    result: dict = {
+        "started": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "commit": _commit(),
+        "params": vars(args),
+    }
+    try:
+        pages = [f"{site.base}/page/{i}" for i in range(args.pages)]
+        for phase in ("resolve_cold", "resolve_warm"):
+            times, probes = [], 0
+            for page in pages:
+                memo = ProbeMemo()
+                start = time.perf_counter()
+                try:
+                    resolve_url(page, ui, cfg.min_height, memo)
+                except Exception as e:
+                    ui.counts["resolve_errors"] += 1
+                    ui.log(f"{page}: {e}")
+                times.append(time.perf_counter() - start)
+                probes += memo.probes
+            result[phase] = {**percentiles(times), "probes": probes}
+
+        # pages whose stream only the light sniff finds
+        times, saved = [], light_sniff.TOTALS.saved
+        for i in range(args.pages):
+            start = time.perf_counter()
+            try:
+                resolve_url(f"{site.base}/obfuscated/{i}", ui, cfg.min_height, ProbeMemo())
+            except Exception as e:
+                ui.counts["resolve_errors"] += 1
+                ui.log(f"obfuscated/{i}: {e}")
+            times.append(time.perf_counter() - start)
+        result["resolve_light"] = {**percentiles(times), "saved": light_sniff.TOTALS.saved - saved}
+
+        times = []
+        served = site.counters["bytes"]
+        start_all = time.perf_counter()
+        for page in pages[: args.process]:
+            start = time.perf_counter()
+            try:
+                process(page, cfg, ui)
+            except Exception as e:
+                ui.counts["process_errors"] += 1
+                ui.log(f"{page}: {e}")
+            times.append(time.perf_counter() - start)
+        elapsed = max(time.perf_counter() - start_all, 1e-6)
+        uploaded = sum(1 for _ in (work / "dav").rglob("*") if _.is_file())
+        result["process"] = {
+            **percentiles(times),
+            "uploaded": uploaded,
+            "throughput_mib_s": round((site.counters["bytes"] - served) / elapsed / 1048576, 2),
+        }
+
+        src = work / "upload"
+        src.mkdir()
+        times = []
+        for i in range(args.uploads):
+            f = src / f"bench-{i}.bin"
+            f.write_bytes(random.randbytes(int(args.upload_mb * 1048576)))
+            start = time.perf_counter()
+            upload_to_koofr(str(f), cfg, ui)
+            times.append(time.perf_counter() - start)
+        total = sum(times) or 1e-6
+        result["upload"] = {
+            **percentiles(times),
+            "throughput_mib_s": round(args.uploads * args.upload_mb / total, 2),
+        }
+        result["phases"] = _phases(Path(cfg.metrics_spans_path))
+        result["counters"] = {**ui.counts}
+        result["site"] = dict(site.counters)
+    finally:
+        downloader.shutdown()
+        site.shutdown()
+        dav.shutdown()
+        if not args.keep:
+            shutil.rmtree(work, ignore_errors=True)
+    return result
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Offline-Benchmark mit lokaler Ersatz-Seite")
+    parser.add_argument("--pages", type=int, default=10, help="Seiten für resolve_url()")
+    parser.add_argument("--process", type=int, default=3, help="Seiten für process()")
+    parser.add_argument("--uploads", type=int, default=3)
+    parser.add_argument("--upload-mb", type=float, default=16)
+    parser.add_argument("--upload-fail-rate", type=float, default=0.0)
+    parser.add_argument("--token-ttl", type=float, default=120, help="Gültigkeit der Stream-Tokens (s)")
+    parser.add_argument("--sniff", action="store_true", help="Playwright-Sniffing zulassen")
+    parser.add_argument("--out", help="Ergebnis als Zeile an diese JSONL-Datei anhängen")
+    parser.add_argument("--keep", action="store_true", help="Arbeitsverzeichnis behalten")
+    parser.add_argument("--verbose", action="store_true")
+    args = parser.parse_args()
+    result = run(args)
+    print(json.dumps(result, indent=2))
+    if args.out:
+        with open(args.out, "a", encoding="utf-8") as f:
+            f.write(json.dumps(result) + "\n")
+    # every processed page must end up verified and uploaded
+    if result["process"]["uploaded"] != args.process:
+        print(
+            f"Nur {result['process']['uploaded']} von {args.process} Seiten hochgeladen",
+            file=sys.stderr,
+        )
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
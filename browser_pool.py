@@ -0,0 +1,192 @@
+"""Long-lived Playwright browser shared by all sniffs of a batch.
+
+Launching Firefox costs seconds and hundreds of MB, so instead of starting a
+browser per sniff the pool keeps one running on the shared event loop (see
+``runtime``). Every sniff gets its own isolated browser context.
+The browser is replaced after ``max_pages`` contexts or when the browser
+processes exceed ``max_memory_mb``.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import os
+import threading
+from contextlib import asynccontextmanager
+from pathlib import Path
+from typing import Optional
+
+import runtime
+
+
+# the browser's memory is checked on every MEMORY_CHECK_EVERY-th page only,
+# since it means scanning /proc
+MEMORY_CHECK_EVERY = 5
+
+
+def _browser_rss_mb(pid: int) -> float:
+    """Return the resident memory of the Playwright driver processes started
+    by ``pid`` and their descendants (the browser) in MB.
+
+    The process ``pid`` itself is not counted, so a large download in this
+    process doesn't recycle the browser. Only implemented via ``/proc``
+    (Linux); elsewhere ``0`` is returned and recycling falls back to the page
+    count alone.
+    """
+    proc = Path("/proc")
+    if not proc.exists():
+        return 0.0
+    children: dict[int, list[int]] = {}
+    rss: dict[int, int] = {}
+    page = os.sysconf("SC_PAGE_SIZE")
+    for entry in proc.iterdir():
+        if not entry.name.isdigit():
+            continue
+        try:
+            stat = (entry / "stat").read_text()
+            statm = (entry / "statm").read_text().split()
+        except OSError:
+            continue
+        # the command name may contain spaces; fields after it are fixed
+        ppid = int(stat.rsplit(")", 1)[1].split()[1])
+        children.setdefault(ppid, []).append(int(entry.name))
+        rss[int(entry.name)] = int(statm[1]) * page
+    roots = []
+    for child in children.get(pid, []):
+        try:
+            cmdline = (proc / str(child) / "cmdline").read_bytes()
+        except OSError:
+            continue
+        if b"playwright" in cmdline:
+            roots.append(child)
+    total = 0
+    stack = roots
+    while stack:
+        p = stack.pop()
+        total += rss.get(p, 0)
+        stack.extend(children.get(p, []))
+    return total / (1024 * 1024)
+
+
+class _Browser:
+    def __init__(self, browser):
+        self.browser = browser
+        self.pages = 0
+        self.active = 0
+        self.retired = False
+
+
+class BrowserPool:
+    def __init__(self, max_pages: int = 50, max_memory_mb: float = 1500, max_contexts: int = 4):
+        self.max_pages = max_pages
+        self.max_memory_mb = max_memory_mb
+        self.launches = 0
+        self._max_contexts = max_contexts
+        self._pw = None
+        self._current: Optional[_Browser] = None
+        self._lock: Optional[asyncio.Lock] = None
+        self._slots: Optional[asyncio.Semaphore] = None
+
+    async def _over_budget(self) -> bool:
+        pages = self._current.pages
+        if pages >= self.max_pages:
+            return True
+        if not self.max_memory_mb or pages % MEMORY_CHECK_EVERY:
+            return False
+        return await runtime.run_blocking(_browser_rss_mb, os.getpid()) > self.max_memory_mb
+
+    async def _acquire(self) -> _Browser:
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+            self._slots = asyncio.Semaphore(self._max_contexts)
+        await self._slots.acquire()
+        try:
+            async with self._lock:
+                if self._pw is None:
+                    # Playwright is only loaded once a page actually needs sniffing
+                    from playwright.async_api import async_playwright
+
+                    self._pw = await async_playwright().start()
+                cur = self._current
+                if cur is not None and (not cur.browser.is_connected() or await self._over_budget()):
+                    cur.retired = True
+                    if cur.active == 0:
+                        await cur.browser.close()
+                    self._current = cur = None
+                if cur is None:
+                    browser = await self._pw.firefox.launch(headless=True)
+                    self.launches += 1
+                    self._current = cur = _Browser(browser)
+                cur.pages += 1
+                cur.active += 1
+                return cur
+        except BaseException:
+            self._slots.release()
+            raise
+
+    async def _release(self, entry: _Browser) -> None:
+        entry.active -= 1
+        self._slots.release()
+        if entry.retired and entry.active == 0:
+            try:
+                await entry.browser.close()
+            except Exception:
+                pass
+
+    @asynccontextmanager
+    async def context(self):
+        """Yield a fresh, isolated browser context."""
+        entry = await self._acquire()
+        try:
+            context = await entry.browser.new_context()
+            try:
+                yield context
+            finally:
+                await context.close()
+        finally:
+            await self._release(entry)
+
+    async def _shutdown(self) -> None:
+        if self._current is not None:
+            await self._current.browser.close()
+            self._current = None
+        if self._pw is not None:
+            await self._pw.stop()
+            self._pw = None
+
+    def close(self) -> None:
+        if self._pw is not None:
+            runtime.run(self._shutdown())
+
+
+_POOL: Optional[BrowserPool] = None
+_POOL_LOCK = threading.Lock()
+
+
+def configure(cfg) -> None:
+    """Replace the shared pool with one built from ``cfg``."""
+    global _POOL
+    with _POOL_LOCK:
+        if _POOL is not None:
+            _POOL.close()
+        _POOL = BrowserPool(
+            max_pages=cfg.browser_max_pages,
+            max_memory_mb=cfg.browser_max_memory_mb,
+            max_contexts=cfg.browser_contexts,
+        )
+
+
+def get_pool() -> BrowserPool:
+    global _POOL
+    with _POOL_LOCK:
+        if _POOL is None:
+            _POOL = BrowserPool()
+        return _POOL
+
+
+def close_pool() -> None:
+    global _POOL
+    with _POOL_LOCK:
+        if _POOL is not None:
+            _POOL.close()
+            _POOL = None
@@ -5,6 +5,9 @@ import argparse
 import yaml
 from dotenv import load_dotenv
 
+from logs import LEVELS
+from request_filter import ALLOW_TYPES
+
 
 def load_config(argv=None):
     load_dotenv()
@@ -13,6 +16,10 @@ def load_config(argv=None):
     parser.add_argument("--urls", nargs="*", help="Seiten oder direkte Videolinks")
     parser.add_argument("--urls-file", help="Datei mit Links")
     parser.add_argument("--out", default="downloads", help="Ausgabeverzeichnis")
+    parser.add_argument("--workers", type=int, help="Anzahl gleichzeitiger Jobs")
+    parser.add_argument("--per-host", type=int, help="Maximale gleichzeitige Jobs pro Host")
+    parser.add_argument("--serve", action="store_true", help="Als Dienst laufen und Jobs über HTTP annehmen")
+    parser.add_argument("--remote", action="store_true", help="URLs an den laufenden Dienst übergeben")
     args = parser.parse_args(argv)
 
     urls = args.urls or []
@@ -27,6 +34,18 @@ def load_config(argv=None):
             cfg = yaml.safe_load(f) or {}
 
     min_height = int(cfg.get("min_height", 1080))
+    workers = args.workers or int(cfg.get("workers", 4))
+    stages = cfg.get("stages") or {}
+    stage_workers = {
+        "resolve": int(stages.get("resolve", workers)),
+        "download": int(args.workers or stages.get("download", workers)),
+        "verify": int(stages.get("verify", 2)),
+        "upload": int(stages.get("upload", 2)),
+    }
+    per_host = args.per_host or int(cfg.get("per_host", 2))
+    probe_cache_ttl = float(cfg.get("probe_cache_ttl_hours", 168)) * 3600
+    daemon_host = cfg.get("daemon_host", "127.0.0.1")
+    daemon_port = int(cfg.get("daemon_port", 8765))
 
     return type("Config", (), {
         "urls": urls,
@@ -34,6 +53,61 @@ def load_config(argv=None):
         "koofr_user": os.getenv("KOOFR_USER"),
         "koofr_password": os.getenv("KOOFR_PASSWORD"),
         "koofr_base": os.getenv("KOOFR_BASE", ""),
+        "koofr_dav_url": os.getenv("KOOFR_DAV_URL") or "https://app.koofr.net/dav",
         "surfshark_server": os.getenv("SURFSHARK_SERVER"),
         "min_height": min_height,
+        "workers": workers,
+        "per_host": per_host,
+        "stage_workers": stage_workers,
+        "stage_queue": int(cfg.get("stage_queue", 4)),
+        "stats_interval": float(cfg.get("stats_interval", 30)),
+        "journal_path": cfg.get("journal_path", "journal.jsonl"),
+        "token_refresh": bool(cfg.get("token_refresh", True)),
+        "token_refresh_margin": float(cfg.get("token_refresh_margin", 60)),
+        "probe_cache_path": cfg.get("probe_cache_path", ".cache/probe.sqlite"),
+        "probe_cache_ttl": probe_cache_ttl,
+        "probe_cache_max_entries": int(cfg.get("probe_cache_max_entries", 5000)),
+        "host_stats_path": cfg.get("host_stats_path", ".cache/hosts.sqlite"),
+        "host_stats_half_life": float(cfg.get("host_stats_half_life_days", 7)) * 86400,
+        "browser_max_pages": int(cfg.get("browser_max_pages", 50)),
+        "browser_max_memory_mb": float(cfg.get("browser_max_memory_mb", 1500)),
+        "browser_contexts": int(cfg.get("browser_contexts", 4)),
+        "sniff_deadline": float(cfg.get("sniff_deadline", 30)),
+        "sniff_grace": float(cfg.get("sniff_grace", 2)),
+        "sniff_allow_types": list(cfg.get("sniff_allow_types") or ALLOW_TYPES),
+        "sniff_blocklists": list(cfg.get("sniff_blocklists") or []),
+        "upload_chunk_mb": int(cfg.get("upload_chunk_mb", 32)),
+        "upload_workers": int(cfg.get("upload_workers", 2)),
+        "upload_retries": int(cfg.get("upload_retries", 5)),
+        "race_candidates": int(cfg.get("race_candidates", 0)),
+        "race_seconds": float(cfg.get("race_seconds", 4)),
+        "race_mb": float(cfg.get("race_mb", 8)),
+        "early_check_mb": float(cfg.get("early_check_mb", 4)),
+        "progress_interval": float(cfg.get("progress_interval", 0.5)),
+        "gui_log_lines": int(cfg.get("gui_log_lines", 1000)),
+        "embed_depth": int(cfg.get("embed_depth", 2)),
+        "embed_cache_ttl": float(cfg.get("embed_cache_ttl", 60)),
+        "embed_cache_max_entries": int(cfg.get("embed_cache_max_entries", 256)),
+        "extractor_plugins": list(cfg.get("extractor_plugins") or []),
+        "light_sniff": bool(cfg.get("light_sniff", True)),
+        "serve": args.serve,
+        "remote": args.remote,
+        "daemon_host": daemon_host,
+        "daemon_port": daemon_port,
+        "daemon_url": f"http://{daemon_host}:{daemon_port}",
+        "daemon_token": str(cfg.get("daemon_token") or os.getenv("DAEMON_TOKEN") or ""),
+        "daemon_token_path": cfg.get("daemon_token_path", ".cache/daemon.token"),
+        "daemon_keep_jobs": int(cfg.get("daemon_keep_jobs", 200)),
+        "daemon_job_ttl": float(cfg.get("daemon_job_ttl", 86400)),
+        "log_path": cfg.get("log_path", "downloader.log"),
+        "log_level": LEVELS[str(cfg.get("log_level", "info")).lower()],
+        "log_file_level": LEVELS[str(cfg.get("log_file_level", "debug")).lower()],
+        "log_max_mb": float(cfg.get("log_max_mb", 10)),
+        "log_backups": int(cfg.get("log_backups", 3)),
+        "log_job_dir": cfg.get("log_job_dir", "logs") or "",
+        "log_ring_size": int(cfg.get("log_ring_size", 2000)),
+        "metrics_spans_path": cfg.get("metrics_spans_path", "metrics/spans.jsonl") or "",
+        "metrics_prom_path": cfg.get("metrics_prom_path", "") or "",
+        "profile_job": cfg.get("profile_job", "") or "",
+        "profile_dir": cfg.get("profile_dir", "profiles"),
     })()
@@ -0,0 +1,344 @@
+"""Resident service that keeps the warm state and accepts jobs over HTTP.
+
+One process holds the configured caches, HTTP pools, the Playwright browser
+pool, the runtime loop and (if configured) the VPN connection, and runs
+submitted URLs on a :class:`jobqueue.JobQueue`. Since the workers are
+already waiting, a submitted job starts resolving right away. The API only
+listens on ``daemon_host`` (loopback by default) and speaks JSON:
+
+``GET /health``                       liveness check
+``GET /jobs``                         all jobs with their progress
+``POST /jobs`` ``{"urls": [...]}``    queue URLs, returns the new jobs
+``GET /jobs/<id>``                    one job
+``DELETE /jobs/<id>``                 cancel a job
+``POST /jobs/<id>/move`` ``{"delta": n}``  reorder a waiting job
+``POST /jobs/clear``                  forget finished jobs
+``GET /events``                       status stream, one JSON line per change
+
+Every call except ``/health`` must carry ``Authorization: Bearer <token>``
+(``daemon_token``, or a random one written to ``daemon_token_path``). POST
+bodies must be sent as ``application/json`` and requests with a foreign
+``Origin`` are refused, so web pages open in a browser can't reach the API.
+
+``main.py --remote`` and the GUI are thin clients, see ``daemon_client``.
+"""
+
+from __future__ import annotations
+
+import hmac
+import json
+import re
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Optional
+
+from daemon_client import daemon_token
+from logs import DEBUG, INFO, get_logs
+from jobqueue import JobQueue, QueuedJob, job_snapshot
+from progress import ProgressAggregator, Snapshot
+
+# seconds after which an idle event stream repeats the current state, so
+# clients notice a dead connection
+KEEPALIVE = 15.0
+
+
+class _Console:
+    def __init__(self, ui: "DaemonUI"):
+        self.ui = ui
+
+    def print(self, *args, **kwargs):
+        self.ui.log(" ".join(str(a) for a in args))
+
+    def input(self, prompt: str = "") -> str:
+        self.ui.log(prompt)
+        return ""  # nobody to ask; use the default selection
+
+
+class DaemonUI:
+    """UI for jobs without a terminal: messages go to the log pipeline,
+    progress to the aggregator behind the event stream."""
+
+    def __init__(self, aggregator: ProgressAggregator):
+        self.console = _Console(self)
+        self.aggregator = aggregator
+
+    def log(self, msg, level: int = INFO) -> None:
+        get_logs().emit(level, msg)
+
+    def update_progress(self, name, done, total=None, finished=False) -> None:
+        self.aggregator.update(name, done, total, finished)
+
+
+def _snapshot_dict(snap: Optional[Snapshot]) -> dict:
+    if snap is None:
+        return {"done": 0, "total": None, "percent": 0.0, "speed": 0.0, "eta": None}
+    return {
+        "done": snap.done,
+        "total": snap.total,
+        "percent": round(snap.percent, 1),
+        "speed": round(snap.speed),
+        "eta": round(snap.eta) if snap.eta is not None else None,
+    }
+
+
+class Daemon:
+    def __init__(self, cfg):
+        self.cfg = cfg
+        self.aggregator = ProgressAggregator(self._publish, cfg.progress_interval)
+        self.ui = DaemonUI(self.aggregator)
+        self.queue = JobQueue(
+            cfg,
+            self.ui,
+            cfg.workers,
+            cfg.per_host,
+            on_change=self._job_changed,
+            keep_finished=cfg.daemon_keep_jobs,
+            finished_ttl=cfg.daemon_job_ttl,
+        )
+        self._snaps: dict[str, Snapshot] = {}
+        self._total: Optional[Snapshot] = None
+        self._version = 0
+        self.closed = False
+        self._cond = threading.Condition()
+        self.server: Optional[ThreadingHTTPServer] = None
+        self.token = daemon_token(cfg, create=True)
+        # origins of pages served by the daemon's own address; no browser
+        # page elsewhere may call the API
+        self.origins = {
+            f"http://{host}:{cfg.daemon_port}" for host in (cfg.daemon_host, "127.0.0.1", "localhost", "[::1]")
+        }
+
+    # -- state -------------------------------------------------------------
+
+    def _publish(self, snaps: list[Snapshot], total: Snapshot) -> None:
+        with self._cond:
+            self._snaps = {s.name: s for s in snaps}
+            self._total = total
+        self._changed()
+
+    def _job_changed(self, job: QueuedJob) -> None:
+        if job.finished:
+            # its transfers no longer count towards the total
+            self.aggregator.discard(job.names)
+        self._changed()
+
+    def _changed(self) -> None:
+        with self._cond:
+            self._version += 1
+            self._cond.notify_all()
+
+    def job_dict(self, job: QueuedJob) -> dict:
+        with self._cond:
+            snaps = self._snaps
+        d = {"id": job.id, "url": job.url, "state": job.state, "height": job.height, "error": job.error}
+        d.update(_snapshot_dict(job_snapshot(job, snaps)))
+        if job.state == "done":
+            d["percent"] = 100.0
+        return d
+
+    def state(self) -> dict:
+        with self._cond:
+            total = self._total
+        jobs = [self.job_dict(j) for j in self.queue.jobs()]
+        return {"jobs": jobs, "total": _snapshot_dict(total if jobs else None)}
+
+    def wait(self, version: int, timeout: float) -> int:
+        """Block until the state changed after ``version``; returns the new one."""
+        with self._cond:
+            self._cond.wait_for(lambda: self._version != version, timeout)
+            return self._version
+
+    # -- lifecycle ---------------------------------------------------------
+
+    def _warm_up(self) -> None:
+        # load yt-dlp and open the HTTP client now instead of in the first job
+        from http_client import get_client
+
+        try:
+            get_client().ydl(False)
+        except Exception as e:
+            self.ui.log(f"Vorwärmen fehlgeschlagen: {e}")
+
+    def serve(self) -> None:
+        """Serve until interrupted (Ctrl+C)."""
+        self.queue.start()
+        threading.Thread(target=self._warm_up, name="warm-up", daemon=True).start()
+        self.server = ThreadingHTTPServer((self.cfg.daemon_host, self.cfg.daemon_port), _handler(self))
+        self.server.daemon_threads = True
+        self.ui.log(f"Dienst läuft auf http://{self.cfg.daemon_host}:{self.server.server_port}")
+        try:
+            self.server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            self.close()
+
+    def close(self) -> None:
+        if self.server is not None:
+            self.server.server_close()
+        self.queue.close()
+        self.aggregator.close()
+        self.closed = True
+        self._changed()
+
+
+def _handler(daemon: Daemon):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, fmt, *args):
+            get_logs().emit(DEBUG, "API " + fmt % args)
+
+        def _send(self, status: int, body) -> None:
+            data = json.dumps(body, ensure_ascii=False).encode()
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            if status >= 400:
+                # a refused request's body may still be unread
+                self.send_header("Connection", "close")
+                self.close_connection = True
+            self.end_headers()
+            self.wfile.write(data)
+
+        def _allowed(self, path: str) -> bool:
+            """Check origin and token; answers 403/401 and returns False if refused."""
+            origin = self.headers.get("Origin")
+            if origin is not None and origin not in daemon.origins:
+                self._send(403, {"error": "fremder Origin"})
+                return False
+            if path == "/health":
+                return True
+            auth = self.headers.get("Authorization") or ""
+            token = auth[7:] if auth.startswith("Bearer ") else ""
+            if not hmac.compare_digest(token.encode(), daemon.token.encode()):
+                self._send(401, {"error": "Token fehlt oder ist falsch"})
+                return False
+            return True
+
+        def _body(self) -> Optional[dict]:
+            """Return the JSON object sent, or ``None`` after answering 4xx."""
+            content_type = (self.headers.get("Content-Type") or "").split(";", 1)[0].strip().lower()
+            if content_type != "application/json":
+                self._send(415, {"error": "Content-Type application/json erwartet"})
+                return None
+            try:
+                length = int(self.headers.get("Content-Length") or 0)
+                body = json.loads(self.rfile.read(length)) if length else {}
+            except ValueError:
+                self._send(400, {"error": "ungültiges JSON"})
+                return None
+            if not isinstance(body, dict):
+                self._send(400, {"error": "JSON-Objekt erwartet"})
+                return None
+            return body
+
+        def _job(self, path: str) -> Optional[QueuedJob]:
+            m = re.fullmatch(r"/jobs/(\d+)(?:/move)?", path)
+            return daemon.queue.get(int(m.group(1))) if m else None
+
+        def do_GET(self):
+            path = self.path.split("?", 1)[0]
+            if not self._allowed(path):
+                return
+            if path == "/health":
+                self._send(200, {"ok": True, "workers": daemon.queue.workers})
+            elif path == "/jobs":
+                self._send(200, daemon.state())
+            elif path == "/events":
+                self._events()
+            else:
+                job = self._job(path)
+                if job is None:
+                    self._send(404, {"error": "unbekannter Job"})
+                else:
+                    self._send(200, daemon.job_dict(job))
+
+        def do_POST(self):
+            path = self.path.split("?", 1)[0]
+            if not self._allowed(path):
+                return
+            body = self._body()
+            if body is None:
+                return
+            if path == "/jobs":
+                urls = body.get("urls") if "urls" in body else [body["url"]] if body.get("url") else []
+                if not isinstance(urls, list) or not all(isinstance(u, str) and u.strip() for u in urls):
+                    self._send(400, {"error": "urls muss eine Liste von URLs sein"})
+                    return
+                if not urls:
+                    self._send(400, {"error": "keine URL angegeben"})
+                    return
+                jobs = [daemon.queue.submit(u) for u in urls]
+                self._send(201, {"jobs": [daemon.job_dict(j) for j in jobs]})
+            elif path == "/jobs/clear":
+                gone = daemon.queue.clear_finished()
+                daemon._changed()
+                self._send(200, {"cleared": [j.id for j in gone]})
+            elif path.endswith("/move"):
+                delta = body.get("delta", 0)
+                if not isinstance(delta, int) or isinstance(delta, bool):
+                    self._send(400, {"error": "delta muss eine ganze Zahl sein"})
+                    return
+                job = self._job(path)
+                if job is None or not daemon.queue.move(job.id, delta):
+                    self._send(409, {"error": "Job wartet nicht"})
+                else:
+                    self._send(200, daemon.job_dict(job))
+            else:
+                self._send(404, {"error": "unbekannter Pfad"})
+
+        def do_DELETE(self):
+            path = self.path.split("?", 1)[0]
+            if not self._allowed(path):
+                return
+            job = self._job(path)
+            if job is None:
+                self._send(404, {"error": "unbekannter Job"})
+            elif not daemon.queue.cancel(job.id):
+                self._send(409, {"error": "Job ist bereits beendet"})
+            else:
+                self._send(200, daemon.job_dict(job))
+
+        def _events(self) -> None:
+            # newline-delimited JSON until the client goes away
+            self.send_response(200)
+            self.send_header("Content-Type", "application/x-ndjson")
+            self.send_header("Cache-Control", "no-cache")
+            self.send_header("Connection", "close")
+            self.end_headers()
+            self.close_connection = True
+            version = -1
+            try:
+                while True:
+                    version = daemon.wait(version, KEEPALIVE)
+                    line = json.dumps(daemon.state(), ensure_ascii=False) + "\n"
+                    self.wfile.write(line.encode())
+                    self.wfile.flush()
+                    if daemon.closed:
+                        return
+            except (BrokenPipeError, ConnectionResetError):
+                return
+
+    return Handler
+
+
+def serve(cfg) -> None:
+    """Run the daemon with warm shared state until interrupted."""
+    from downloader import configure, connect_vpn, disconnect_vpn, shutdown
+
+    from rich.console import Console
+
+    configure(cfg)
+    logs = get_logs()
+    logs.set_console(Console().log, cfg.log_level)
+    daemon = Daemon(cfg)
+    if cfg.surfshark_server:
+        connect_vpn(cfg.surfshark_server, daemon.ui)
+    try:
+        daemon.serve()
+    finally:
+        if cfg.surfshark_server:
+            disconnect_vpn(daemon.ui)
+        shutdown(daemon.ui)
+        logs.close()
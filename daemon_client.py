@@ -0,0 +1,268 @@
+"""Thin clients for the resident daemon (see ``daemon``).
+
+:class:`DaemonClient` wraps the HTTP API with the standard library only, so
+a client starts without loading any of the downloader's dependencies.
+:class:`RemoteJobQueue` offers the interface of :class:`jobqueue.JobQueue`
+on top of it for the GUI, and :func:`run_remote` submits the CLI's URLs and
+follows them until they are finished.
+"""
+
+from __future__ import annotations
+
+import json
+import os
+import secrets
+import threading
+import time
+import urllib.error
+import urllib.request
+from pathlib import Path
+from typing import Callable, Iterator, Optional
+
+from progress import Snapshot, format_eta, format_rate
+
+FINISHED = ("done", "failed", "cancelled")
+
+
+class DaemonError(RuntimeError):
+    pass
+
+
+def daemon_token(cfg, create: bool = False) -> str:
+    """Return the API token from the config or ``daemon_token_path``.
+
+    With ``create`` (the daemon itself) a missing token file is filled with
+    a new random token, readable by the current user only.
+    """
+    if cfg.daemon_token:
+        return cfg.daemon_token
+    path = Path(cfg.daemon_token_path).expanduser()
+    try:
+        token = path.read_text().strip()
+    except OSError:
+        token = ""
+    if token or not create:
+        return token
+    token = secrets.token_urlsafe(32)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    fd = os.open(str(path), os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+    with os.fdopen(fd, "w") as f:
+        f.write(token + "\n")
+    return token
+
+
+class DaemonClient:
+    def __init__(self, base_url: str, token: str = "", timeout: float = 10):
+        self.base_url = base_url.rstrip("/")
+        self.token = token
+        self.timeout = timeout
+
+    def _request(self, method: str, path: str, data: Optional[bytes] = None) -> urllib.request.Request:
+        req = urllib.request.Request(self.base_url + path, data=data, method=method)
+        if self.token:
+            req.add_header("Authorization", f"Bearer {self.token}")
+        if data is not None:
+            req.add_header("Content-Type", "application/json")
+        return req
+
+    def _call(self, method: str, path: str, body: Optional[dict] = None, timeout: Optional[float] = None):
+        data = json.dumps(body).encode() if body is not None else None
+        req = self._request(method, path, data)
+        try:
+            with urllib.request.urlopen(req, timeout=timeout or self.timeout) as resp:
+                return json.loads(resp.read() or b"{}")
+        except urllib.error.HTTPError as e:
+            try:
+                msg = json.loads(e.read()).get("error") or str(e)
+            except ValueError:
+                msg = str(e)
+            raise DaemonError(msg) from None
+
+    def available(self, timeout: float = 0.3) -> bool:
+        """Return whether a daemon answers at ``base_url``."""
+        try:
+            return bool(self._call("GET", "/health", timeout=timeout).get("ok"))
+        except (OSError, ValueError, DaemonError):
+            return False
+
+    def submit(self, urls: list[str]) -> list[dict]:
+        return self._call("POST", "/jobs", {"urls": urls})["jobs"]
+
+    def jobs(self) -> dict:
+        return self._call("GET", "/jobs")
+
+    def cancel(self, job_id: int) -> dict:
+        return self._call("DELETE", f"/jobs/{job_id}")
+
+    def move(self, job_id: int, delta: int) -> dict:
+        return self._call("POST", f"/jobs/{job_id}/move", {"delta": delta})
+
+    def clear(self) -> list[int]:
+        return self._call("POST", "/jobs/clear", {})["cleared"]
+
+    def events(self, timeout: float = 60) -> Iterator[dict]:
+        """Yield the daemon's state after every change until the connection ends."""
+        with urllib.request.urlopen(self._request("GET", "/events"), timeout=timeout) as resp:
+            for line in resp:
+                if line.strip():
+                    yield json.loads(line)
+
+
+def _snapshot(name: str, d: dict, finished: bool = False) -> Snapshot:
+    return Snapshot(name, d.get("done") or 0, d.get("total"), d.get("speed") or 0.0, finished)
+
+
+class RemoteJob:
+    """Client-side copy of a daemon job, shaped like :class:`jobqueue.QueuedJob`."""
+
+    def __init__(self, d: dict):
+        self.id = d["id"]
+        # progress is published under this name, see RemoteJobQueue
+        self.names = {f"#{self.id}"}
+        self.update(d)
+
+    def update(self, d: dict) -> None:
+        self.url = d["url"]
+        self.state = d["state"]
+        self.height = d.get("height") or 0
+        self.error = d.get("error")
+        self.data = d
+
+    @property
+    def finished(self) -> bool:
+        return self.state in FINISHED
+
+
+class RemoteJobQueue:
+    """A :class:`jobqueue.JobQueue` look-alike whose jobs run in the daemon.
+
+    A background thread follows the event stream, keeps the job list current
+    and hands the progress to ``publish(snaps, total)`` like a
+    :class:`progress.ProgressAggregator` would.
+    """
+
+    def __init__(self, client: DaemonClient, publish: Callable[[list[Snapshot], Snapshot], None]):
+        self.client = client
+        self.publish = publish
+        self._jobs: list[RemoteJob] = []
+        self._lock = threading.Lock()
+        self._closed = False
+
+    def start(self) -> None:
+        threading.Thread(target=self._follow, name="daemon-events", daemon=True).start()
+
+    def _apply(self, state: dict) -> None:
+        with self._lock:
+            known = {j.id: j for j in self._jobs}
+            jobs = []
+            for d in state["jobs"]:
+                job = known.get(d["id"])
+                if job is None:
+                    job = RemoteJob(d)
+                else:
+                    job.update(d)
+                jobs.append(job)
+            self._jobs = jobs
+        snaps = [_snapshot(f"#{j.id}", j.data, j.state == "done") for j in jobs if j.data.get("total")]
+        self.publish(snaps, _snapshot("Gesamt", state["total"]))
+
+    def _follow(self) -> None:
+        while not self._closed:
+            try:
+                for state in self.client.events():
+                    if self._closed:
+                        return
+                    self._apply(state)
+            except (OSError, ValueError):
+                pass
+            # the daemon restarted or the connection dropped
+            time.sleep(1)
+
+    def submit(self, url: str) -> RemoteJob:
+        job = RemoteJob(self.client.submit([url])[0])
+        with self._lock:
+            if all(j.id != job.id for j in self._jobs):
+                self._jobs.append(job)
+        return job
+
+    def jobs(self) -> list[RemoteJob]:
+        with self._lock:
+            return list(self._jobs)
+
+    def get(self, job_id: int) -> Optional[RemoteJob]:
+        with self._lock:
+            return next((j for j in self._jobs if j.id == job_id), None)
+
+    def cancel(self, job_id: int) -> bool:
+        try:
+            self.client.cancel(job_id)
+        except DaemonError:
+            return False
+        return True
+
+    def move(self, job_id: int, delta: int) -> bool:
+        try:
+            self.client.move(job_id, delta)
+        except DaemonError:
+            return False
+        return True
+
+    def clear_finished(self) -> list[RemoteJob]:
+        cleared = set(self.client.clear())
+        with self._lock:
+            gone = [j for j in self._jobs if j.id in cleared]
+            self._jobs = [j for j in self._jobs if j.id not in cleared]
+        return gone
+
+    def close(self) -> None:
+        # the jobs keep running in the daemon
+        self._closed = True
+
+
+def run_remote(cfg) -> int:
+    """Submit ``cfg.urls`` to the daemon and report until all are finished.
+
+    Ctrl+C cancels the submitted jobs. Returns the number of failed jobs.
+    """
+    client = DaemonClient(cfg.daemon_url, daemon_token(cfg))
+    if not client.available():
+        raise SystemExit(f"Kein Dienst unter {cfg.daemon_url} – mit `python main.py --serve` starten")
+    try:
+        mine = {d["id"]: d for d in client.submit(cfg.urls)}
+    except DaemonError as e:
+        raise SystemExit(f"Dienst lehnt die Jobs ab: {e}")
+    for d in mine.values():
+        print(f"#{d['id']} eingereiht: {d['url']}")
+    last_line = 0.0
+    try:
+        for state in client.events():
+            for d in state["jobs"]:
+                old = mine.get(d["id"])
+                if old is None:
+                    continue
+                mine[d["id"]] = d
+                if d["state"] != old["state"]:
+                    extra = f" ({d['error']})" if d.get("error") else ""
+                    print(f"#{d['id']} {d['state']}{extra}: {d['url']}")
+            if all(d["state"] in FINISHED for d in mine.values()):
+                break
+            if time.monotonic() - last_line >= 5:
+                last_line = time.monotonic()
+                running = [d for d in mine.values() if d["state"] == "downloading"]
+                for d in running:
+                    print(
+                        f"#{d['id']} {d['percent']:5.1f}% {format_rate(d['speed'] or 0)}"
+                        f" ETA {format_eta(d['eta'])}"
+                    )
+    except KeyboardInterrupt:
+        for job_id, d in mine.items():
+            if d["state"] not in FINISHED:
+                try:
+                    client.cancel(job_id)
+                except DaemonError:
+                    pass
+        print("Abgebrochen")
+    failed = [d for d in mine.values() if d["state"] == "failed"]
+    if failed:
+        print(f"{len(failed)} von {len(mine)} Jobs fehlgeschlagen")
+    return len(failed)
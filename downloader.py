@@ -1,128 +1,199 @@
 import asyncio
-import re
+import json
 import subprocess
-from concurrent.futures import ThreadPoolExecutor
+import threading
+import time
 from pathlib import Path
-from typing import Optional, Tuple
-
-import requests
-from yt_dlp import YoutubeDL
-from yt_dlp.utils import DownloadError
-from playwright.async_api import async_playwright
+from typing import Callable, Optional, Tuple
+from urllib.parse import quote
+
+import browser_pool
+import extractors
+import host_stats
+import light_sniff
+import logs
+import metrics
+import probe_cache
+import race
+import request_filter
+import runtime
+from browser_pool import get_pool
+from runtime import run_blocking, run_process
+from host_stats import get_stats
+from http_client import HEADERS, get_client
+from logs import DEBUG, ERROR, WARNING, job_context
+from extractors import STREAM_EXTS
+from metrics import get_metrics, span
+from manifest import probe_manifest
+from probe_cache import get_cache, normalize_url
+from resumable import ResumableDownloader, Unsupported
+from uploader import WebDAVUploader
 
 # flag to avoid repeatedly trying Playwright when the bundled browsers are
 # missing and sniffing is therefore impossible
 PLAYWRIGHT_AVAILABLE = True
-from rich.table import Table
-
-STREAM_EXTS = (".m3u8", ".mpd", ".mp4")
-
-# Known embed host patterns whose URLs we can hand off to yt-dlp
-HOST_HINTS = [
-    "supervideo.cc",
-    "p2pplay",
-    "kinoger.pw",
-    "kinoger.ru",
-]
-
-# rudimentary ad host patterns that should be blocked during sniffing
-AD_PATTERNS = [
-    "doubleclick",
-    "googlesyndication",
-    "adservice",
-    "popads",
-    "ads.",
-]
-
-# HTTP headers used for all yt-dlp requests so that hosts protected by
-# Cloudflare see us as a regular browser
-HEADERS = {
-    "User-Agent": (
-        "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 "
-        "(KHTML, like Gecko) Chrome/137.0.0.0 Safari/537.36"
-    ),
-    "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8",
-    "Accept-Language": "en-US,en;q=0.5",
-    "Sec-Fetch-Mode": "navigate",
-}
-
-
-def _fetch_html(url: str) -> str:
-    """Retrieve ``url`` using yt-dlp's HTTP client with impersonation.
+
+# decode packed/encoded player scripts over HTTP before starting a browser
+LIGHT_SNIFF = True
+
+# Sniffing stops SNIFF_GRACE seconds after the first stream that satisfies
+# the requested height was captured, and after SNIFF_DEADLINE at the latest.
+SNIFF_DEADLINE = 30.0
+SNIFF_GRACE = 2.0
+
+# The best RACE_CANDIDATES usable streams are raced against each other before
+# downloading (0 disables the race), see race.py.
+RACE_CANDIDATES = 0
+RACE_SECONDS = 4.0
+RACE_BYTES = 8 * 1048576
+
+# The partial file is probed once EARLY_CHECK_BYTES have been downloaded and
+# the download aborted if it is below the requested height (0 disables).
+EARLY_CHECK_BYTES = 4 * 1048576
+
+# serialises the stream table and selection prompt when several jobs are
+# resolved concurrently so their output doesn't interleave
+_PROMPT_LOCK = threading.Lock()
+
+def configure(cfg) -> None:
+    """Apply ``cfg`` to the module settings and shared resources."""
+    global SNIFF_DEADLINE, SNIFF_GRACE, RACE_CANDIDATES, RACE_SECONDS, RACE_BYTES, EARLY_CHECK_BYTES
+    global LIGHT_SNIFF
+    LIGHT_SNIFF = cfg.light_sniff
+    SNIFF_DEADLINE = cfg.sniff_deadline
+    SNIFF_GRACE = cfg.sniff_grace
+    RACE_CANDIDATES = cfg.race_candidates
+    RACE_SECONDS = cfg.race_seconds
+    RACE_BYTES = int(cfg.race_mb * 1048576)
+    EARLY_CHECK_BYTES = int(cfg.early_check_mb * 1048576)
+    logs.configure(cfg)
+    probe_cache.configure(cfg)
+    host_stats.configure(cfg)
+    metrics.configure(cfg)
+    browser_pool.configure(cfg)
+    extractors.configure(cfg)
+    request_filter.configure(cfg)
+
+
+def shutdown(ui=None) -> None:
+    """Release the browser pool, event loop, probe cache, host history and
+    metrics files."""
+    if ui:
+        get_client().report(ui)
+        light_sniff.TOTALS.report(ui)
+    browser_pool.close_pool()
+    runtime.shutdown()
+    get_cache().close()
+    get_stats().close()
+    get_metrics().close()
+
+
+def _fetch_html(url: str, referer: Optional[str] = None) -> str:
+    """Retrieve ``url`` through the shared HTTP client.
 
     Some hosts (e.g. Cloudflare protected sites) block plain ``requests``
-    calls. By reusing yt-dlp's downloader with ``generic:impersonate`` we
-    mimic a real browser and get the full HTML needed to locate embed
-    players.
+    calls. The client retries those with a browser-impersonating session
+    and remembers the host, so later fetches go there directly. Embed pages
+    are requested with the embedding page as ``referer``.
     """
-    opts = {
-        "quiet": True,
-        "extractor_args": {"generic": ["impersonate"]},
-        "http_headers": HEADERS,
-    }
-    try:
-        with YoutubeDL(opts) as ydl:
-            with ydl.urlopen(url) as resp:
-                data = resp.read()
-    except Exception:
-        opts.pop("extractor_args", None)
-        with YoutubeDL(opts) as ydl:
-            with ydl.urlopen(url) as resp:
-                data = resp.read()
-    try:
-        return data.decode()
-    except Exception:
-        return data.decode("utf-8", errors="ignore")
+    return get_client().fetch_text(url, headers={"Referer": referer} if referer else None)
+
+
+async def _discover(url: str, html: str, fresh: bool = False) -> extractors.Discovery:
+    """Find streams and embeds on ``url``, following embed pages over HTTP."""
+
+    async def fetch(page: str, referer: str) -> str:
+        return await run_blocking(_fetch_html, page, referer)
 
+    return await extractors.find_candidates(
+        url, html, fetch, extractors.DEPTH, extractors.get_page_cache(), fresh
+    )
 
-def _extract_embeds(html: str) -> list[str]:
-    urls = set(re.findall(r"https?://[^\"'\s]+", html))
-    return [u for u in urls if any(h in u for h in HOST_HINTS)]
 
+class SniffStats:
+    """Timings and counters collected while sniffing one page."""
 
-async def _sniff(url: str, ui=None) -> list[str]:
+    def __init__(self, url: str):
+        self.url = url
+        self.elapsed = 0.0
+        self.first_stream: Optional[float] = None
+        self.first_good: Optional[float] = None
+        self.frames_clicked = 0
+        self.requests_seen = 0
+        self.streams = 0
+        self.filtered = request_filter.FilterStats()
+
+    def summary(self) -> str:
+        first = f"{self.first_stream:.1f}s" if self.first_stream is not None else "-"
+        return (
+            f"Sniff {self.url}: {self.elapsed:.1f}s, erster Stream nach {first}, "
+            f"{self.streams} Stream(s), {self.frames_clicked} Frame(s) geklickt, "
+            f"{self.requests_seen} Requests, {self.filtered.summary()}"
+        )
+
+
+async def sniff_async(url: str, ui=None, min_height: int = 0, stats: Optional[SniffStats] = None) -> list[str]:
     """Capture media requests by exploring the page with Playwright.
 
+    The page is opened in a fresh context of the shared browser pool. Every
+    captured stream is probed right away; once one reaches ``min_height``
+    sniffing continues only for ``SNIFF_GRACE`` seconds to pick up
+    stragglers, and it never runs longer than ``SNIFF_DEADLINE``.
+
     If launching the browser fails (e.g. because ``playwright install`` wasn't
     run), the failure is propagated and ``PLAYWRIGHT_AVAILABLE`` is set to
     ``False`` so later calls can skip sniffing altogether.
     """
     global PLAYWRIGHT_AVAILABLE
+    stats = stats if stats is not None else SniffStats(url)
+    loop = asyncio.get_running_loop()
+    start = loop.time()
+    deadline = start + SNIFF_DEADLINE
+    # compiling a large blocklist reads files, so not on the loop
+    flt = await run_blocking(request_filter.get_filter, ui)
     try:
-        async with async_playwright() as pw:
-            browser = await pw.firefox.launch(headless=True)
-            context = await browser.new_context()
-
-            async def block_ads(route):
-                if any(pat in route.request.url for pat in AD_PATTERNS):
-                    if ui:
-                        ui.log(f"Blocked {route.request.url}")
-                    await route.abort()
-                else:
-                    await route.continue_()
-
-            await context.route("**", block_ads)
+        async with get_pool().context() as context:
+            # images, fonts, stylesheets and ad/tracker domains never load
+            await context.route("**", lambda route: flt.route(route, stats.filtered))
 
             page = await context.new_page()
             page.on("popup", lambda p: asyncio.create_task(p.close()))
             context.on("page", lambda p: asyncio.create_task(p.close()))
 
             found: set[str] = set()
+            good = asyncio.Event()
+
+            async def check(stream: str):
+                # the shared probe may be awaited by other jobs as well, so
+                # never let a cancellation here propagate into it
+                h, _, err = await asyncio.shield(probe_async(stream))
+                if not err and h >= min_height:
+                    if stats.first_good is None:
+                        stats.first_good = loop.time() - start
+                    good.set()
 
             async def handle_response(response):
                 u = response.url.split("?")[0]
-                if u.endswith(STREAM_EXTS):
+                if u.endswith(STREAM_EXTS) and response.url not in found:
                     found.add(response.url)
+                    stats.streams += 1
+                    if stats.first_stream is None:
+                        stats.first_stream = loop.time() - start
                     if ui:
                         ui.log(f"Found {response.url}")
+                    asyncio.create_task(check(response.url))
+
+            def count_request(request):
+                stats.requests_seen += 1
 
+            context.on("request", count_request)
             context.on("response", handle_response)
 
             # Visiting some pages takes a while. We do not want navigation
             # timeouts to abort sniffing, so swallow any errors and keep waiting
             # for network responses instead.
             try:
-                await page.goto(url, timeout=60_000)
+                await page.goto(url, timeout=SNIFF_DEADLINE * 1000, wait_until="domcontentloaded")
             except Exception:
                 pass
 
@@ -130,7 +201,7 @@ async def _sniff(url: str, ui=None) -> list[str]:
 
             async def trigger(frame):
                 fid = id(frame)
-                if fid in visited:
+                if fid in visited or good.is_set():
                     return
                 visited.add(fid)
 
@@ -146,6 +217,7 @@ async def _sniff(url: str, ui=None) -> list[str]:
                 for sel in selectors:
                     try:
                         await frame.locator(sel).first.click(timeout=1_000, force=True, no_wait_after=True)
+                        stats.frames_clicked += 1
                         break
                     except Exception:
                         continue
@@ -156,13 +228,20 @@ async def _sniff(url: str, ui=None) -> list[str]:
 
             page.on("frameattached", lambda f: asyncio.create_task(trigger(f)))
 
-            end = asyncio.get_event_loop().time() + 30
-            while asyncio.get_event_loop().time() < end:
+            end = deadline
+            while loop.time() < end:
+                if good.is_set():
+                    end = min(end, loop.time() + SNIFF_GRACE)
+                    await asyncio.sleep(min(0.25, max(0.0, end - loop.time())))
+                    continue
                 for f in page.frames:
                     await trigger(f)
-                await asyncio.sleep(2)
+                try:
+                    await asyncio.wait_for(good.wait(), timeout=0.25)
+                except asyncio.TimeoutError:
+                    pass
 
-            await browser.close()
+            stats.elapsed = loop.time() - start
             return list(found)
     except Exception as e:
         PLAYWRIGHT_AVAILABLE = False
@@ -172,6 +251,46 @@ async def _sniff(url: str, ui=None) -> list[str]:
         raise
 
 
+async def _sniff_logged(url: str, ui=None, min_height: int = 0) -> list[str]:
+    stats = SniffStats(url)
+    try:
+        with span("sniff", url) as sp:
+            found = await sniff_async(url, ui, min_height, stats)
+            sp.set(
+                streams=len(found),
+                requests=stats.requests_seen,
+                blocked=stats.filtered.blocked,
+                saved_bytes=stats.filtered.bytes_saved,
+            )
+            return found
+    finally:
+        if ui and stats.elapsed:
+            ui.log(stats.summary())
+
+
+async def _light_sniff_logged(
+    url: str, embeds: list[str], known: dict[str, str], ui
+) -> tuple[list[str], light_sniff.LightStats]:
+    """Run the HTTP-only light sniff on ``url`` and the embed pages that
+    didn't name a stream; ``known`` holds the pages discovery already has."""
+
+    async def fetch(page: str, referer: Optional[str]) -> str:
+        return await run_blocking(_fetch_html, page, referer)
+
+    stats = light_sniff.LightStats(url)
+    pages = [(url, None)] + [(e, url) for e in embeds if not extractors.is_stream(e)]
+    with span("light_sniff", url) as sp:
+        found = await light_sniff.light_sniff(pages, fetch, stats, known)
+        sp.set(pages=stats.pages, scripts=stats.scripts, decoded=stats.decoded, streams=stats.streams)
+    ui.log(stats.summary(), DEBUG)
+    return found, stats
+
+
+def sniff(url: str, ui=None, min_height: int = 0) -> list[str]:
+    """Blocking wrapper around :func:`sniff_async`."""
+    return runtime.run(_sniff_logged(url, ui, min_height))
+
+
 def _format_size(size: Optional[int]) -> str:
     if not size:
         return "?"
@@ -181,240 +300,464 @@ def _format_size(size: Optional[int]) -> str:
         size /= 1024
     return f"{size:.1f} TB"
 
-def _probe_with_ffprobe(url: str) -> int:
-    """Return stream height for ``url`` using ffprobe.
 
-def _probe_with_ffprobe(url: str) -> int:
+async def _probe_with_ffprobe(url: str) -> int:
     """Return stream height for ``url`` using ffprobe.
 
     This is slower than yt-dlp metadata probing but more reliable for
     playlists that do not expose resolution information.
     """
+    code, out = await run_process(
+        "ffprobe",
+        "-v",
+        "error",
+        "-select_streams",
+        "v:0",
+        "-show_entries",
+        "stream=height",
+        "-of",
+        "csv=p=0",
+        url,
+        timeout=15,
+    )
     try:
-        cmd = [
-            "ffprobe",
-            "-v",
-            "error",
-            "-select_streams",
-            "v:0",
-            "-show_entries",
-            "stream=height",
-            "-of",
-            "csv=p=0",
-            url,
-        ]
-        out = subprocess.run(cmd, capture_output=True, text=True, timeout=15)
-        if out.returncode == 0 and out.stdout.strip():
-            return int(out.stdout.strip())
-    except Exception:
-        pass
-    return 0
+        return int(out.strip()) if code == 0 else 0
+    except ValueError:
+        return 0
 
 
-def _probe_stream(url: str) -> Tuple[int, Optional[int], Optional[str]]:
+# At most PROBE_LIMIT probes run at once; concurrent requests for the same
+# (token-stripped) URL share one in-flight probe.
+PROBE_LIMIT = 8
+_INFLIGHT: dict[str, asyncio.Task] = {}
+_PROBE_SLOTS: Optional[asyncio.Semaphore] = None
+_SLOTS_LOOP = None
+
+
+def _probe_slots() -> asyncio.Semaphore:
+    global _PROBE_SLOTS, _SLOTS_LOOP
+    loop = asyncio.get_running_loop()
+    if _SLOTS_LOOP is not loop:
+        _PROBE_SLOTS, _SLOTS_LOOP = asyncio.Semaphore(PROBE_LIMIT), loop
+    return _PROBE_SLOTS
+
+
+async def _probe_cached(url: str) -> Tuple[int, Optional[int], Optional[str]]:
+    # the cache and host history are SQLite, so they stay off the loop
+    cache = get_cache()
+    cached = await run_blocking(cache.get, url)
+    if cached is not None:
+        return cached
+    async with _probe_slots():
+        start = time.monotonic()
+        result = await _probe_uncached(url)
+    await run_blocking(get_stats().probe, url, time.monotonic() - start)
+    await run_blocking(cache.put, url, result)
+    return result
+
+
+async def probe_async(url: str) -> Tuple[int, Optional[int], Optional[str]]:
     """Return ``(height, size, error)`` for ``url``.
 
-    ``error`` contains a short message if probing failed.
+    ``error`` contains a short message if probing failed. Results are served
+    from the on-disk probe cache when a fresh entry for the (token-stripped)
+    URL exists; failures only for the exact URL.
     """
-    opts = {
-        "quiet": True,
-        "extractor_args": {"generic": ["impersonate"]},
-        "http_headers": HEADERS,
-    }
-    try:
-        with YoutubeDL(opts) as ydl:
-            info = ydl.extract_info(url, download=False)
-    except Exception:
+    key = normalize_url(url)
+    task = _INFLIGHT.get(key)
+    shared = task is not None
+    if task is None:
+        task = asyncio.ensure_future(_probe_cached(url))
+        task.url = url
+        _INFLIGHT[key] = task
+        task.add_done_callback(lambda t: _INFLIGHT.pop(key, None) if _INFLIGHT.get(key) is t else None)
+    # other callers may be waiting for the same task
+    result = await asyncio.shield(task)
+    if shared and result[2] and task.url != url:
+        # the other link may just have expired; this one deserves its own probe
+        return await _probe_cached(url)
+    return result
+
+
+def _probe_stream(url: str) -> Tuple[int, Optional[int], Optional[str]]:
+    """Blocking wrapper around :func:`probe_async`."""
+    return runtime.run(probe_async(url))
+
+
+def _fetch_text(url: str) -> str:
+    return get_client().fetch_text(url, timeout=10)
+
+
+async def _probe_uncached(url: str) -> Tuple[int, Optional[int], Optional[str]]:
+    # Manifests usually state their resolutions; reading them directly
+    # avoids yt-dlp's extractor and ffprobe for the common case.
+    if url.split("?")[0].lower().endswith((".m3u8", ".mpd")):
         try:
-            opts.pop("extractor_args", None)
-            with YoutubeDL(opts) as ydl:
-                info = ydl.extract_info(url, download=False)
-        except Exception as e:
-            height = _probe_with_ffprobe(url)
-            if height:
-                return height, None, None
-            return 0, None, str(e)
+            parsed = await run_blocking(probe_manifest, url, _fetch_text)
+        except Exception:
+            parsed = None
+        if parsed:
+            return parsed[0], parsed[1], None
+
+    try:
+        info = await run_blocking(get_client().extract_info, url)
+    except Exception as e:
+        height = await _probe_with_ffprobe(url)
+        if height:
+            return height, None, None
+        return 0, None, str(e)
     formats = info.get("formats") or [info]
     best = max(formats, key=lambda f: f.get("height") or 0)
     height = best.get("height") or 0
     size = best.get("filesize") or best.get("filesize_approx")
     if not height:
-        height = _probe_with_ffprobe(url)
+        height = await _probe_with_ffprobe(url)
     return height, size, None
 
 
-def _verify_resolution(path: str) -> int:
-    """Return the height of the first video stream in ``path``.
+async def inspect_media_async(path: str) -> dict:
+    """Return height, video codec, duration and stream counts of ``path``.
 
-    This uses ``ffprobe`` on the downloaded file as a fallback verification
-    step since some hosts may not expose accurate metadata via yt-dlp.
+    Works on partial files as well, as long as the container header has
+    been written. Unknown values are ``0``/``None``.
     """
+    result = {"height": 0, "vcodec": None, "duration": 0.0, "video": 0, "audio": 0}
+    _, out = await run_process(
+        "ffprobe",
+        "-v",
+        "error",
+        "-show_entries",
+        "stream=codec_type,codec_name,height:format=duration",
+        "-of",
+        "json",
+        path,
+        timeout=30,
+    )
     try:
-        cmd = [
-            "ffprobe",
-            "-v",
-            "error",
-            "-select_streams",
-            "v:0",
-            "-show_entries",
-            "stream=height",
-            "-of",
-            "csv=p=0",
-            path,
-        ]
-        out = subprocess.run(cmd, capture_output=True, text=True, check=True)
-        return int(out.stdout.strip())
-    except Exception:
-        return 0
+        data = json.loads(out or "{}")
+    except ValueError:
+        return result
+    for st in data.get("streams", []):
+        if st.get("codec_type") == "video":
+            result["video"] += 1
+            if not result["height"]:
+                result["height"] = int(st.get("height") or 0)
+                result["vcodec"] = st.get("codec_name")
+        elif st.get("codec_type") == "audio":
+            result["audio"] += 1
+    try:
+        result["duration"] = float(data.get("format", {}).get("duration") or 0)
+    except ValueError:
+        pass
+    return result
 
 
-def resolve_url(url: str, ui, min_height: int) -> tuple[list[str], int]:
-    if url.split("?")[0].endswith(STREAM_EXTS):
-        height, _, err = _probe_stream(url)
-        if err:
-            raise RuntimeError(f"Stream nicht nutzbar: {err}")
-        if height < min_height:
-            ui.log(f"Stream bietet nur {height}p")
-        return [url], height
+def _inspect_media(path: str) -> dict:
+    """Blocking wrapper around :func:`inspect_media_async`."""
+    return runtime.run(inspect_media_async(path))
 
-    embeds: list[str] = []
-    try:
-        html = _fetch_html(url)
-        embeds = _extract_embeds(html)
-    except Exception:
-        pass
-    candidates = list(dict.fromkeys(embeds))
 
-    def probe(cands: list[str]):
-        if not cands:
-            return []
-        with ThreadPoolExecutor() as ex:
-            infos = list(ex.map(_probe_stream, cands))
-        items = list(zip(cands, infos))
-        return sorted(
-            items,
-            key=lambda x: ((x[1][0] or 0), x[1][1] or 0),
-            reverse=True,
-        )
+class QualityMismatch(Exception):
+    """The data being downloaded doesn't have the promised quality."""
 
-    items = probe(candidates)
+    def __init__(self, message: str, height: int = 0):
+        super().__init__(message)
+        self.height = height
 
-    candidates = list(dict.fromkeys(embeds))
 
-    def probe(cands: list[str]):
-        if not cands:
-            return []
-        with ThreadPoolExecutor() as ex:
-            infos = list(ex.map(_probe_stream, cands))
-        items = list(zip(cands, infos))
-        return sorted(
-            items,
-            key=lambda x: ((x[1][0] or 0), x[1][1] or 0),
-            reverse=True,
-        )
+def _quality_mismatch(exc: BaseException) -> Optional[QualityMismatch]:
+    """Return the :class:`QualityMismatch` behind ``exc`` (yt-dlp may wrap it)."""
+    while exc is not None:
+        if isinstance(exc, QualityMismatch):
+            return exc
+        exc_info = getattr(exc, "exc_info", None)
+        exc = exc_info[1] if exc_info else exc.__cause__ or exc.__context__
+    return None
 
-    items = probe(candidates)
 
-    for s, (h, _, err) in items:
-        if err:
-            ui.log(f"{s} nicht nutzbar: {err}")
-        elif h < 1080:
-            ui.log(f"{s} bietet nur {h}p")
+class EarlyCheck:
+    """Probe a download's partial file and raise :class:`QualityMismatch`
+    when it is below ``min_height`` or carries no video.
 
-    candidates = list(dict.fromkeys(embeds))
+    Files whose header isn't readable yet (e.g. MP4 with a trailing moov
+    atom) are retried after each further ``first_bytes``; after ``attempts``
+    tries the decision is left to the check after the download.
+    """
 
-    def probe(cands: list[str]):
-        if not cands:
-            return []
-        with ThreadPoolExecutor() as ex:
-            infos = list(ex.map(_probe_stream, cands))
-        items = list(zip(cands, infos))
-        return sorted(
-            items,
-            key=lambda x: ((x[1][0] or 0), x[1][1] or 0),
-            reverse=True,
-        )
-    candidates = list(dict.fromkeys(embeds))
+    def __init__(self, min_height: int, first_bytes: int = EARLY_CHECK_BYTES, attempts: int = 3):
+        self.min_height = min_height
+        self.step = first_bytes
+        self.next_at = first_bytes
+        self.attempts = attempts
+        self.height = 0
+        self.part: Optional[str] = None
+        self.done = not first_bytes
+        self._lock = threading.Lock()
+
+    def __call__(self, d: dict) -> None:
+        if self.done or d.get("status") != "downloading":
+            return
+        if (d.get("info_dict") or {}).get("vcodec") == "none":
+            # the audio half of a split download
+            return
+        if (d.get("downloaded_bytes") or 0) < self.next_at:
+            return
+        # concurrent fragment threads: one probe at a time is enough
+        if not self._lock.acquire(blocking=False):
+            return
+        try:
+            self.next_at += self.step
+            self.part = d.get("tmpfilename") or d.get("filename")
+            info = _inspect_media(self.part) if self.part else {}
+            if info.get("height"):
+                self.done = True
+                self.height = info["height"]
+                if self.height < self.min_height:
+                    raise QualityMismatch(f"Stream liefert nur {self.height}p ({info['vcodec']})", self.height)
+            elif info.get("audio") and not info.get("video"):
+                self.done = True
+                raise QualityMismatch("Stream enthält kein Video")
+            else:
+                self.attempts -= 1
+                self.done = self.attempts <= 0
+        finally:
+            self._lock.release()
+
+    def discard(self) -> None:
+        """Remove the partial file and its resume state."""
+        if not self.part:
+            return
+        for suffix in ("", ".ytdl", ".resume"):
+            Path(self.part + suffix).unlink(missing_ok=True)
+        if self.part.endswith(".part"):
+            Path(self.part[:-5] + ".resume").unlink(missing_ok=True)
+
+
+class ProbeMemo:
+    """Per-job record of probe results.
+
+    Every candidate is probed at most once per resolution; ``probes`` counts
+    the probes that were actually requested so this can be checked in the log.
+    The async methods run on the shared loop, the plain ones wrap them for
+    worker threads.
+    """
 
-    def probe(cands: list[str]):
-        if not cands:
-            return []
-        with ThreadPoolExecutor() as ex:
-            infos = list(ex.map(_probe_stream, cands))
-        items = list(zip(cands, infos))
-        return sorted(
-            items,
-            key=lambda x: ((x[1][0] or 0), x[1][1] or 0),
-            reverse=True,
-        )
+    def __init__(self):
+        self.results: dict[str, Tuple[int, Optional[int], Optional[str]]] = {}
+        # race measurements, kept so a re-resolution doesn't race again
+        self.speeds: dict[str, race.Measurement] = {}
+        self.probes = 0
+        self._tasks: dict[str, asyncio.Future] = {}
+
+    async def probe_many_async(self, urls: list[str]) -> list[tuple[str, Tuple[int, Optional[int], Optional[str]]]]:
+        urls = list(dict.fromkeys(urls))
+        for u in urls:
+            if u not in self._tasks:
+                self._tasks[u] = asyncio.ensure_future(probe_async(u))
+                self.probes += 1
+        for u in urls:
+            try:
+                self.results[u] = await asyncio.shield(self._tasks[u])
+            except Exception as e:
+                self.results[u] = (0, None, str(e))
+        return [(u, self.results[u]) for u in urls]
 
-    items = probe(candidates)
+    async def rank_async(self, urls: list[str]):
+        """Probe ``urls`` and return them sorted by height, then by the
+        host's track record (see ``host_stats``), then by size."""
+        items = await self.probe_many_async(urls)
+        scores = await run_blocking(get_stats().scores, [u for u, _ in items])
+        return sorted(items, key=lambda x: ((x[1][0] or 0), scores[x[0]], x[1][1] or 0), reverse=True)
 
-    candidates = list(dict.fromkeys(embeds))
+    def probe_many(self, urls: list[str]):
+        return runtime.run(self.probe_many_async(urls))
 
-    def probe(cands: list[str]):
-        if not cands:
-            return []
-        with ThreadPoolExecutor() as ex:
-            infos = list(ex.map(_probe_stream, cands))
-        items = list(zip(cands, infos))
-        return sorted(
-            items,
-            key=lambda x: ((x[1][0] or 0), x[1][1] or 0),
-            reverse=True,
-        )
+    def probe(self, url: str) -> Tuple[int, Optional[int], Optional[str]]:
+        return self.probe_many([url])[0][1]
 
-    items = probe(candidates)
+    def rank(self, urls: list[str]):
+        return runtime.run(self.rank_async(urls))
+
+
+def _log_unusable(items, ui, min_height: int) -> None:
     for s, (h, _, err) in items:
         if err:
             ui.log(f"{s} nicht nutzbar: {err}")
         elif h < min_height:
             ui.log(f"{s} bietet nur {h}p")
 
+
+def _locate_media(target: str) -> tuple[str, dict]:
+    """Return the media URL and headers a download of ``target`` would fetch."""
+    if target.split("?")[0].endswith(STREAM_EXTS):
+        return target, {}
+    info = get_client().extract_info(target)
+    fmt = _pick_format(info, 0)
+    if fmt is None:
+        video = [f for f in info.get("formats") or [] if f.get("url") and f.get("vcodec") != "none"]
+        if not video:
+            raise RuntimeError("kein ladbares Format")
+        fmt = max(video, key=lambda f: ((f.get("height") or 0), f.get("tbr") or 0))
+    return fmt["url"], fmt.get("http_headers") or {}
+
+
+def _race_usable(usable, memo: ProbeMemo, ui):
+    """Race the best usable streams and put the fastest first.
+
+    Only streams of the best available height compete, so the race never
+    trades resolution for speed.
+    """
+    if RACE_CANDIDATES < 2 or len(usable) < 2:
+        return usable
+    top = usable[0][1][0]
+    contenders = [s for s, (h, _, _) in usable if h == top][:RACE_CANDIDATES]
+    if len(contenders) < 2:
+        return usable
+    fresh = [s for s in contenders if s not in memo.speeds]
+    if fresh:
+        ui.log(f"Teste Durchsatz von {len(fresh)} Streams ({RACE_SECONDS:.0f}s)")
+        memo.speeds.update(race.race(fresh, _locate_media, get_client(), RACE_SECONDS, RACE_BYTES))
+        for s in fresh:
+            m = memo.speeds[s]
+            ui.log(f"{s}: {m.summary() if not m.error else m.error}")
+    raced = [x for x in usable if x[0] in contenders]
+    return race.rank(raced, memo.speeds) + [x for x in usable if x[0] not in contenders]
+
+
+async def resolve_async(
+    url: str, ui, min_height: int, memo: Optional[ProbeMemo] = None, fresh: bool = False
+) -> tuple[list[str], int]:
+    """Return the usable streams for ``url`` (best first) and the height of
+    the first one.
+
+    With ``fresh`` embed pages are fetched again even if they are cached,
+    e.g. because the streams found there earlier have expired.
+    """
+    memo = memo if memo is not None else ProbeMemo()
+    if url.split("?")[0].endswith(STREAM_EXTS):
+        with span("probe", url) as sp:
+            height, _, err = (await memo.probe_many_async([url]))[0][1]
+            sp.set(candidates=1)
+        if err:
+            raise RuntimeError(f"Stream nicht nutzbar: {err}")
+        if height < min_height:
+            ui.log(f"Stream bietet nur {height}p")
+        return [url], height
+
+    embeds: list[str] = []
+    fallbacks: list[str] = []
+    # pages discovery fetched (or had cached), for the light sniff
+    known: dict[str, str] = {}
+    try:
+        with span("fetch_html", url) as sp:
+            html = await run_blocking(_fetch_html, url)
+            sp.bytes = len(html)
+        known = {url: html}
+        with span("extract_embeds", url) as sp:
+            found = await _discover(url, html, fresh)
+            embeds = found.candidates
+            fallbacks = found.fallbacks
+            known = found.html
+            sp.set(
+                streams=len(found.streams),
+                embeds=len(found.embeds),
+                fallbacks=len(found.fallbacks),
+                pages=found.pages,
+                cached=found.cached,
+            )
+        ui.log(
+            f"{len(found.streams)} Stream(s) und {len(found.embeds)} Embed(s) gefunden "
+            f"(+{len(found.fallbacks)} weitere Stream-URL(s)), "
+            f"{found.pages} Embed-Seite(n) geladen, {found.cached} aus dem Cache",
+            DEBUG,
+        )
+    except Exception:
+        pass
+    candidates = list(dict.fromkeys(embeds))
+
+    with span("probe", url) as sp:
+        probes = memo.probes
+        items = await memo.rank_async(candidates)
+        sp.set(candidates=len(candidates), probes=memo.probes - probes)
+    _log_unusable(items, ui, min_height)
     hd_items = [(s, info) for s, info in items if info[0] >= min_height and not info[2]]
 
+    # stray stream URLs (trailers, ads, previews) only when the player's didn't do
+    if not hd_items and fallbacks:
+        new = [s for s in fallbacks if s not in memo.results]
+        candidates = list(dict.fromkeys(candidates + fallbacks))
+        with span("probe", url) as sp:
+            probes = memo.probes
+            items = await memo.rank_async(candidates)
+            sp.set(candidates=len(candidates), probes=memo.probes - probes)
+        _log_unusable(await memo.probe_many_async(new), ui, min_height)
+        hd_items = [(s, info) for s, info in items if info[0] >= min_height and not info[2]]
+
+    if not hd_items and LIGHT_SNIFF and url in known:
+        lit: list[str] = []
+        stats = light_sniff.LightStats(url)
+        try:
+            lit, stats = await _light_sniff_logged(url, embeds, known, ui)
+        except Exception as e:
+            ui.log(f"Light-Sniff fehlgeschlagen: {e}", DEBUG)
+        new = [s for s in lit if s not in memo.results]
+        if new:
+            candidates = list(dict.fromkeys(candidates + new))
+            with span("probe", url) as sp:
+                probes = memo.probes
+                items = await memo.rank_async(candidates)
+                sp.set(candidates=len(candidates), probes=memo.probes - probes)
+            _log_unusable(await memo.probe_many_async(new), ui, min_height)
+            hd_items = [(s, info) for s, info in items if info[0] >= min_height and not info[2]]
+        light_sniff.TOTALS.add(stats, bool(hd_items))
+        if hd_items:
+            ui.log(f"{len(new)} Stream(s) aus Player-Skripten dekodiert – kein Browser nötig")
+
     if not hd_items and PLAYWRIGHT_AVAILABLE:
         ui.log(f"Keine Streams mit ≥{min_height}p gefunden – starte Playwright-Sniffing")
         sniffed: list[str] = []
         try:
-            sniffed = asyncio.run(_sniff(url, ui))
+            sniffed = await _sniff_logged(url, ui, min_height)
         except Exception as e:
             ui.log(f"Sniff failed: {e}")
+        new = [s for s in sniffed if s not in memo.results]
         candidates = list(dict.fromkeys(candidates + sniffed))
-        items = probe(candidates)
-        for s, (h, _, err) in items:
-            if err:
-                ui.log(f"{s} nicht nutzbar: {err}")
-            elif h < min_height:
-                ui.log(f"{s} bietet nur {h}p")
+        with span("probe", url) as sp:
+            probes = memo.probes
+            items = await memo.rank_async(candidates)
+            sp.set(candidates=len(candidates), probes=memo.probes - probes)
+        _log_unusable(await memo.probe_many_async(new), ui, min_height)
         hd_items = [(s, info) for s, info in items if info[0] >= min_height and not info[2]]
 
+    ui.log(f"{memo.probes} Probe(s) für {len(memo.results)} Kandidaten")
     if not items:
         raise RuntimeError("Kein Stream in geforderter Qualität gefunden")
 
+    usable = hd_items if hd_items else [(s, info) for s, info in items if not info[2]]
+    if not usable:
+        raise RuntimeError("Kein Stream in geforderter Qualität gefunden")
+    if not hd_items:
+        ui.log("Kein Stream in geforderter Qualität gefunden – verwende beste verfügbare Qualität")
+    usable = await run_blocking(_race_usable, usable, memo, ui)
+
+    from rich.table import Table
+
     table = Table(title="Gefundene Streams")
     table.add_column("Nr")
     table.add_column("URL")
     table.add_column("Qualität")
     table.add_column("Größe")
-    for i, (s, (h, size, err)) in enumerate(items, start=1):
+    table.add_column("Tempo")
+    # usable streams first, so "Nr" matches the choice below
+    rows = usable + [(s, info) for s, info in items if (s, info) not in usable]
+    for i, (s, (h, size, err)) in enumerate(rows, start=1):
         qual = f"{h}p" if h else "?"
         if err:
             qual = "-"
-        table.add_row(str(i), s, qual, _format_size(size))
-    ui.console.print(table)
-    usable = hd_items if hd_items else [(s, info) for s, info in items if not info[2]]
-    if not usable:
-        raise RuntimeError("Kein Stream in geforderter Qualität gefunden")
-    if not hd_items:
-        ui.log("Kein Stream in geforderter Qualität gefunden – verwende beste verfügbare Qualität")
-    usable = hd_items if hd_items else [(s, info) for s, info in items if not info[2]]
-    if not usable:
-        raise RuntimeError("Kein Stream in geforderter Qualität gefunden")
-    if not hd_items:
-        ui.log("Kein Stream in geforderter Qualität gefunden – verwende beste verfügbare Qualität")
+        speed = memo.speeds[s].summary() if s in memo.speeds else ""
+        table.add_row(str(i), s, qual, _format_size(size), speed)
 
-    choice = ui.console.input("Welche URL verwenden? [1]: ")
+    choice = await run_blocking(_prompt, ui, table)
     try:
         idx = int(choice) - 1 if choice.strip() else 0
     except ValueError:
@@ -426,40 +769,64 @@ def resolve_url(url: str, ui, min_height: int) -> tuple[list[str], int]:
     return ordered, usable[idx][1][0] or 0
 
 
-def download(url: str, out: str, ui, min_height: int) -> str:
+def _prompt(ui, table) -> str:
+    with _PROMPT_LOCK:
+        ui.console.print(table)
+        return ui.console.input("Welche URL verwenden? [1]: ")
+
+
+def resolve_url(
+    url: str, ui, min_height: int, memo: Optional[ProbeMemo] = None, fresh: bool = False
+) -> tuple[list[str], int]:
+    """Blocking wrapper around :func:`resolve_async`."""
+    return runtime.run(resolve_async(url, ui, min_height, memo, fresh))
+
+
+def download(url: str, out: str, ui, min_height: int, progress=None) -> str:
+    """Download ``url`` into ``out`` and return the file path.
+
+    ``progress`` is called with the yt-dlp progress dict while downloading.
+    Partial ``.part`` files from an earlier, interrupted run are continued.
+    """
     Path(out).mkdir(parents=True, exist_ok=True)
     result = {"path": None}
 
     def hook(d):
+        name = Path(d.get("filename", "")).name
         if d.get("status") == "downloading":
-            total = d.get("total_bytes") or d.get("total_bytes_estimate") or 1
-            percent = round(d.get("downloaded_bytes", 0) / total * 100, 1)
-            speed = d.get("_speed_str", "")
-            eta = d.get("_eta_str", "")
-            ui.update_progress(Path(d.get("filename", "")).name, percent, speed, eta)
+            total = d.get("total_bytes") or d.get("total_bytes_estimate")
+            ui.update_progress(name, d.get("downloaded_bytes", 0), total)
+            if progress:
+                progress(d)
         elif d.get("status") == "finished":
+            size = d.get("total_bytes") or d.get("downloaded_bytes") or 0
+            ui.update_progress(name, size, size, finished=True)
             result["path"] = d.get("filename")
             ui.log(f"Finished {d.get('filename')}")
 
     class YTLogger:
+        # yt-dlp's chatter only goes to the log file; warnings and errors
+        # reach the console as well
         def __init__(self, ui):
             self.ui = ui
 
         def debug(self, msg):
-            self.ui.log(msg)
+            self.ui.log(msg, DEBUG)
 
         info = debug
 
         def warning(self, msg):
-            self.ui.log(f"[yellow]{msg}[/yellow]")
+            self.ui.log(f"[yellow]{msg}[/yellow]", WARNING)
 
         def error(self, msg):
-            self.ui.log(f"[red]{msg}[/red]")
+            self.ui.log(f"[red]{msg}[/red]", ERROR)
 
     ydl_opts = {
         "outtmpl": str(Path(out) / "%(title)s.%(ext)s"),
         "progress_hooks": [hook],
         "concurrent_fragment_downloads": 5,
+        # resume .part files (and fragment state) left by an interrupted run
+        "continuedl": True,
         # Use HTTP client impersonation to bypass Cloudflare checks on generic sites
         "extractor_args": {"generic": ["impersonate"]},
         # ensure at least Full HD quality
@@ -471,22 +838,121 @@ def download(url: str, out: str, ui, min_height: int) -> str:
         "verbose": True,
         "logger": YTLogger(ui),
     }
+    from yt_dlp import YoutubeDL
+
     with YoutubeDL(ydl_opts) as ydl:
         ydl.download([url])
     return result["path"] or ""
 
 
-def upload_to_koofr(local_path: str, cfg, ui) -> None:
+def _pick_format(info: dict, min_height: int) -> Optional[dict]:
+    """Return the best single-file (video+audio) HLS or HTTP format."""
+    formats = info.get("formats") or [info]
+    usable = [
+        f for f in formats
+        if f.get("url")
+        and (f.get("protocol") or "https") in ("m3u8_native", "m3u8", "https", "http")
+        and f.get("vcodec") != "none"
+        and f.get("acodec") != "none"
+    ]
+    good = [f for f in usable if (f.get("height") or 0) >= min_height] or usable
+    if not good:
+        return None
+    return max(good, key=lambda f: ((f.get("height") or 0), f.get("tbr") or 0))
+
+
+def download_resumable(target: str, t: "Transfer", cfg, ui) -> str:
+    """Download ``target`` with mid-transfer token refresh.
+
+    Expired tokens are renewed by extracting ``target`` again. A direct
+    stream URL can only be renewed through its page, so the page is
+    searched (HTML first, then sniffing) for the same stream with a fresh
+    token. Raises :class:`resumable.Unsupported` for streams that need
+    yt-dlp (separate audio, encryption, fMP4).
+    """
+    client = get_client()
+    info = client.extract_info(target)
+    fmt = _pick_format(info, t.min_height)
+    if fmt is None:
+        raise Unsupported("kein Format mit Bild und Ton in einer Datei")
+    height = fmt.get("height") or 0
+
+    def refresh() -> str:
+        source = target
+        if target.split("?")[0].endswith(STREAM_EXTS):
+            key = normalize_url(target)
+            found: list[str] = []
+            try:
+                d = runtime.run(_discover(t.url, _fetch_html(t.url), fresh=True))
+                found = d.candidates + d.fallbacks
+            except Exception:
+                pass
+            fresh = [u for u in found if normalize_url(u) == key and u != target]
+            if not fresh and PLAYWRIGHT_AVAILABLE:
+                fresh = [u for u in sniff(t.url, ui, t.min_height) if normalize_url(u) == key]
+            if not fresh:
+                raise RuntimeError("Kein frischer Link für den Stream gefunden")
+            source = fresh[0]
+        new = _pick_format(client.extract_info(source), height)
+        if new is None:
+            raise RuntimeError("Rendition nach Token-Erneuerung nicht mehr vorhanden")
+        return new["url"]
+
+    dl = ResumableDownloader(
+        client,
+        refresh,
+        headers=fmt.get("http_headers"),
+        refresh_margin=cfg.token_refresh_margin,
+        progress=t.on_progress,
+    )
+    from yt_dlp.utils import sanitize_filename
+
+    Path(cfg.out).mkdir(parents=True, exist_ok=True)
+    name = sanitize_filename(info.get("title") or "video")
+    try:
+        if (fmt.get("protocol") or "").startswith("m3u8"):
+            path = dl.hls(fmt["url"], Path(cfg.out) / f"{name}.ts", ui, height)
+        else:
+            path = dl.progressive(fmt["url"], Path(cfg.out) / f"{name}.{fmt.get('ext') or 'mp4'}", ui)
+    finally:
+        get_stats().expired(target, dl.refreshes)
+    ui.log(f"Finished {path}")
+    return str(path)
+
+
+def _download_target(target: str, t: "Transfer", cfg, ui) -> str:
+    if cfg.token_refresh:
+        try:
+            return download_resumable(target, t, cfg, ui)
+        except QualityMismatch:
+            raise
+        except Unsupported as e:
+            ui.log(f"Fortsetzbarer Download nicht möglich ({e}) – verwende yt-dlp")
+        except Exception as e:
+            ui.log(f"Fortsetzbarer Download fehlgeschlagen: {e} – verwende yt-dlp")
+    return download(target, cfg.out, ui, t.min_height, t.on_progress)
+
+
+def upload_to_koofr(local_path: str, cfg, ui, job: Optional[str] = None) -> None:
+    """Upload ``local_path``; the upload span is recorded under ``job``."""
     user, password = cfg.koofr_user, cfg.koofr_password
     if not (user and password):
         ui.log("Keine Koofr-Credentials, Upload übersprungen")
         return
     base = cfg.koofr_base.strip("/")
     filename = Path(local_path).name
-    url = f"https://app.koofr.net/dav/{base}/{filename}" if base else f"https://app.koofr.net/dav/{filename}"
-    with open(local_path, "rb") as f:
-        resp = requests.put(url, data=f, auth=(user, password))
-    resp.raise_for_status()
+    dav = cfg.koofr_dav_url.rstrip("/")
+    url = f"{dav}/{base}/{filename}" if base else f"{dav}/{filename}"
+    uploader = WebDAVUploader(
+        get_client(),
+        (user, password),
+        chunk_size=cfg.upload_chunk_mb * 1024 * 1024,
+        workers=cfg.upload_workers,
+        retries=cfg.upload_retries,
+    )
+    with span("upload", job or local_path) as sp:
+        uploader.upload(local_path, quote(url, safe=":/"), ui)
+        sp.bytes = Path(local_path).stat().st_size
     ui.log(f"Upload nach Koofr abgeschlossen: {filename}")
 
 
@@ -502,75 +968,206 @@ def disconnect_vpn(ui) -> None:
     subprocess.run(["surfshark-vpn", "disconnect"], check=False)
 
 
-def process(url: str, cfg, ui) -> None:
-    base_url = url
-    candidates, first_height = resolve_url(base_url, ui, cfg.min_height)
-    min_height = cfg.min_height
-    if first_height < min_height:
+class Transfer:
+    """State of one page URL on its way through resolve, download, verify
+    and upload."""
+
+    def __init__(self, url: str, cfg):
+        self.url = url
+        self.memo = ProbeMemo()
+        self.candidates: list[str] = []
+        self.seen: set[str] = set()
+        self.min_height = cfg.min_height
+        self.target: Optional[str] = None
+        self.path = ""
+        # set when restored from the journal with a known stream; the page
+        # is only resolved again if that stream no longer works
+        self.restored = False
+        self.journal = None
+        self.early: Optional[EarlyCheck] = None
+        self._last_record = 0.0
+
+    def record(self, sync: bool = True, **fields) -> None:
+        if self.journal is not None:
+            self.journal.update(self.url, sync=sync, **fields)
+
+    def restore(self, entry: dict) -> None:
+        """Pick up the stream and file recorded in a journal entry."""
+        if entry.get("min_height") is not None:
+            self.min_height = entry["min_height"]
+        self.path = entry.get("path") or ""
+        self.target = entry.get("target")
+        if self.target:
+            self.candidates = [self.target]
+            self.restored = True
+
+    def on_progress(self, d: dict) -> None:
+        if self.early is not None:
+            self.early(d)
+        now = time.monotonic()
+        if now - self._last_record < 5:
+            return
+        self._last_record = now
+        if self.target:
+            get_stats().throughput(self.target, d.get("speed"))
+        self.record(
+            sync=False,
+            bytes=d.get("downloaded_bytes", 0),
+            total=d.get("total_bytes") or d.get("total_bytes_estimate"),
+            part=d.get("tmpfilename"),
+        )
+
+
+def resolve_transfer(t: Transfer, cfg, ui) -> None:
+    t.candidates, first_height = resolve_url(t.url, ui, cfg.min_height, t.memo)
+    if first_height < t.min_height:
         if first_height:
             ui.log(f"Falle auf {first_height}p zurück")
         else:
             ui.log("Falle auf unbekannte Qualität zurück")
-        min_height = first_height
-    seen: set[str] = set()
+        t.min_height = first_height
+    t.restored = False
+    t.record(state="resolved", min_height=t.min_height)
 
+
+def download_transfer(t: Transfer, cfg, ui) -> bool:
+    """Try the remaining candidates until one downloads.
+
+    Returns ``False`` once every candidate has failed.
+    """
+    candidates = t.candidates
+    stats = get_stats()
+    deferred: set[str] = set()
     while candidates:
         target = candidates.pop(0)
-        if target in seen:
+        if target in t.seen:
             continue
-        seen.add(target)
+        # hosts that failed repeatedly lately go last, once
+        if target not in deferred and stats.unreliable(target):
+            if any(c not in t.seen and not stats.unreliable(c) for c in candidates):
+                ui.log(f"{target} war zuletzt oft fehlerhaft – versuche ihn später")
+                deferred.add(target)
+                candidates.append(target)
+                continue
+        t.seen.add(target)
         ui.log(f"Versuche {target}")
-        height, _, err = _probe_stream(target)
+        height, _, err = t.memo.probe(target)
         if err:
             ui.log(f"Stream {target} nicht nutzbar: {err}")
             continue
-        if height < min_height:
+        if height < t.min_height:
             ui.log(f"Stream {target} bietet nur {height}p – überspringe")
             continue
+        t.target = target
+        t.early = EarlyCheck(t.min_height)
+        t.record(state="downloading", target=target)
         try:
-            path = download(target, cfg.out, ui, min_height)
+            with span("download", t.url) as sp:
+                sp.set(target=target)
+                path = _download_target(target, t, cfg, ui)
+                if path and Path(path).exists():
+                    sp.bytes = Path(path).stat().st_size
         except Exception as e:
+            mismatch = _quality_mismatch(e)
+            if mismatch is not None:
+                ui.log(f"{target}: {mismatch} – breche ab und versuche nächste URL")
+                t.early.discard()
+                if mismatch.height:
+                    # the probe overestimated this stream; remember the truth
+                    get_cache().put(target, (mismatch.height, None, None))
+                continue
             msg = str(e)
             ui.log(f"yt-dlp konnte {target} nicht verarbeiten: {e}; versuche nächste URL")
-            # Tokens in stream URLs often expire and cause 403/404 responses.
-            # When that happens, re-resolve the original page to obtain fresh links.
-            if any(code in msg for code in ("403", "404")):
+            expired = any(code in msg for code in ("403", "404"))
+            stats.failure(target, expired)
+            # Tokens in stream URLs often expire and cause 403/404 responses,
+            # and on hosts whose tokens expire often any failure is likely
+            # the same. Re-resolve the original page to obtain fresh links.
+            if expired or stats.expiry_rate(target) > 0.3:
                 ui.log("Vermutlich abgelaufenes Token – erneuere Links")
                 try:
-                    new_cands, new_first = resolve_url(base_url, ui, cfg.min_height)
+                    new_cands, new_first = resolve_url(t.url, ui, cfg.min_height, t.memo, fresh=True)
                 except Exception as e2:
                     ui.log(f"Erneute Auflösung fehlgeschlagen: {e2}")
                 else:
-                    if new_first and new_first < min_height:
+                    if new_first and new_first < t.min_height:
                         ui.log(f"Falle auf {new_first}p zurück")
-                        min_height = new_first
-                    fresh = [c for c in new_cands if c not in seen and c not in candidates]
+                        t.min_height = new_first
+                    fresh = [c for c in new_cands if c not in t.seen and c not in candidates]
                     candidates[0:0] = fresh
             if PLAYWRIGHT_AVAILABLE:
                 try:
-                    extra = asyncio.run(_sniff(target, ui))
+                    extra = sniff(target, ui, t.min_height)
                 except Exception as e2:
                     ui.log(f"Sniff fehlgeschlagen: {e2}")
                 else:
                     hd_extra = []
-                    for s in extra:
-                        h, _, err = _probe_stream(s)
+                    for s, (h, _, err) in t.memo.probe_many(extra):
                         if err:
                             ui.log(f"{s} nicht nutzbar: {err}")
-                        elif h < min_height:
+                        elif h < t.min_height:
                             ui.log(f"{s} bietet nur {h}p")
                         else:
                             hd_extra.append(s)
                     candidates[0:0] = hd_extra
             continue
         if path:
-            final_height = _verify_resolution(path)
-            if final_height < min_height:
-                ui.log(f"Download bietet nur {final_height}p – versuche nächste URL")
-                try:
-                    Path(path).unlink()
-                except Exception:
-                    pass
-                continue
-            upload_to_koofr(path, cfg, ui)
-            break
+            stats.success(target)
+            t.path = path
+            t.record(state="downloaded", path=path)
+            return True
+    return False
+
+
+def verify_transfer(t: Transfer, ui) -> bool:
+    """Check the downloaded file; a rejected file is deleted.
+
+    The height was usually confirmed from the first megabytes already (see
+    :class:`EarlyCheck`), so this mostly checks that the file is complete:
+    a video stream and a duration must be readable.
+    """
+    with span("verify", t.url) as sp:
+        info = _inspect_media(t.path)
+        sp.set(height=info["height"], duration_s=info["duration"])
+        if not info["video"] or not info["duration"]:
+            problem = "ist unvollständig oder beschädigt"
+        elif info["height"] < t.min_height:
+            problem = f"bietet nur {info['height']}p"
+        else:
+            t.record(state="verified")
+            return True
+        sp.outcome = "rejected"
+    ui.log(f"Download {problem} – versuche nächste URL")
+    try:
+        Path(t.path).unlink()
+    except Exception:
+        pass
+    if t.target:
+        t.seen.add(t.target)
+    t.path = ""
+    t.record(state="downloading", path="")
+    return False
+
+
+def process(url: str, cfg, ui, stage: Optional[Callable[[str, Transfer], None]] = None) -> Transfer:
+    """Resolve, download, verify and upload ``url``.
+
+    ``stage(name, t)`` is called before each step ("resolving",
+    "downloading", "verifying", "uploading") and may raise to abort. Raises
+    :class:`RuntimeError` when no candidate could be downloaded.
+    """
+    stage = stage or (lambda name, t: None)
+    with job_context(url), get_metrics().profiled(url):
+        t = Transfer(url, cfg)
+        stage("resolving", t)
+        resolve_transfer(t, cfg, ui)
+        while True:
+            stage("downloading", t)
+            if not download_transfer(t, cfg, ui):
+                raise RuntimeError("Kein Kandidat ließ sich herunterladen")
+            stage("verifying", t)
+            if verify_transfer(t, ui):
+                break
+        stage("uploading", t)
+        upload_to_koofr(t.path, cfg, ui, t.url)
+    return t
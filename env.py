@@ -1,18 +1,46 @@
 from __future__ import annotations
 
 import os
+import site
 import sys
 from pathlib import Path
+from typing import Optional
 
 ROOT = Path(__file__).resolve().parent
 VENV_DIR = ROOT / '.venv'
 
 
+def _venv_site_packages() -> Optional[Path]:
+    """Return the site-packages of `.venv` if it was built for this Python.
+
+    Packages with compiled extensions only work with the minor version they
+    were installed for, which `pyvenv.cfg` records.
+    """
+    try:
+        lines = (VENV_DIR / 'pyvenv.cfg').read_text(encoding='utf-8').splitlines()
+    except OSError:
+        return None
+    cfg = {}
+    for line in lines:
+        key, _, value = line.partition('=')
+        cfg[key.strip()] = value.strip()
+    version = cfg.get('version_info') or cfg.get('version') or ''
+    if version.split('.')[:2] != [str(sys.version_info[0]), str(sys.version_info[1])]:
+        return None
+    if os.name == 'nt':
+        path = VENV_DIR / 'Lib' / 'site-packages'
+    else:
+        path = VENV_DIR / 'lib' / f'python{sys.version_info[0]}.{sys.version_info[1]}' / 'site-packages'
+    return path if path.is_dir() else None
+
+
 def ensure_venv() -> None:
-    """Ensure the script runs inside the local virtual environment.
+    """Ensure the script runs with the packages of the local virtual environment.
 
     If the current interpreter is already the one from `.venv`, nothing
-    happens. Otherwise, if the virtual environment exists and contains a
+    happens. If `.venv` was created for the same Python version, its
+    site-packages are put in front of `sys.path`, which avoids starting a
+    second interpreter. Otherwise, if the virtual environment contains a
     Python executable, the current process is re-executed inside that
     interpreter. If the virtual environment is missing, execution
     continues but a warning is printed so features depending on the
@@ -21,6 +49,15 @@ def ensure_venv() -> None:
     if str(Path(sys.prefix).resolve()).startswith(str(VENV_DIR)):
         return
 
+    packages = _venv_site_packages()
+    if packages is not None:
+        before = list(sys.path)
+        site.addsitedir(str(packages))
+        added = [p for p in sys.path if p not in before]
+        # the venv's packages must win over the system's
+        sys.path[:] = before[:1] + added + before[1:]
+        return
+
     python = VENV_DIR / ('Scripts' if os.name == 'nt' else 'bin') / (
         'python.exe' if os.name == 'nt' else 'python'
     )
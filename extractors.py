@@ -0,0 +1,295 @@
+"""Embed discovery: host plugins, link extraction and recursion into players.
+
+A video page rarely links its stream directly. It embeds players from
+hosters (iframes, lazily loaded ``data-src`` frames, JSON player configs),
+and those player pages in turn name the manifest. :func:`find_candidates`
+extracts the links of a page and follows embeds of registered hosts up to
+``depth`` levels over plain HTTP, so most pages resolve without a browser.
+Direct stream URLs only count as candidates when a player config names them
+or they belong to a registered host; any other ``.m3u8``/``.mp4`` on a page
+(trailers, ads, previews) is merely a fallback.
+
+Hosts are handled by :class:`Extractor` plugins in a registry. All their
+host patterns are matched by one precompiled regex instead of a substring
+scan per pattern. Further plugins can be loaded from modules that call
+:func:`register` (see ``extractor_plugins`` in ``config.yaml``).
+"""
+
+from __future__ import annotations
+
+import asyncio
+import html as htmllib
+import importlib
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Awaitable, Callable, Optional
+from urllib.parse import urljoin, urlsplit
+
+STREAM_EXTS = (".m3u8", ".mpd", ".mp4")
+
+# levels of embed pages followed below the video page
+DEPTH = 2
+
+# src/data-src of frames and media elements
+_TAG_SRC = re.compile(
+    r"""<(?:iframe|frame|embed|video|source)\b[^>]*?\s(?:data-(?:src|lazy-src|url)|src)\s*=\s*["']([^"']+)["']""",
+    re.I,
+)
+# quoted absolute URLs in scripts and JSON, also with escaped slashes
+_QUOTED_URL = re.compile(r"""["']((?:https?:)?(?:\\?/){2}[^"'\s<>]+)["']""")
+# player config entries such as file: "/hls/master.m3u8" or "hls":"..."
+_CONFIG_URL = re.compile(r"""["']?\b(?:file|src|source|hls|dash|url)["']?\s*:\s*["']([^"']+)["']""", re.I)
+
+
+def is_stream(url: str) -> bool:
+    return urlsplit(url).path.lower().endswith(STREAM_EXTS)
+
+
+def _clean(raw: str, base: str) -> Optional[str]:
+    url = htmllib.unescape(raw.replace("\\/", "/")).strip()
+    if url.startswith(("data:", "javascript:", "blob:", "#")):
+        return None
+    url = urljoin(base, url)
+    return url if url.startswith(("http://", "https://")) else None
+
+
+def player_streams(html: str, base: str) -> list[str]:
+    """Return the stream URLs named by player configs in ``html``."""
+    found: dict[str, None] = {}
+    for m in _CONFIG_URL.finditer(html):
+        # relative paths only count when they clearly are streams
+        url = _clean(m.group(1), base)
+        if url and is_stream(url):
+            found[url] = None
+    return list(found)
+
+
+def extract_links(html: str, base: str) -> list[str]:
+    """Return frame sources, quoted absolute URLs and player-config stream
+    URLs of ``html``, made absolute against ``base``, in document order."""
+    found: dict[str, None] = {}
+    for m in _TAG_SRC.finditer(html):
+        url = _clean(m.group(1), base)
+        if url:
+            found[url] = None
+    for m in _QUOTED_URL.finditer(html):
+        url = _clean(m.group(1), base)
+        if url:
+            found[url] = None
+    for url in player_streams(html, base):
+        found[url] = None
+    return list(found)
+
+
+class Extractor:
+    """Per-host plugin.
+
+    ``hosts`` are substrings of the URLs the plugin is responsible for.
+    Subclasses override :meth:`extract` for players the generic link
+    extraction doesn't understand.
+    """
+
+    def __init__(self, name: str, hosts: tuple[str, ...] = ()):
+        self.name = name
+        self.hosts = hosts
+
+    def extract(self, url: str, html: str) -> list[str]:
+        return extract_links(html, url)
+
+    def trusted(self, url: str, html: str) -> list[str]:
+        """Stream URLs of the page that certainly belong to its player."""
+        return player_streams(html, url)
+
+
+GENERIC = Extractor("generic")
+
+_REGISTRY: list[Extractor] = []
+_MATCHER: Optional[re.Pattern] = None
+_BY_HOST: dict[str, Extractor] = {}
+_REGISTRY_LOCK = threading.Lock()
+
+
+def register(extractor: Extractor) -> Extractor:
+    """Add ``extractor``; later registrations win for the same host."""
+    global _MATCHER
+    with _REGISTRY_LOCK:
+        _REGISTRY.append(extractor)
+        for host in extractor.hosts:
+            _BY_HOST[host] = extractor
+        # longest first, so "kinoger.pw" beats a shorter overlapping pattern
+        hosts = sorted(_BY_HOST, key=len, reverse=True)
+        _MATCHER = re.compile("|".join(re.escape(h) for h in hosts)) if hosts else None
+    return extractor
+
+
+def match_host(url: str) -> Optional[str]:
+    """Return the registered host pattern found in ``url``, if any."""
+    m = _MATCHER.search(url) if _MATCHER is not None else None
+    return m.group(0) if m else None
+
+
+def extractor_for(url: str) -> Optional[Extractor]:
+    host = match_host(url)
+    return _BY_HOST[host] if host else None
+
+
+def host_hints() -> list[str]:
+    return list(_BY_HOST)
+
+
+def load_plugins(modules: list[str]) -> None:
+    """Import plugin modules; they register their extractors on import."""
+    for name in modules:
+        importlib.import_module(name)
+
+
+register(Extractor("supervideo", ("supervideo.cc",)))
+register(Extractor("p2pplay", ("p2pplay",)))
+register(Extractor("kinoger", ("kinoger.pw", "kinoger.ru")))
+
+
+class PageCache:
+    """Embed pages with their links and trusted stream URLs, kept for
+    ``ttl`` seconds.
+
+    Stream URLs carry expiring tokens, so entries are short-lived and a
+    resolution after an expired token bypasses the cache.
+    """
+
+    def __init__(self, ttl: float = 60, max_entries: int = 256):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._entries: OrderedDict[str, tuple[float, tuple]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, url: str) -> Optional[tuple]:
+        with self._lock:
+            entry = self._entries.get(url)
+            if entry is None or time.monotonic() - entry[0] > self.ttl:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(url)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, url: str, links: tuple) -> None:
+        if not self.ttl:
+            return
+        with self._lock:
+            self._entries[url] = (time.monotonic(), links)
+            self._entries.move_to_end(url)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+
+class Discovery:
+    """What :func:`find_candidates` did for one page."""
+
+    def __init__(self):
+        self.pages = 0
+        self.cached = 0
+        self.failed = 0
+        self.streams: list[str] = []
+        self.embeds: list[str] = []
+        # stream URLs neither a player config nor a registered host vouches for
+        self.fallbacks: list[str] = []
+        # HTML of every page visited, fetched or cached
+        self.html: dict[str, str] = {}
+
+    @property
+    def candidates(self) -> list[str]:
+        return self.streams + self.embeds
+
+
+async def find_candidates(
+    url: str,
+    html: str,
+    fetch: Callable[[str, str], Awaitable[str]],
+    depth: int = 2,
+    cache: Optional[PageCache] = None,
+    fresh: bool = False,
+) -> Discovery:
+    """Collect stream and embed URLs reachable from the page ``url``.
+
+    ``fetch(url, referer)`` returns the HTML of an embed page. Embeds of
+    registered hosts are followed level by level, the pages of one level
+    concurrently. An embed stays a candidate (for yt-dlp) unless its own
+    page yielded a stream. Streams found on registered hosts' pages, on
+    registered hosts or in player configs are candidates; other stream
+    URLs end up in :attr:`Discovery.fallbacks`.
+    """
+    result = Discovery()
+    seen = {url}
+
+    def parse(page: str, text: str) -> tuple[list[str], list[str]]:
+        extractor = extractor_for(page) or GENERIC
+        return extractor.extract(page, text), extractor.trusted(page, text)
+
+    async def links_of(page: str, referer: str) -> Optional[tuple[list[str], list[str]]]:
+        entry = None if fresh or cache is None else cache.get(page)
+        if entry is not None:
+            result.cached += 1
+        else:
+            try:
+                text = await fetch(page, referer)
+            except Exception:
+                result.failed += 1
+                return None
+            result.pages += 1
+            entry = (*parse(page, text), text)
+            if cache is not None:
+                cache.put(page, entry)
+        result.html[page] = entry[2]
+        return entry[:2]
+
+    result.html[url] = html
+    level = [(url, *parse(url, html))]
+    for d in range(depth + 1):
+        follow: list[tuple[str, str]] = []
+        for parent, links, trusted in level:
+            on_host = match_host(parent) is not None
+            for link in links:
+                if link in seen:
+                    continue
+                seen.add(link)
+                if is_stream(link):
+                    if on_host or link in trusted or match_host(link):
+                        result.streams.append(link)
+                    else:
+                        result.fallbacks.append(link)
+                elif match_host(link):
+                    if d < depth:
+                        follow.append((link, parent))
+                    else:
+                        result.embeds.append(link)
+        if not follow:
+            break
+        fetched = await asyncio.gather(*(links_of(page, parent) for page, parent in follow))
+        level = []
+        for (page, _), entry in zip(follow, fetched):
+            if not entry or not any(is_stream(u) for u in entry[0]):
+                result.embeds.append(page)
+            if entry:
+                level.append((page, *entry))
+    return result
+
+
+_CACHE: Optional[PageCache] = None
+
+
+def configure(cfg) -> None:
+    global _CACHE, DEPTH
+    DEPTH = cfg.embed_depth
+    _CACHE = PageCache(cfg.embed_cache_ttl, cfg.embed_cache_max_entries)
+    load_plugins(cfg.extractor_plugins)
+
+
+def get_page_cache() -> PageCache:
+    global _CACHE
+    if _CACHE is None:
+        _CACHE = PageCache()
+    return _CACHE
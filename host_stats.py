@@ -0,0 +1,170 @@
+"""Persistent per-host performance history.
+
+Download speed, failures, expired tokens and probe latency are recorded per
+host in a small SQLite database. All counters decay exponentially with a
+configurable half-life, so a host that was throttled last week is not
+punished forever. The history ranks candidates of equal height and tells
+the download loop which hosts to try last or to re-resolve right away.
+"""
+
+from __future__ import annotations
+
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Optional
+from urllib.parse import urlsplit
+
+# decayed sums stored per host
+FIELDS = ("attempts", "failures", "expiries", "tp_sum", "tp_weight", "probe_sum", "probe_weight")
+
+
+def host_of(url: str) -> str:
+    host = urlsplit(url).netloc.lower()
+    return host[4:] if host.startswith("www.") else host
+
+
+class HostStats:
+    """Decayed per-host counters.
+
+    ``attempts``/``failures``/``expiries`` count downloads, ``tp_*`` and
+    ``probe_*`` are weighted sums of throughput samples (bytes/s) and probe
+    durations (s).
+    """
+
+    def __init__(self, path: str = ".cache/hosts.sqlite", half_life: float = 7 * 24 * 3600):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.half_life = half_life
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(str(self.path), check_same_thread=False, timeout=10)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS hosts (host TEXT PRIMARY KEY, "
+            + ", ".join(f"{f} REAL" for f in FIELDS)
+            + ", updated REAL)"
+        )
+        self._db.commit()
+
+    def _load(self, host: str, now: float) -> dict:
+        row = self._db.execute(
+            f"SELECT {', '.join(FIELDS)}, updated FROM hosts WHERE host = ?", (host,)
+        ).fetchone()
+        if row is None:
+            return dict.fromkeys(FIELDS, 0.0)
+        factor = 0.5 ** (max(now - row[-1], 0) / self.half_life)
+        return {f: v * factor for f, v in zip(FIELDS, row)}
+
+    def _add(self, url: str, **deltas: float) -> None:
+        host = host_of(url)
+        if not host:
+            return
+        now = time.time()
+        with self._lock:
+            stats = self._load(host, now)
+            for k, v in deltas.items():
+                stats[k] += v
+            self._db.execute(
+                f"INSERT OR REPLACE INTO hosts VALUES (?, {', '.join('?' * len(FIELDS))}, ?)",
+                (host, *(stats[f] for f in FIELDS), now),
+            )
+            self._db.commit()
+
+    def get(self, url: str) -> dict:
+        with self._lock:
+            return self._load(host_of(url), time.time())
+
+    # -- recording --------------------------------------------------------
+
+    def throughput(self, url: str, speed: Optional[float]) -> None:
+        if speed:
+            self._add(url, tp_sum=speed, tp_weight=1)
+
+    def probe(self, url: str, seconds: float) -> None:
+        self._add(url, probe_sum=seconds, probe_weight=1)
+
+    def success(self, url: str) -> None:
+        self._add(url, attempts=1)
+
+    def expired(self, url: str, count: int = 1) -> None:
+        """Record tokens that had to be renewed during a download."""
+        if count:
+            self._add(url, expiries=count)
+
+    def failure(self, url: str, expired: bool = False) -> None:
+        self._add(url, attempts=1, failures=1, expiries=1 if expired else 0)
+
+    # -- derived values ---------------------------------------------------
+
+    def error_rate(self, url: str) -> float:
+        s = self.get(url)
+        # one imaginary success and failure keep a single sample from
+        # deciding everything
+        return (s["failures"] + 1) / (s["attempts"] + 2)
+
+    def expiry_rate(self, url: str) -> float:
+        s = self.get(url)
+        return s["expiries"] / s["attempts"] if s["attempts"] >= 1 else 0.0
+
+    def speed(self, url: str) -> Optional[float]:
+        s = self.get(url)
+        return s["tp_sum"] / s["tp_weight"] if s["tp_weight"] > 0.1 else None
+
+    def probe_latency(self, url: str) -> Optional[float]:
+        s = self.get(url)
+        return s["probe_sum"] / s["probe_weight"] if s["probe_weight"] > 0.1 else None
+
+    def score(self, url: str, mean: Optional[float] = None) -> float:
+        """Expected useful throughput; unknown hosts get the average speed."""
+        s = self.get(url)
+        speed = s["tp_sum"] / s["tp_weight"] if s["tp_weight"] > 0.1 else None
+        if speed is None:
+            speed = mean if mean is not None else self._mean_speed()
+        return speed * (1 - (s["failures"] + 1) / (s["attempts"] + 2))
+
+    def scores(self, urls: list[str]) -> dict[str, float]:
+        """:meth:`score` of several URLs, reading each host only once."""
+        mean = self._mean_speed()
+        by_host: dict[str, float] = {}
+        out = {}
+        for url in urls:
+            host = host_of(url)
+            if host not in by_host:
+                by_host[host] = self.score(url, mean)
+            out[url] = by_host[host]
+        return out
+
+    def _mean_speed(self) -> float:
+        with self._lock:
+            row = self._db.execute("SELECT SUM(tp_sum), SUM(tp_weight) FROM hosts").fetchone()
+        return row[0] / row[1] if row[1] else 1.0
+
+    def unreliable(self, url: str, threshold: float = 0.5) -> bool:
+        s = self.get(url)
+        return s["attempts"] >= 1.5 and (s["failures"] + 1) / (s["attempts"] + 2) > threshold
+
+    def close(self) -> None:
+        with self._lock:
+            self._db.close()
+
+
+_STATS: Optional[HostStats] = None
+_STATS_LOCK = threading.Lock()
+
+
+def configure(cfg) -> None:
+    """Replace the shared history with one built from ``cfg``."""
+    global _STATS
+    with _STATS_LOCK:
+        if _STATS is not None:
+            _STATS.close()
+        _STATS = HostStats(cfg.host_stats_path, half_life=cfg.host_stats_half_life)
+
+
+def get_stats() -> HostStats:
+    global _STATS
+    with _STATS_LOCK:
+        if _STATS is None:
+            _STATS = HostStats()
+        return _STATS
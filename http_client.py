@@ -0,0 +1,218 @@
+"""Shared HTTP client with keep-alive pools and impersonation memory.
+
+All plain HTTP traffic (page fetches, manifest reads, uploads) goes through
+one ``requests`` session whose connection pools are kept per host, so TCP and
+TLS handshakes are paid once per host instead of once per request. Hosts
+that reject plain requests (typically Cloudflare) are remembered and served
+through a browser-impersonating ``curl_cffi`` session right away. yt-dlp
+instances used for probing are kept per thread for the same reason.
+"""
+
+from __future__ import annotations
+
+import threading
+import time
+from typing import TYPE_CHECKING, Optional
+from urllib.parse import urlsplit
+
+from logs import DEBUG
+
+if TYPE_CHECKING:
+    from yt_dlp import YoutubeDL
+
+
+# HTTP headers used for all requests (and yt-dlp's) so that hosts protected
+# by Cloudflare see us as a regular browser
+HEADERS = {
+    "User-Agent": (
+        "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 "
+        "(KHTML, like Gecko) Chrome/137.0.0.0 Safari/537.36"
+    ),
+    "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8",
+    "Accept-Language": "en-US,en;q=0.5",
+    "Sec-Fetch-Mode": "navigate",
+}
+
+# status codes that usually mean "not a browser" rather than a missing page
+BLOCKED_STATUS = (403, 429, 503)
+
+
+def _host(url: str) -> str:
+    return urlsplit(url).netloc.lower()
+
+
+class _HostStats:
+    def __init__(self):
+        self.requests = 0
+        self.new_connections = 0
+        self.new_time = 0.0
+        self.reused_time = 0.0
+
+
+class HttpClient:
+    def __init__(self, headers: dict, pool_size: int = 16):
+        # requests and yt-dlp are only imported once a client is needed
+        import requests
+        from requests.adapters import HTTPAdapter
+
+        self.headers = headers
+        self.session = requests.Session()
+        self.session.headers.update(headers)
+        adapter = HTTPAdapter(pool_connections=64, pool_maxsize=pool_size)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        # hosts that reject plain requests and need impersonation
+        self._needs: set[str] = set()
+        # hosts where impersonation failed while a plain request worked
+        self._unavailable: set[str] = set()
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._stats: dict[str, _HostStats] = {}
+
+    def needs_impersonation(self, url: str) -> bool:
+        return _host(url) in self._needs
+
+    def impersonation_unavailable(self, url: str) -> bool:
+        return _host(url) in self._unavailable
+
+    def remember(self, url: str, needed: bool) -> None:
+        """Record whether impersonation worked (and was needed) for ``url``'s
+        host or failed there."""
+        host = _host(url)
+        with self._lock:
+            if needed:
+                self._needs.add(host)
+                self._unavailable.discard(host)
+            else:
+                self._unavailable.add(host)
+                self._needs.discard(host)
+
+    def _cffi(self):
+        session = getattr(self._local, "cffi", None)
+        if session is None:
+            from curl_cffi import requests as cffi_requests
+
+            session = cffi_requests.Session(impersonate="chrome", headers=self.headers)
+            self._local.cffi = session
+        return session
+
+    def _connections(self, url: str) -> int:
+        """Return how many connections were ever opened to ``url``'s host."""
+        parts = urlsplit(url)
+        pools = self.session.get_adapter(url).poolmanager.pools
+        total = 0
+        for key in list(pools.keys()):
+            if key.key_host == parts.hostname and key.key_scheme == parts.scheme:
+                pool = pools.get(key)
+                total += pool.num_connections if pool is not None else 0
+        return total
+
+    def _request(self, method: str, url: str, **kwargs):
+        before = self._connections(url)
+        start = time.monotonic()
+        resp = self.session.request(method, url, **kwargs)
+        elapsed = time.monotonic() - start
+        with self._lock:
+            st = self._stats.setdefault(_host(url), _HostStats())
+            st.requests += 1
+            if self._connections(url) > before:
+                st.new_connections += 1
+                st.new_time += elapsed
+            else:
+                st.reused_time += elapsed
+        return resp
+
+    def get(self, url: str, timeout: float = 30, **kwargs):
+        """GET ``url``, switching to impersonation for hosts that need it."""
+        if self.needs_impersonation(url):
+            return self._cffi().get(url, timeout=timeout, **kwargs)
+        resp = self._request("GET", url, timeout=timeout, **kwargs)
+        if resp.status_code in BLOCKED_STATUS and not self.impersonation_unavailable(url):
+            try:
+                alt = self._cffi().get(url, timeout=timeout, **kwargs)
+            except ImportError:
+                self.remember(url, False)
+                return resp
+            if alt.status_code < 400:
+                self.remember(url, True)
+                return alt
+        return resp
+
+    def fetch_bytes(self, url: str, timeout: float = 30, headers: Optional[dict] = None) -> bytes:
+        resp = self.get(url, timeout=timeout, headers=headers)
+        resp.raise_for_status()
+        return resp.content
+
+    def fetch_text(self, url: str, timeout: float = 30, headers: Optional[dict] = None) -> str:
+        data = self.fetch_bytes(url, timeout=timeout, headers=headers)
+        try:
+            return data.decode()
+        except UnicodeDecodeError:
+            return data.decode("utf-8", errors="ignore")
+
+    def request(self, method: str, url: str, **kwargs):
+        return self._request(method, url, **kwargs)
+
+    def put(self, url: str, **kwargs):
+        return self._request("PUT", url, **kwargs)
+
+    def ydl(self, impersonate: bool) -> YoutubeDL:
+        """Return this thread's reusable ``YoutubeDL`` for metadata probing."""
+        cache = getattr(self._local, "ydl", None)
+        if cache is None:
+            cache = self._local.ydl = {}
+        ydl = cache.get(impersonate)
+        if ydl is None:
+            from yt_dlp import YoutubeDL
+
+            opts = {"quiet": True, "http_headers": self.headers}
+            if impersonate:
+                opts["extractor_args"] = {"generic": ["impersonate"]}
+            ydl = cache[impersonate] = YoutubeDL(opts)
+        return ydl
+
+    def extract_info(self, url: str) -> dict:
+        """Run yt-dlp metadata extraction, impersonating only where needed.
+
+        Hosts where the impersonated attempt failed but a plain one worked
+        are remembered, so later probes skip the failing first attempt.
+        """
+        if self.impersonation_unavailable(url):
+            return self.ydl(False).extract_info(url, download=False)
+        try:
+            return self.ydl(True).extract_info(url, download=False)
+        except Exception:
+            if self.needs_impersonation(url):
+                raise
+        info = self.ydl(False).extract_info(url, download=False)
+        self.remember(url, False)
+        return info
+
+    def report(self, ui) -> None:
+        """Log connection reuse and the handshake time it saved per host."""
+        with self._lock:
+            stats = dict(self._stats)
+        for host, st in sorted(stats.items()):
+            reused = st.requests - st.new_connections
+            if not st.new_connections:
+                continue
+            avg_new = st.new_time / st.new_connections
+            avg_reused = st.reused_time / reused if reused else avg_new
+            saved = max(0.0, avg_new - avg_reused) * reused
+            ui.log(
+                f"HTTP {host}: {st.requests} Requests, {st.new_connections} "
+                f"Verbindungen, ~{saved:.2f}s Handshake gespart",
+                DEBUG,
+            )
+
+
+_CLIENT: Optional[HttpClient] = None
+_CLIENT_LOCK = threading.Lock()
+
+
+def get_client() -> HttpClient:
+    global _CLIENT
+    with _CLIENT_LOCK:
+        if _CLIENT is None:
+            _CLIENT = HttpClient(HEADERS)
+        return _CLIENT
@@ -0,0 +1,228 @@
+"""An ordered, cancellable queue of page URLs for interactive front ends.
+
+Unlike the batch :class:`pipeline.Pipeline`, jobs are submitted one by one
+while others run, start in the order the user arranged them (skipping
+hosts that are at their ``per_host`` limit) and can be cancelled while
+waiting or running. Dispatch is a :class:`scheduler.Scheduler` without
+round-robin and every job runs :func:`downloader.process`. Once a job is
+resolved its per-host slot moves to the embed or stream host, like in the
+pipeline. A running job is cancelled cooperatively: it stops at the next
+progress callback or stage boundary.
+"""
+
+from __future__ import annotations
+
+import itertools
+import threading
+import time
+from typing import Optional
+
+from downloader import Transfer, process
+from logs import INFO
+from progress import Snapshot
+from scheduler import Job, Scheduler, host_key
+
+STATES = ("queued", "resolving", "downloading", "verifying", "uploading", "done", "failed", "cancelled")
+FINISHED = ("done", "failed", "cancelled")
+
+
+class JobCancelled(BaseException):
+    """Raised inside a cancelled job.
+
+    Derived from ``BaseException`` so the candidate fallbacks and retries
+    (which catch ``Exception``) and yt-dlp don't swallow it.
+    """
+
+
+class QueuedJob:
+    _ids = itertools.count(1)
+
+    def __init__(self, url: str):
+        self.id = next(self._ids)
+        self.url = url
+        self.state = "queued"
+        self.height = 0
+        self.error: Optional[str] = None
+        # names under which the job's transfers report progress
+        self.names: set[str] = set()
+        self.created = time.time()
+        self.ended: Optional[float] = None
+        self.cancel_event = threading.Event()
+        # the scheduler's job carrying this one
+        self.entry = Job(url, host_key(url), self)
+
+    @property
+    def key(self) -> str:
+        return self.entry.key
+
+    @property
+    def finished(self) -> bool:
+        return self.state in FINISHED
+
+    def check(self) -> None:
+        if self.cancel_event.is_set():
+            raise JobCancelled()
+
+
+class JobUI:
+    """Per-job view of a shared UI that attributes progress to the job and
+    aborts it on cancellation."""
+
+    def __init__(self, ui, job: QueuedJob):
+        self.ui = ui
+        self.job = job
+        self.console = ui.console
+
+    def log(self, msg, level: int = INFO) -> None:
+        self.ui.log(msg, level)
+
+    def update_progress(self, name, done, total=None, finished=False) -> None:
+        self.job.names.add(name)
+        self.ui.update_progress(name, done, total, finished)
+        self.job.check()
+
+
+def job_snapshot(job: QueuedJob, snaps: dict[str, Snapshot]) -> Optional[Snapshot]:
+    """Return the progress to show for ``job``: the transfer still running,
+    else its last one."""
+    shown = [snaps[n] for n in list(job.names) if n in snaps]
+    return next((s for s in shown if not s.finished), shown[-1] if shown else None)
+
+
+class JobQueue:
+    """Run submitted URLs on ``workers`` threads in queue order.
+
+    ``on_change(job)`` is called from worker threads whenever a job changes
+    state; front ends typically just schedule a redraw. Finished jobs are
+    forgotten after ``finished_ttl`` seconds or beyond the newest
+    ``keep_finished`` of them (0 keeps them until :meth:`clear_finished`).
+    """
+
+    def __init__(
+        self,
+        cfg,
+        ui,
+        workers: int = 4,
+        per_host: int = 2,
+        on_change=None,
+        keep_finished: int = 0,
+        finished_ttl: float = 0,
+    ):
+        self.cfg = cfg
+        self.ui = ui
+        self.workers = max(1, workers)
+        self.per_host = max(1, per_host)
+        self.on_change = on_change or (lambda job: None)
+        self.keep_finished = keep_finished
+        self.finished_ttl = finished_ttl
+        self.scheduler = Scheduler(self._run, self.workers, self.per_host, name="job", fair=False)
+        self._jobs: list[QueuedJob] = []
+        self._lock = threading.Lock()
+
+    def start(self) -> None:
+        self.scheduler.start()
+
+    def submit(self, url: str) -> QueuedJob:
+        job = QueuedJob(url)
+        with self._lock:
+            self._jobs.append(job)
+        self.scheduler.put(job.entry)
+        self.on_change(job)
+        return job
+
+    def jobs(self) -> list[QueuedJob]:
+        """All jobs: running ones first, then the queue in order, then the
+        finished ones."""
+        pending = [entry.data for entry in self.scheduler.waiting()]
+        with self._lock:
+            running = [j for j in self._jobs if not j.finished and j not in pending]
+            finished = [j for j in self._jobs if j.finished]
+        return running + pending + finished
+
+    def get(self, job_id: int) -> Optional[QueuedJob]:
+        with self._lock:
+            return next((j for j in self._jobs if j.id == job_id), None)
+
+    def cancel(self, job_id: int) -> bool:
+        """Cancel a waiting job at once, a running one at its next check."""
+        job = self.get(job_id)
+        if job is None or job.finished:
+            return False
+        job.cancel_event.set()
+        if self.scheduler.remove(job.entry):
+            job.state = "cancelled"
+            job.ended = time.time()
+            self._prune()
+            self.on_change(job)
+        return True
+
+    def move(self, job_id: int, delta: int) -> bool:
+        """Move a waiting job ``delta`` places towards the end of the queue."""
+        job = self.get(job_id)
+        if job is None or not self.scheduler.move(job.entry, delta):
+            return False
+        self.on_change(job)
+        return True
+
+    def clear_finished(self) -> list[QueuedJob]:
+        with self._lock:
+            gone = [j for j in self._jobs if j.finished]
+            self._jobs = [j for j in self._jobs if not j.finished]
+        self.scheduler.forget(j.entry for j in gone)
+        return gone
+
+    def _prune(self) -> None:
+        with self._lock:
+            finished = [j for j in self._jobs if j.finished]
+            gone = set()
+            if self.finished_ttl:
+                limit = time.time() - self.finished_ttl
+                gone.update(j for j in finished if (j.ended or j.created) < limit)
+            if self.keep_finished and len(finished) > self.keep_finished:
+                finished.sort(key=lambda j: j.ended or j.created)
+                gone.update(finished[: len(finished) - self.keep_finished])
+            if gone:
+                self._jobs = [j for j in self._jobs if j not in gone]
+        self.scheduler.forget(j.entry for j in gone)
+
+    def _stage(self, entry: Job, state: str, t: Transfer) -> None:
+        job: QueuedJob = entry.data
+        job.check()
+        if state == "downloading" and t.candidates:
+            # from here on the per-host limit applies to the embed or
+            # stream host, as in the pipeline
+            self.scheduler.rekey(entry, host_key(t.candidates[0]), job.check)
+            job.height = job.height or t.min_height
+        elif state == "verifying":
+            job.height = t.memo.results.get(t.target, (t.min_height,))[0] or t.min_height
+        job.state = state
+        self.on_change(job)
+
+    def _run(self, entry: Job) -> None:
+        job: QueuedJob = entry.data
+        try:
+            job.check()
+            process(job.url, self.cfg, JobUI(self.ui, job), lambda state, t: self._stage(entry, state, t))
+            job.state = "done"
+        except JobCancelled:
+            job.state = "cancelled"
+            self.ui.log(f"{job.url} abgebrochen")
+        except Exception as e:
+            job.state = "failed"
+            job.error = str(e)
+            self.ui.log(f"{job.url} fehlgeschlagen: {e}")
+        finally:
+            job.ended = time.time()
+            self._prune()
+        self.on_change(job)
+
+    def close(self, timeout: float = 5) -> None:
+        """Cancel everything and give the workers ``timeout`` seconds to stop."""
+        with self._lock:
+            jobs = list(self._jobs)
+        for job in jobs:
+            if not job.finished:
+                job.cancel_event.set()
+                if self.scheduler.remove(job.entry):
+                    job.state = "cancelled"
+        self.scheduler.join(timeout)
@@ -0,0 +1,88 @@
+"""Crash-safe per-URL job journal.
+
+Every state change of a batch job is appended as one JSON line, so a killed
+run leaves a complete record behind: which stream was chosen, where the file
+is written, how many bytes are done and whether the upload finished. On the
+next start the journal is folded into the latest state per URL, compacted,
+and used to skip finished jobs and resume the others.
+"""
+
+from __future__ import annotations
+
+import json
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Optional
+
+# states a job moves through; "done" and "failed" are final
+STATES = ("queued", "resolved", "downloading", "downloaded", "verified", "uploading", "done", "failed")
+
+
+class Journal:
+    def __init__(self, path: str = "journal.jsonl"):
+        self.path = Path(path)
+        self._lock = threading.Lock()
+        self._entries: dict[str, dict] = {}
+        if self.path.exists():
+            with self.path.open(encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        rec = json.loads(line)
+                    except ValueError:
+                        # a torn last line from a crash mid-write
+                        continue
+                    self._entries.setdefault(rec["url"], {}).update(rec)
+            self._compact()
+        self._file = self.path.open("a", encoding="utf-8")
+
+    def _compact(self) -> None:
+        tmp = self.path.with_suffix(self.path.suffix + ".tmp")
+        with tmp.open("w", encoding="utf-8") as f:
+            for entry in self._entries.values():
+                f.write(json.dumps(entry) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, self.path)
+
+    def get(self, url: str) -> dict:
+        with self._lock:
+            return dict(self._entries.get(url, {}))
+
+    def update(self, url: str, sync: bool = True, **fields) -> None:
+        """Record ``fields`` for ``url``.
+
+        ``sync`` forces the line to disk; frequent progress updates pass
+        ``False`` and rely on the next state change to flush them.
+        """
+        rec = {"url": url, "ts": time.time(), **fields}
+        with self._lock:
+            self._entries.setdefault(url, {}).update(rec)
+            self._file.write(json.dumps(rec) + "\n")
+            self._file.flush()
+            if sync:
+                os.fsync(self._file.fileno())
+
+    def close(self) -> None:
+        with self._lock:
+            self._file.close()
+
+
+def resume_stage(entry: dict) -> Optional[str]:
+    """Return the stage a journalled job continues at, or ``None`` if done.
+
+    Jobs whose output file vanished fall back to downloading again.
+    """
+    state = entry.get("state")
+    if state == "done":
+        return None
+    path = entry.get("path")
+    have_file = bool(path) and Path(path).exists()
+    if state in ("verified", "uploading") and have_file:
+        return "upload"
+    if state == "downloaded" and have_file:
+        return "verify"
+    if entry.get("target"):
+        return "download"
+    return "resolve"
@@ -0,0 +1,241 @@
+"""HTTP-only "light sniff" between link extraction and the browser.
+
+Many players hide their manifest URL in obfuscated script: Dean Edwards'
+``eval(function(p,a,c,k,e,d)…)`` packer, base64 blobs passed to ``atob`` or
+JSON configs with ``\\x``/``\\u`` escapes. This tier fetches a page and its
+linked player scripts, decodes these in pure Python (repeatedly, since
+packed code often contains base64 and vice versa) and extracts stream URLs.
+Only when it finds nothing usable does resolution fall back to Playwright.
+
+The decoders are plain functions on strings, so they can be checked
+against saved player pages. :data:`TOTALS` counts how often the tier saved
+a browser launch.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import base64
+import binascii
+import html as htmllib
+import re
+import threading
+import time
+from typing import Awaitable, Callable, Optional
+from urllib.parse import urljoin, urlsplit
+
+from extractors import extract_links, is_stream
+from runtime import run_blocking
+
+# linked scripts fetched per page
+MAX_SCRIPTS = 4
+# decoding rounds; each may reveal more packed or encoded code
+MAX_ROUNDS = 3
+
+_PACKED = re.compile(
+    r"}\s*\(\s*'((?:[^'\\]|\\.)*)'\s*,\s*(\d+)\s*,\s*(\d+)\s*,\s*'((?:[^'\\]|\\.)*)'\.split\('\|'\)",
+    re.S,
+)
+_WORD = re.compile(r"\b\w+\b")
+_ATOB = re.compile(r"""atob\(\s*["']([A-Za-z0-9+/=_-]{8,})["']\s*\)""")
+# long quoted strings that look like base64
+_B64 = re.compile(r"""["']([A-Za-z0-9+/]{24,}={0,2})["']""")
+_JS_ESCAPE = re.compile(r"\\x([0-9a-fA-F]{2})|\\u([0-9a-fA-F]{4})")
+_SCRIPT_SRC = re.compile(r"""<script\b[^>]*?\ssrc\s*=\s*["']([^"']+)["']""", re.I)
+# well-known libraries that never carry a stream URL
+_LIBRARIES = re.compile(
+    r"jquery|bootstrap|analytics|gtag|googletagmanager|recaptcha|cloudflare|fontawesome|polyfill", re.I
+)
+# plain stream URLs anywhere in decoded code
+_STREAM_URL = re.compile(r"""https?://[^\s"'<>\\]+?\.(?:m3u8|mpd|mp4)(?:\?[^\s"'<>\\]*)?""", re.I)
+
+_DIGITS = "0123456789abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ"
+
+
+def _base_n(token: str, radix: int) -> int:
+    value = 0
+    for ch in token:
+        digit = _DIGITS.find(ch)
+        if digit < 0 or digit >= radix:
+            raise ValueError(token)
+        value = value * radix + digit
+    return value
+
+
+def unpack_packer(source: str) -> list[str]:
+    """Return the unpacked code of every p.a.c.k.e.r block in ``source``."""
+    out = []
+    for m in _PACKED.finditer(source):
+        payload, radix, count, words = m.group(1), int(m.group(2)), int(m.group(3)), m.group(4)
+        if not 2 <= radix <= len(_DIGITS):
+            continue
+        payload = payload.replace("\\'", "'").replace("\\\\", "\\")
+        symbols = words.split("|")
+        if len(symbols) < count:
+            symbols += [""] * (count - len(symbols))
+
+        def lookup(w: re.Match) -> str:
+            try:
+                index = _base_n(w.group(0), radix)
+            except ValueError:
+                return w.group(0)
+            return symbols[index] if index < len(symbols) and symbols[index] else w.group(0)
+
+        out.append(_WORD.sub(lookup, payload))
+    return out
+
+
+def decode_base64(source: str) -> list[str]:
+    """Return the printable texts hidden in ``atob("…")`` calls and other
+    base64-looking strings of ``source``."""
+    out = []
+    blobs = [m.group(1) for m in _ATOB.finditer(source)] + [m.group(1) for m in _B64.finditer(source)]
+    for blob in dict.fromkeys(blobs):
+        # URL-safe alphabet and missing padding are common
+        padded = blob.replace("-", "+").replace("_", "/") + "=" * (-len(blob) % 4)
+        try:
+            text = base64.b64decode(padded, validate=True).decode("utf-8")
+        except (binascii.Error, ValueError):
+            continue
+        # random binary that happens to decode isn't interesting
+        if text.isprintable() and ("/" in text or "{" in text):
+            out.append(text)
+    return out
+
+
+def unescape_js(source: str) -> str:
+    """Resolve ``\\xNN``, ``\\uNNNN`` and ``\\/`` escapes of JS string literals."""
+    source = source.replace("\\/", "/")
+    return _JS_ESCAPE.sub(lambda m: chr(int(m.group(1) or m.group(2), 16)), source)
+
+
+def expand(source: str) -> tuple[list[str], int]:
+    """Return ``source`` plus everything decoded from it, and the number of
+    decoded blocks."""
+    texts = [unescape_js(source)]
+    todo = texts[:]
+    decoded = 0
+    for _ in range(MAX_ROUNDS):
+        found = []
+        for text in todo:
+            found += [unescape_js(t) for t in unpack_packer(text) + decode_base64(text)]
+        found = [t for t in found if t not in texts]
+        if not found:
+            break
+        decoded += len(found)
+        texts += found
+        todo = found
+    return texts, decoded
+
+
+def stream_urls(source: str, base: str) -> tuple[list[str], int]:
+    """Return the stream URLs in ``source`` after decoding, and the number
+    of decoded blocks."""
+    texts, decoded = expand(source)
+    found: dict[str, None] = {}
+    for text in texts:
+        for url in extract_links(text, base) + _STREAM_URL.findall(text):
+            if is_stream(url):
+                found[url] = None
+    return list(found), decoded
+
+
+def script_sources(html: str, base: str) -> list[str]:
+    """Return up to ``MAX_SCRIPTS`` linked scripts of ``html`` that may hold
+    a player config, those of the page's own host first."""
+    host = urlsplit(base).netloc
+    links = [urljoin(base, htmllib.unescape(s)) for s in _SCRIPT_SRC.findall(html)]
+    links = [u for u in dict.fromkeys(links) if u.startswith(("http://", "https://")) and not _LIBRARIES.search(u)]
+    links.sort(key=lambda u: urlsplit(u).netloc != host)
+    return links[:MAX_SCRIPTS]
+
+
+class LightStats:
+    """What the light sniff did for one resolution."""
+
+    def __init__(self, url: str):
+        self.url = url
+        self.pages = 0
+        self.scripts = 0
+        self.decoded = 0
+        self.streams = 0
+        self.elapsed = 0.0
+
+    def summary(self) -> str:
+        return (
+            f"Light-Sniff {self.url}: {self.elapsed:.2f}s, {self.pages} Seite(n), "
+            f"{self.scripts} Skript(e), {self.decoded} Block/Blöcke dekodiert, {self.streams} Stream(s)"
+        )
+
+
+class Totals:
+    """Process-wide tally of light sniffs and the browser launches they saved."""
+
+    def __init__(self):
+        self.runs = 0
+        self.saved = 0
+        self.elapsed = 0.0
+        self._lock = threading.Lock()
+
+    def add(self, stats: LightStats, saved: bool) -> None:
+        with self._lock:
+            self.runs += 1
+            self.saved += saved
+            self.elapsed += stats.elapsed
+
+    def report(self, ui) -> None:
+        if self.runs:
+            ui.log(
+                f"Light-Sniff: {self.saved} von {self.runs} Seiten ohne Browser aufgelöst "
+                f"({self.elapsed / self.runs:.2f}s im Mittel)"
+            )
+
+
+TOTALS = Totals()
+
+
+async def light_sniff(
+    pages: list[tuple[str, Optional[str]]],
+    fetch: Callable[[str, Optional[str]], Awaitable[str]],
+    stats: LightStats,
+    known: Optional[dict[str, str]] = None,
+) -> list[str]:
+    """Fetch ``(url, referer)`` pages and their player scripts and return the
+    stream URLs found in them after decoding.
+
+    Pages in ``known`` (URL to HTML, e.g. from embed discovery) aren't
+    fetched again. Decoding is pure-Python regex work and runs in the
+    executor, not on the loop.
+    """
+    start = time.monotonic()
+    known = known or {}
+
+    async def get(url: str, referer: Optional[str]) -> Optional[str]:
+        if url in known:
+            return known[url]
+        try:
+            return await fetch(url, referer)
+        except Exception:
+            return None
+
+    async def one(url: str, referer: Optional[str]) -> list[str]:
+        html = await get(url, referer)
+        if html is None:
+            return []
+        stats.pages += 1
+        scripts = await run_blocking(script_sources, html, url)
+        bodies = await asyncio.gather(*(get(s, url) for s in scripts))
+        stats.scripts += sum(b is not None for b in bodies)
+        found: list[str] = []
+        # inline scripts are part of the page itself
+        for source, base in [(html, url)] + [(b, s) for s, b in zip(scripts, bodies) if b]:
+            urls, decoded = await run_blocking(stream_urls, source, base)
+            stats.decoded += decoded
+            found += urls
+        return found
+
+    results = await asyncio.gather(*(one(u, r) for u, r in pages))
+    streams = list(dict.fromkeys(u for found in results for u in found))
+    stats.streams = len(streams)
+    stats.elapsed = time.monotonic() - start
+    return streams
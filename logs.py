@@ -0,0 +1,238 @@
+"""Leveled, non-blocking log pipeline.
+
+``emit`` never waits for a terminal or disk: messages go into a bounded ring
+buffer (for display and post-mortems) and into bounded queues drained by
+background threads. One thread writes ``downloader.log`` in batches with a
+single flush per batch, rotates it by size and mirrors job messages into
+per-job files; another feeds the console. When a sink falls behind, its
+queue fills up and further messages for that sink are dropped and counted
+instead of stalling the download threads.
+"""
+
+from __future__ import annotations
+
+import queue
+import re
+import threading
+import time
+from collections import OrderedDict, deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from pathlib import Path
+from typing import Callable, Optional
+
+DEBUG, INFO, WARNING, ERROR = 10, 20, 30, 40
+LEVELS = {"debug": DEBUG, "info": INFO, "warning": WARNING, "error": ERROR}
+_NAMES = {v: k.upper() for k, v in LEVELS.items()}
+
+# the job (page URL) the current thread or task works on
+JOB: ContextVar[Optional[str]] = ContextVar("job", default=None)
+
+# records per batch written by a sink
+BATCH = 500
+# per-job files kept open at once
+OPEN_JOB_FILES = 32
+
+
+@contextmanager
+def job_context(job: str):
+    """Attribute messages emitted inside the block to ``job``."""
+    token = JOB.set(job)
+    try:
+        yield
+    finally:
+        JOB.reset(token)
+
+
+class Record:
+    __slots__ = ("ts", "level", "msg", "job")
+
+    def __init__(self, level: int, msg: str, job: Optional[str]):
+        self.ts = time.time()
+        self.level = level
+        self.msg = msg
+        self.job = job
+
+    def line(self) -> str:
+        stamp = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(self.ts))
+        return f"{stamp} {_NAMES.get(self.level, self.level):<7} {self.msg}\n"
+
+
+class _Sink:
+    """A bounded queue drained in batches by its own daemon thread."""
+
+    def __init__(self, name: str, write: Callable[[list[Record]], None], level: int, size: int):
+        self.level = level
+        self.dropped = 0
+        self._write = write
+        self._queue: queue.Queue = queue.Queue(size)
+        self._thread = threading.Thread(target=self._run, name=f"log-{name}", daemon=True)
+        self._thread.start()
+
+    def put(self, rec: Record) -> None:
+        if rec.level < self.level:
+            return
+        try:
+            self._queue.put_nowait(rec)
+        except queue.Full:
+            self.dropped += 1
+
+    def _run(self) -> None:
+        while True:
+            batch = [self._queue.get()]
+            while len(batch) < BATCH:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            stop = batch[-1] is None
+            records = [r for r in batch if r is not None]
+            if records:
+                try:
+                    self._write(records)
+                except Exception:
+                    # a broken sink must not take the pipeline down
+                    pass
+            if stop:
+                return
+
+    def close(self, timeout: float = 5) -> None:
+        try:
+            self._queue.put(None, timeout=timeout)
+        except queue.Full:
+            return
+        self._thread.join(timeout)
+
+
+class LogPipeline:
+    def __init__(
+        self,
+        path: str = "downloader.log",
+        file_level: int = DEBUG,
+        max_bytes: int = 10 * 1048576,
+        backups: int = 3,
+        job_dir: str = "",
+        ring_size: int = 2000,
+        queue_size: int = 10000,
+    ):
+        self.path = Path(path).resolve()
+        self.max_bytes = max_bytes
+        self.backups = backups
+        self.job_dir = Path(job_dir) if job_dir else None
+        self.ring: deque[Record] = deque(maxlen=ring_size)
+        self._queue_size = queue_size
+        self._file = self.path.open("a", encoding="utf-8")
+        self._job_files: OrderedDict[str, object] = OrderedDict()
+        self._file_sink = _Sink("file", self._write_file, file_level, queue_size)
+        self._console_sink: Optional[_Sink] = None
+        self._closed = False
+
+    def set_console(self, write: Callable[[str], None], level: int = INFO) -> None:
+        """Send messages of at least ``level`` to ``write`` (e.g. a rich console)."""
+
+        def write_batch(records: list[Record]) -> None:
+            for r in records:
+                write(r.msg)
+
+        self._console_sink = _Sink("console", write_batch, level, self._queue_size)
+
+    def emit(self, level: int, msg, job: Optional[str] = None) -> None:
+        rec = Record(level, str(msg), job or JOB.get())
+        self.ring.append(rec)
+        if self._closed:
+            return
+        self._file_sink.put(rec)
+        if self._console_sink is not None:
+            self._console_sink.put(rec)
+
+    def recent(self, n: int = 100, level: int = DEBUG, job: Optional[str] = None) -> list[Record]:
+        """Return the last ``n`` buffered records matching ``level``/``job``."""
+        out = [r for r in list(self.ring) if r.level >= level and (job is None or r.job == job)]
+        return out[-n:]
+
+    @property
+    def dropped(self) -> int:
+        return self._file_sink.dropped + (self._console_sink.dropped if self._console_sink else 0)
+
+    # -- file sink (runs on the writer thread) ----------------------------
+
+    def _write_file(self, records: list[Record]) -> None:
+        self._file.write("".join(r.line() for r in records))
+        self._file.flush()
+        if self.max_bytes and self._file.tell() >= self.max_bytes:
+            self._rotate()
+        if self.job_dir is None:
+            return
+        touched = set()
+        for r in records:
+            if r.job:
+                f = self._job_file(r.job)
+                f.write(r.line())
+                touched.add(f)
+        for f in touched:
+            f.flush()
+
+    def _rotate(self) -> None:
+        self._file.close()
+        for i in range(self.backups - 1, 0, -1):
+            src = self.path.with_name(f"{self.path.name}.{i}")
+            if src.exists():
+                src.replace(self.path.with_name(f"{self.path.name}.{i + 1}"))
+        if self.backups:
+            self.path.replace(self.path.with_name(f"{self.path.name}.1"))
+        self._file = self.path.open("w", encoding="utf-8")
+
+    def _job_file(self, job: str):
+        f = self._job_files.get(job)
+        if f is not None:
+            self._job_files.move_to_end(job)
+            return f
+        if len(self._job_files) >= OPEN_JOB_FILES:
+            self._job_files.popitem(last=False)[1].close()
+        self.job_dir.mkdir(parents=True, exist_ok=True)
+        name = re.sub(r"[^A-Za-z0-9._-]+", "_", job.split("://", 1)[-1])[:120]
+        f = self._job_files[job] = (self.job_dir / f"{name}.log").open("a", encoding="utf-8")
+        return f
+
+    def close(self) -> None:
+        """Write out everything queued so far and close the files."""
+        if self._closed:
+            return
+        self._closed = True
+        if self.dropped:
+            self._file_sink.put(Record(WARNING, f"{self.dropped} Log-Meldungen verworfen (Ausgabe zu langsam)", None))
+        if self._console_sink is not None:
+            self._console_sink.close()
+        self._file_sink.close()
+        for f in self._job_files.values():
+            f.close()
+        self._job_files.clear()
+        self._file.close()
+
+
+_LOGS: Optional[LogPipeline] = None
+_LOGS_LOCK = threading.Lock()
+
+
+def configure(cfg) -> None:
+    """Replace the shared pipeline with one built from ``cfg``."""
+    global _LOGS
+    with _LOGS_LOCK:
+        if _LOGS is not None:
+            _LOGS.close()
+        _LOGS = LogPipeline(
+            cfg.log_path,
+            file_level=cfg.log_file_level,
+            max_bytes=int(cfg.log_max_mb * 1048576),
+            backups=cfg.log_backups,
+            job_dir=cfg.log_job_dir,
+            ring_size=cfg.log_ring_size,
+        )
+
+
+def get_logs() -> LogPipeline:
+    global _LOGS
+    with _LOGS_LOCK:
+        if _LOGS is None:
+            _LOGS = LogPipeline()
+        return _LOGS
@@ -1,25 +1,50 @@
+import sys
+
 from env import ensure_venv
 
 ensure_venv()
 
 from config import load_config
-from ui import UI
-from downloader import process, connect_vpn, disconnect_vpn
 
 
 def main():
+    # arguments first, so `--help` and usage errors don't wait for the
+    # downloader's imports
     cfg = load_config()
-    ui = UI()
+    if cfg.serve:
+        from daemon import serve
+
+        serve(cfg)
+        return
+    if cfg.remote:
+        from daemon_client import run_remote
+
+        failed = run_remote(cfg)
+        # exit codes wrap at 256, so report failure as 1
+        sys.exit(1 if failed else 0)
+
+    from ui import UI
+    from downloader import configure, connect_vpn, disconnect_vpn, shutdown
+    from journal import Journal
+    from pipeline import Pipeline
+
+    configure(cfg)
+    ui = UI(cfg.log_level, cfg.progress_interval)
+    journal = Journal(cfg.journal_path)
 
     if cfg.surfshark_server:
         connect_vpn(cfg.surfshark_server, ui)
     try:
-        for url in cfg.urls:
-            ui.set_phase("DOWNLOAD")
-            process(url, cfg, ui)
+        ui.set_phase("DOWNLOAD")
+        jobs = Pipeline(cfg, ui, journal).run(cfg.urls)
+        failed = [j for j in jobs if j.state == "failed"]
+        if failed:
+            ui.log(f"{len(failed)} von {len(jobs)} Jobs fehlgeschlagen")
     finally:
         if cfg.surfshark_server:
             disconnect_vpn(ui)
+        journal.close()
+        shutdown(ui)
         ui.set_phase("DONE")
         ui.close()
 
@@ -0,0 +1,153 @@
+"""Lightweight HLS/DASH manifest parsing.
+
+Most ``.m3u8``/``.mpd`` candidates state their resolutions and bitrates in the
+manifest itself, so reading it directly is far cheaper than running yt-dlp's
+extractor or ffprobe. The parsers work on plain text and never touch the
+network; :func:`probe_manifest` adds the HTTP part.
+"""
+
+from __future__ import annotations
+
+import re
+import xml.etree.ElementTree as ET
+from typing import Callable, Optional, Tuple
+from urllib.parse import urljoin
+
+_ATTR_RE = re.compile(r'([A-Z0-9-]+)=("[^"]*"|[^,]*)')
+_DURATION_RE = re.compile(
+    r"P(?:(?P<d>[\d.]+)D)?(?:T(?:(?P<h>[\d.]+)H)?(?:(?P<m>[\d.]+)M)?(?:(?P<s>[\d.]+)S)?)?"
+)
+
+
+def _attrs(line: str) -> dict[str, str]:
+    return {k: v.strip('"') for k, v in _ATTR_RE.findall(line.split(":", 1)[1])}
+
+
+def parse_hls(text: str, base_url: str = "") -> dict:
+    """Parse an HLS playlist.
+
+    Returns ``{"variants": [...], "segments": [...], "duration": float}``.
+    Master playlists fill ``variants`` with dicts holding ``url``,
+    ``height``, ``bandwidth``; media playlists fill ``segments`` with dicts
+    holding ``url`` and ``duration``.
+    """
+    variants: list[dict] = []
+    segments: list[dict] = []
+    pending: Optional[dict] = None
+    seg_duration: Optional[float] = None
+    for raw in text.splitlines():
+        line = raw.strip()
+        if not line:
+            continue
+        if line.startswith("#EXT-X-STREAM-INF"):
+            a = _attrs(line)
+            height = 0
+            if "x" in a.get("RESOLUTION", ""):
+                height = int(a["RESOLUTION"].split("x")[1])
+            pending = {
+                "height": height,
+                "bandwidth": int(a.get("AVERAGE-BANDWIDTH") or a.get("BANDWIDTH") or 0),
+                "codecs": a.get("CODECS"),
+            }
+        elif line.startswith("#EXTINF"):
+            try:
+                seg_duration = float(line.split(":", 1)[1].split(",", 1)[0])
+            except ValueError:
+                seg_duration = 0.0
+        elif not line.startswith("#"):
+            if pending is not None:
+                pending["url"] = urljoin(base_url, line)
+                variants.append(pending)
+                pending = None
+            elif seg_duration is not None:
+                segments.append({"url": urljoin(base_url, line), "duration": seg_duration})
+                seg_duration = None
+    return {
+        "variants": variants,
+        "segments": segments,
+        "duration": sum(s["duration"] for s in segments),
+    }
+
+
+def parse_duration(value: str) -> float:
+    """Return seconds for an ISO 8601 duration such as ``PT1H2M3.5S``."""
+    m = _DURATION_RE.fullmatch(value or "")
+    if not m:
+        return 0.0
+    d, h, mi, s = (float(m.group(g) or 0) for g in ("d", "h", "m", "s"))
+    return d * 86400 + h * 3600 + mi * 60 + s
+
+
+def _local(tag: str) -> str:
+    return tag.rsplit("}", 1)[-1]
+
+
+def parse_dash(text: str) -> dict:
+    """Parse a DASH MPD.
+
+    Returns ``{"video": [...], "audio": [...], "duration": float}`` where the
+    lists hold ``{"height", "bandwidth"}`` dicts per representation.
+    """
+    root = ET.fromstring(text)
+    video: list[dict] = []
+    audio: list[dict] = []
+    for aset in root.iter():
+        if _local(aset.tag) != "AdaptationSet":
+            continue
+        kind = (aset.get("contentType") or aset.get("mimeType") or "").split("/")[0]
+        for rep in aset:
+            if _local(rep.tag) != "Representation":
+                continue
+            rkind = kind or (rep.get("mimeType") or "").split("/")[0]
+            height = int(rep.get("height") or aset.get("height") or 0)
+            item = {"height": height, "bandwidth": int(rep.get("bandwidth") or 0)}
+            if rkind == "audio":
+                audio.append(item)
+            elif rkind == "video" or height:
+                video.append(item)
+    return {
+        "video": video,
+        "audio": audio,
+        "duration": parse_duration(root.get("mediaPresentationDuration", "")),
+    }
+
+
+def _estimate_size(bandwidth: int, duration: float) -> Optional[int]:
+    if not (bandwidth and duration):
+        return None
+    return int(bandwidth / 8 * duration)
+
+
+def probe_manifest(url: str, fetch: Callable[[str], str]) -> Optional[Tuple[int, Optional[int]]]:
+    """Return ``(height, size)`` read from the manifest at ``url``.
+
+    ``fetch`` returns the text of a URL. ``None`` means the manifest didn't
+    state a resolution and a heavier probe is needed. For HLS the size
+    estimate needs the duration, so the best variant's media playlist is
+    fetched as well.
+    """
+    path = url.split("?")[0].lower()
+    if path.endswith(".mpd"):
+        info = parse_dash(fetch(url))
+        if not info["video"]:
+            return None
+        best = max(info["video"], key=lambda r: (r["height"], r["bandwidth"]))
+        if not best["height"]:
+            return None
+        bandwidth = best["bandwidth"] + max((a["bandwidth"] for a in info["audio"]), default=0)
+        return best["height"], _estimate_size(bandwidth, info["duration"])
+
+    info = parse_hls(fetch(url), url)
+    if not info["variants"]:
+        return None
+    best = max(info["variants"], key=lambda v: (v["height"], v["bandwidth"]))
+    if not best["height"]:
+        return None
+    size = None
+    if best["bandwidth"]:
+        try:
+            media = parse_hls(fetch(best["url"]), best["url"])
+            size = _estimate_size(best["bandwidth"], media["duration"])
+        except Exception:
+            pass
+    return best["height"], size
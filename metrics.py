@@ -0,0 +1,211 @@
+"""Per-job phase spans, exported as JSON lines and a Prometheus textfile.
+
+Every phase of a job (fetching the page, extracting embeds, probing,
+sniffing, download, verification, upload) is recorded as a span holding its
+duration, byte count and outcome. Spans are appended to a JSONL file as they
+finish, and aggregated per phase into a textfile that node_exporter's
+textfile collector can scrape. A single job can also be run under cProfile.
+"""
+
+from __future__ import annotations
+
+import cProfile
+import json
+import os
+import pstats
+import re
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Optional
+
+PHASES = ("fetch_html", "extract_embeds", "probe", "light_sniff", "sniff", "download", "verify", "upload")
+# upper bounds (s) of the duration histogram buckets
+BUCKETS = (0.1, 0.5, 1, 5, 10, 30, 60, 300, 1800)
+# the textfile is rewritten at most this often (and on close)
+PROM_INTERVAL = 5.0
+
+
+class Span:
+    def __init__(self, phase: str, job: str):
+        self.phase = phase
+        self.job = job
+        self.start = time.time()
+        self.duration = 0.0
+        self.bytes = 0
+        self.outcome = "ok"
+        self.attrs: dict = {}
+
+    def set(self, **attrs) -> None:
+        self.attrs.update(attrs)
+
+    def as_dict(self) -> dict:
+        return {
+            "job": self.job,
+            "phase": self.phase,
+            "start": round(self.start, 3),
+            "duration": round(self.duration, 4),
+            "bytes": self.bytes,
+            "outcome": self.outcome,
+            **self.attrs,
+        }
+
+
+class Metrics:
+    """Span sink; empty paths switch the respective export off."""
+
+    def __init__(
+        self,
+        spans_path: str = "",
+        prom_path: str = "",
+        profile_job: str = "",
+        profile_dir: str = "profiles",
+    ):
+        self.spans_path = spans_path
+        self.prom_path = prom_path
+        self.profile_job = profile_job
+        self.profile_dir = profile_dir
+        self._lock = threading.Lock()
+        self._file = None
+        if spans_path:
+            Path(spans_path).parent.mkdir(parents=True, exist_ok=True)
+            self._file = open(spans_path, "a", encoding="utf-8")
+        # (phase, outcome) -> [count, duration sum, bytes, bucket counts]
+        self._agg: dict[tuple[str, str], list] = {}
+        self._written = 0.0
+        self._profiled: Optional[str] = None
+        self._profiler: Optional[cProfile.Profile] = None
+        # loop and executor profiles of the profiled job
+        self._profiles: list[cProfile.Profile] = []
+
+    @contextmanager
+    def span(self, phase: str, job: str):
+        """Record the enclosed block as ``phase`` of ``job``.
+
+        An exception marks the span as failed (outcome is the exception
+        type) and is re-raised.
+        """
+        sp = Span(phase, job)
+        t0 = time.perf_counter()
+        try:
+            yield sp
+        except BaseException as e:
+            sp.outcome = type(e).__name__
+            raise
+        finally:
+            sp.duration = time.perf_counter() - t0
+            self.record(sp)
+
+    def record(self, sp: Span) -> None:
+        with self._lock:
+            if self._file is not None:
+                self._file.write(json.dumps(sp.as_dict()) + "\n")
+                self._file.flush()
+            agg = self._agg.setdefault((sp.phase, sp.outcome), [0, 0.0, 0, [0] * len(BUCKETS)])
+            agg[0] += 1
+            agg[1] += sp.duration
+            agg[2] += sp.bytes
+            for i, bound in enumerate(BUCKETS):
+                if sp.duration <= bound:
+                    agg[3][i] += 1
+            if self.prom_path and time.monotonic() - self._written > PROM_INTERVAL:
+                self._write_prom()
+
+    def _write_prom(self) -> None:
+        lines = [
+            "# HELP downloader_phase_duration_seconds Wall time of job phases.",
+            "# TYPE downloader_phase_duration_seconds histogram",
+        ]
+        for (phase, outcome), (count, total, _, buckets) in sorted(self._agg.items()):
+            labels = f'phase="{phase}",outcome="{outcome}"'
+            for bound, n in zip(BUCKETS, buckets):
+                lines.append(f'downloader_phase_duration_seconds_bucket{{{labels},le="{bound}"}} {n}')
+            lines.append(f'downloader_phase_duration_seconds_bucket{{{labels},le="+Inf"}} {count}')
+            lines.append(f"downloader_phase_duration_seconds_sum{{{labels}}} {total:.6f}")
+            lines.append(f"downloader_phase_duration_seconds_count{{{labels}}} {count}")
+        lines += [
+            "# HELP downloader_phase_bytes_total Bytes transferred per phase.",
+            "# TYPE downloader_phase_bytes_total counter",
+        ]
+        for (phase, outcome), (_, _, nbytes, _) in sorted(self._agg.items()):
+            lines.append(f'downloader_phase_bytes_total{{phase="{phase}",outcome="{outcome}"}} {nbytes}')
+        path = Path(self.prom_path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        # node_exporter must never see a half-written file
+        tmp = path.with_name(path.name + ".tmp")
+        tmp.write_text("\n".join(lines) + "\n", encoding="utf-8")
+        os.replace(tmp, path)
+        self._written = time.monotonic()
+
+    @contextmanager
+    def profiled(self, job: str):
+        """Run the block under cProfile if ``job`` is the profiled job.
+
+        The first job whose URL contains ``profile_job`` (``*`` matches any)
+        is chosen; its stages accumulate into one profile, which is dumped
+        after each stage. Besides the stage thread, the runtime loop thread is
+        profiled while the block runs (this includes coroutines of other jobs
+        running at the same time), and so are the blocking calls the job hands
+        to the executor via ``runtime.run_blocking``.
+        """
+        with self._lock:
+            if self.profile_job and self._profiled is None:
+                if self.profile_job == "*" or self.profile_job in job:
+                    self._profiled = job
+                    self._profiler = cProfile.Profile()
+            active = self._profiled == job
+        if not active:
+            yield
+            return
+        import runtime
+
+        loop_profile = cProfile.Profile()
+        self._profiles.append(loop_profile)
+        token = runtime.PROFILES.set(self._profiles)
+        runtime.call_in_loop(loop_profile.enable)
+        self._profiler.enable()
+        try:
+            yield
+        finally:
+            self._profiler.disable()
+            runtime.call_in_loop(loop_profile.disable)
+            runtime.PROFILES.reset(token)
+            Path(self.profile_dir).mkdir(parents=True, exist_ok=True)
+            name = re.sub(r"[^A-Za-z0-9._-]+", "_", job)[-120:]
+            stats = pstats.Stats(self._profiler, *self._profiles)
+            stats.dump_stats(str(Path(self.profile_dir) / f"{name}.prof"))
+
+    def close(self) -> None:
+        with self._lock:
+            if self.prom_path and self._agg:
+                self._write_prom()
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+
+_METRICS: Optional[Metrics] = None
+_METRICS_LOCK = threading.Lock()
+
+
+def configure(cfg) -> None:
+    """Replace the shared sink with one built from ``cfg``."""
+    global _METRICS
+    with _METRICS_LOCK:
+        if _METRICS is not None:
+            _METRICS.close()
+        _METRICS = Metrics(cfg.metrics_spans_path, cfg.metrics_prom_path, cfg.profile_job, cfg.profile_dir)
+
+
+def get_metrics() -> Metrics:
+    global _METRICS
+    with _METRICS_LOCK:
+        if _METRICS is None:
+            _METRICS = Metrics()
+        return _METRICS
+
+
+def span(phase: str, job: str):
+    """Shortcut for ``get_metrics().span(phase, job)``."""
+    return get_metrics().span(phase, job)
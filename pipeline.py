@@ -0,0 +1,160 @@
+"""Batch processing as a pipeline of resolve, download, verify and upload.
+
+Each stage has its own worker count and bounded queue, so while one URL is
+uploading the next one is already downloading. Verification failures send a
+job back to the download stage to try its next candidate. Queue depths and
+busy times are logged periodically and at the end, which shows the
+bottleneck stage.
+"""
+
+from __future__ import annotations
+
+import threading
+import time
+
+from downloader import (
+    Transfer,
+    download_transfer,
+    resolve_transfer,
+    upload_to_koofr,
+    verify_transfer,
+)
+from journal import Journal, resume_stage
+from logs import job_context
+from metrics import get_metrics
+from scheduler import Job, Scheduler, host_key
+
+STAGES = ("resolve", "download", "verify", "upload")
+
+
+class Pipeline:
+    def __init__(self, cfg, ui, journal: Journal | None = None):
+        self.cfg = cfg
+        self.ui = ui
+        self.journal = journal
+        workers = cfg.stage_workers
+        handlers = {
+            "resolve": self._resolve,
+            "download": self._download,
+            "verify": self._verify,
+            "upload": self._upload,
+        }
+        self.stages: dict[str, Scheduler] = {}
+        for name in STAGES:
+            # only resolving and downloading talk to the video hosts
+            per_host = cfg.per_host if name in ("resolve", "download") else workers[name]
+            # the resolve queue takes the whole batch up front
+            maxsize = 0 if name == "resolve" else cfg.stage_queue
+            self.stages[name] = Scheduler(
+                self._guard(handlers[name]), workers[name], per_host, maxsize, name
+            )
+        self.jobs: list[Job] = []
+        self._remaining = 0
+        self._lock = threading.Lock()
+        self._done = threading.Event()
+        self._started = 0.0
+
+    def _finish(self, job: Job, state: str, error=None) -> None:
+        job.state = state
+        job.error = error
+        job.data.record(state=state, error=str(error) if error else None)
+        with self._lock:
+            self._remaining -= 1
+            if self._remaining == 0:
+                self._done.set()
+
+    def _guard(self, handler):
+        def run(job: Job) -> None:
+            try:
+                with job_context(job.url), get_metrics().profiled(job.url):
+                    handler(job)
+            except Exception as e:
+                self.ui.log(f"[red]{job.url} fehlgeschlagen: {e}[/red]")
+                self._finish(job, "failed", e)
+
+        return run
+
+    def _resolve(self, job: Job) -> None:
+        t: Transfer = job.data
+        resolve_transfer(t, self.cfg, self.ui)
+        if t.candidates:
+            # from here on the per-host limit applies to the embed host
+            job.key = host_key(t.candidates[0])
+        self.stages["download"].put(job)
+
+    def _download(self, job: Job) -> None:
+        t: Transfer = job.data
+        ok = download_transfer(t, self.cfg, self.ui)
+        if not ok and t.restored:
+            self.ui.log(f"Gespeicherter Stream für {t.url} unbrauchbar – löse neu auf")
+            resolve_transfer(t, self.cfg, self.ui)
+            ok = download_transfer(t, self.cfg, self.ui)
+        if not ok:
+            raise RuntimeError("Kein Kandidat ließ sich herunterladen")
+        self.stages["verify"].put(job)
+
+    def _verify(self, job: Job) -> None:
+        if verify_transfer(job.data, self.ui):
+            self.stages["upload"].put(job)
+        else:
+            # never block here: download workers may be waiting on us
+            self.stages["download"].put(job, block=False)
+
+    def _upload(self, job: Job) -> None:
+        job.data.record(state="uploading")
+        upload_to_koofr(job.data.path, self.cfg, self.ui, job.url)
+        self._finish(job, "done")
+
+    def status(self) -> str:
+        parts = []
+        for name, st in self.stages.items():
+            parts.append(f"{name}: {st.depth()} wartend, {st.running()} aktiv, {st.busy:.0f}s belegt")
+        return " | ".join(parts)
+
+    def _monitor(self) -> None:
+        interval = self.cfg.stats_interval
+        while interval and not self._done.wait(interval):
+            self.ui.log(f"[dim]Pipeline – {self.status()}[/dim]")
+
+    def report(self) -> None:
+        elapsed = max(time.monotonic() - self._started, 1e-6)
+        for name, st in self.stages.items():
+            util = st.busy / (elapsed * st.workers) * 100
+            self.ui.log(f"Stufe {name}: {st.busy:.1f}s belegt, {util:.0f}% Auslastung ({st.workers} Worker)")
+
+    def run(self, urls) -> list[Job]:
+        self._started = time.monotonic()
+        queued: list[tuple[Job, str]] = []
+        for url in dict.fromkeys(urls):
+            t = Transfer(url, self.cfg)
+            stage = "resolve"
+            if self.journal is not None:
+                t.journal = self.journal
+                entry = self.journal.get(url)
+                if entry:
+                    stage = resume_stage(entry)
+                    if stage is None:
+                        self.ui.log(f"{url} bereits erledigt – überspringe")
+                        continue
+                    t.restore(entry)
+                    if stage != "resolve":
+                        self.ui.log(f"Setze {url} bei Stufe {stage} fort")
+            key = host_key(t.candidates[0]) if t.candidates else host_key(url)
+            job = Job(url, key, t)
+            self.jobs.append(job)
+            queued.append((job, stage))
+        if not queued:
+            return self.jobs
+        self._remaining = len(queued)
+        for st in self.stages.values():
+            st.start()
+        for job, stage in queued:
+            if stage == "resolve":
+                job.data.record(state="queued")
+            self.stages[stage].put(job, block=False)
+        threading.Thread(target=self._monitor, name="pipeline-monitor", daemon=True).start()
+        self._done.wait()
+        for st in self.stages.values():
+            st.join()
+        self.report()
+        return self.jobs
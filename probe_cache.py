@@ -0,0 +1,179 @@
+"""On-disk cache for stream probe results.
+
+Probing a candidate with yt-dlp (and possibly ffprobe) takes seconds, while
+the answer – the best height and size a URL offers – rarely changes. The
+results are stored in a small SQLite database keyed on a normalised URL from
+which volatile query parameters such as ``expires`` or ``token`` have been
+removed, so a freshly signed link to a known stream hits the cache as well.
+Failures are the exception: a 403 for an expired token says nothing about
+the freshly signed link, so errors are only served for the exact URL.
+"""
+
+from __future__ import annotations
+
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Optional, Tuple
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+# query parameters that change on every page load but don't identify the
+# stream itself (expiry timestamps, auth tokens, CDN signatures)
+VOLATILE_PARAMS = {
+    "exp",
+    "expire",
+    "expires",
+    "hash",
+    "hmac",
+    "key-pair-id",
+    "policy",
+    "sig",
+    "signature",
+    "st",
+    "token",
+    "ts",
+    "validfrom",
+    "validto",
+}
+VOLATILE_PREFIXES = ("x-amz-", "x-goog-")
+# one-letter names are signatures on CDN stream URLs but often the video ID
+# on embed pages, so they are only dropped from stream and manifest paths
+STREAM_VOLATILE_PARAMS = {"e", "s", "t"}
+STREAM_EXTS = (".m3u8", ".mpd", ".mp4")
+
+ProbeResult = Tuple[int, Optional[int], Optional[str]]
+
+
+def normalize_url(url: str) -> str:
+    """Return ``url`` without fragment and volatile query parameters."""
+    parts = urlsplit(url)
+    volatile = VOLATILE_PARAMS
+    if parts.path.lower().endswith(STREAM_EXTS):
+        volatile = VOLATILE_PARAMS | STREAM_VOLATILE_PARAMS
+    query = sorted(
+        (k, v)
+        for k, v in parse_qsl(parts.query, keep_blank_values=True)
+        if k.lower() not in volatile and not k.lower().startswith(VOLATILE_PREFIXES)
+    )
+    return urlunsplit((
+        parts.scheme.lower(),
+        parts.netloc.lower(),
+        parts.path,
+        urlencode(query),
+        "",
+    ))
+
+
+def _exact_key(url: str) -> str:
+    # failures are keyed on the full URL including its tokens
+    return url.split("#", 1)[0]
+
+
+class ProbeCache:
+    """SQLite backed ``(height, size, error)`` store with TTL and LRU eviction.
+
+    Failed probes are kept for ``error_ttl`` only, since errors are often
+    transient (rate limits, expired tokens), and under the exact URL.
+    """
+
+    def __init__(
+        self,
+        path: str = ".cache/probe.sqlite",
+        ttl: float = 7 * 24 * 3600,
+        error_ttl: float = 600,
+        max_entries: int = 5000,
+    ):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.ttl = ttl
+        self.error_ttl = error_ttl
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._puts = 0
+        self._db = sqlite3.connect(str(self.path), check_same_thread=False, timeout=10)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS probes ("
+            " key TEXT PRIMARY KEY,"
+            " height INTEGER,"
+            " size INTEGER,"
+            " error TEXT,"
+            " expires REAL,"
+            " accessed REAL)"
+        )
+        self._db.commit()
+
+    def get(self, url: str) -> Optional[ProbeResult]:
+        key, exact = normalize_url(url), _exact_key(url)
+        now = time.time()
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT key, height, size, error, expires FROM probes WHERE key IN (?, ?)", (key, exact)
+            ).fetchall()
+            # a success for the stream beats an error for this very link
+            rows = [r for r in rows if not r[3] or r[0] == exact]
+            rows.sort(key=lambda r: bool(r[3]))
+            if not rows:
+                return None
+            row = rows[0]
+            if row[4] < now:
+                self._db.execute("DELETE FROM probes WHERE key = ?", (row[0],))
+                self._db.commit()
+                return None
+            self._db.execute("UPDATE probes SET accessed = ? WHERE key = ?", (now, row[0]))
+            self._db.commit()
+        return row[1], row[2], row[3]
+
+    def put(self, url: str, result: ProbeResult) -> None:
+        height, size, error = result
+        now = time.time()
+        expires = now + (self.error_ttl if error else self.ttl)
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO probes VALUES (?, ?, ?, ?, ?, ?)",
+                (_exact_key(url) if error else normalize_url(url), height, size, error, expires, now),
+            )
+            self._puts += 1
+            if self._puts % 100 == 0:
+                self._evict(now)
+            self._db.commit()
+
+    def _evict(self, now: float) -> None:
+        self._db.execute("DELETE FROM probes WHERE expires < ?", (now,))
+        self._db.execute(
+            "DELETE FROM probes WHERE key IN ("
+            " SELECT key FROM probes ORDER BY accessed DESC LIMIT -1 OFFSET ?)",
+            (self.max_entries,),
+        )
+
+    def close(self) -> None:
+        with self._lock:
+            self._evict(time.time())
+            self._db.commit()
+            self._db.close()
+
+
+_CACHE: Optional[ProbeCache] = None
+_CACHE_LOCK = threading.Lock()
+
+
+def configure(cfg) -> None:
+    """Replace the shared cache with one built from ``cfg``."""
+    global _CACHE
+    with _CACHE_LOCK:
+        if _CACHE is not None:
+            _CACHE.close()
+        _CACHE = ProbeCache(
+            cfg.probe_cache_path,
+            ttl=cfg.probe_cache_ttl,
+            max_entries=cfg.probe_cache_max_entries,
+        )
+
+
+def get_cache() -> ProbeCache:
+    global _CACHE
+    with _CACHE_LOCK:
+        if _CACHE is None:
+            _CACHE = ProbeCache()
+        return _CACHE
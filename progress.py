@@ -0,0 +1,166 @@
+"""Coalesced progress reporting.
+
+Downloads and uploads call ``update`` as often as they like (yt-dlp does so
+for every fragment chunk); the aggregator only stores the latest byte counts
+per transfer. A background thread publishes a snapshot at a fixed rate, with
+speeds smoothed over the publish intervals, ETAs derived from them and a
+combined total for the whole batch. Displays therefore redraw a few times a
+second regardless of how many transfers run in parallel.
+"""
+
+from __future__ import annotations
+
+import threading
+import time
+from typing import Callable, Optional
+
+MB = 1024 * 1024
+
+
+def format_rate(bps: float) -> str:
+    return f"{bps / MB:.1f}MiB/s"
+
+
+def format_eta(seconds: Optional[float]) -> str:
+    if seconds is None:
+        return ""
+    seconds = int(seconds)
+    return f"{seconds // 60:02d}:{seconds % 60:02d}"
+
+
+class Snapshot:
+    """Published state of one transfer (or of the whole batch)."""
+
+    __slots__ = ("name", "done", "total", "speed", "finished")
+
+    def __init__(self, name: str, done: int, total: Optional[int], speed: float, finished: bool):
+        self.name = name
+        self.done = done
+        self.total = total
+        self.speed = speed
+        self.finished = finished
+
+    @property
+    def percent(self) -> float:
+        if self.finished:
+            return 100.0
+        return min(self.done / self.total * 100, 100.0) if self.total else 0.0
+
+    @property
+    def eta(self) -> Optional[float]:
+        if not self.total or not self.speed or self.finished:
+            return None
+        return max(self.total - self.done, 0) / self.speed
+
+    def speed_str(self) -> str:
+        return format_rate(self.speed) if self.speed else ""
+
+    def eta_str(self) -> str:
+        return format_eta(self.eta)
+
+
+class _Transfer:
+    __slots__ = ("done", "total", "finished", "last_done", "speed", "seen")
+
+    def __init__(self):
+        self.done = 0
+        self.total: Optional[int] = None
+        self.finished = False
+        self.last_done: Optional[int] = None
+        self.speed = 0.0
+        self.seen = False
+
+
+class ProgressAggregator:
+    """Latest-state store that calls ``publish(transfers, total)`` every
+    ``interval`` seconds while something changed.
+
+    ``alpha`` weights the newest interval in the smoothed speed.
+    """
+
+    def __init__(
+        self,
+        publish: Callable[[list[Snapshot], Snapshot], None],
+        interval: float = 0.5,
+        alpha: float = 0.3,
+    ):
+        self.publish = publish
+        self.interval = interval
+        self.alpha = alpha
+        self._transfers: dict[str, _Transfer] = {}
+        self._lock = threading.Lock()
+        self._dirty = False
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._last_tick = time.monotonic()
+
+    def update(self, name: str, done: int, total: Optional[int] = None, finished: bool = False) -> None:
+        """Record the current byte count of ``name``; cheap enough for every
+        callback."""
+        with self._lock:
+            tr = self._transfers.get(name)
+            if tr is None:
+                tr = self._transfers[name] = _Transfer()
+            tr.done = done
+            if total:
+                tr.total = total
+            tr.finished = tr.finished or finished or bool(tr.total and done >= tr.total)
+            self._dirty = True
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="progress", daemon=True)
+                self._thread.start()
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            self.flush()
+
+    def flush(self) -> None:
+        """Publish a snapshot now if anything changed since the last one."""
+        now = time.monotonic()
+        with self._lock:
+            if not self._dirty:
+                self._last_tick = now
+                return
+            self._dirty = False
+            dt = max(now - self._last_tick, 1e-6)
+            self._last_tick = now
+            snaps = []
+            for name, tr in self._transfers.items():
+                if tr.last_done is None or tr.done < tr.last_done:
+                    # first sample, or the transfer restarted from scratch
+                    tr.speed = 0.0
+                elif not tr.finished:
+                    inst = (tr.done - tr.last_done) / dt
+                    tr.speed = inst if not tr.seen else self.alpha * inst + (1 - self.alpha) * tr.speed
+                    tr.seen = True
+                tr.last_done = tr.done
+                snaps.append(Snapshot(name, tr.done, tr.total, 0.0 if tr.finished else tr.speed, tr.finished))
+        known = [s for s in snaps if s.total]
+        total = Snapshot(
+            "Gesamt",
+            sum(s.done for s in known),
+            sum(s.total for s in known) or None,
+            sum(s.speed for s in snaps),
+            bool(snaps) and all(s.finished for s in snaps),
+        )
+        self.publish(snaps, total)
+
+    def forget_finished(self) -> None:
+        """Drop finished transfers from later snapshots and the total."""
+        with self._lock:
+            for name in [n for n, tr in self._transfers.items() if tr.finished]:
+                del self._transfers[name]
+            self._dirty = True
+
+    def discard(self, names) -> None:
+        """Drop the given transfers, finished or not (e.g. of a cancelled job)."""
+        with self._lock:
+            for name in names:
+                self._transfers.pop(name, None)
+            self._dirty = True
+
+    def close(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=2)
+        self.flush()
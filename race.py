@@ -0,0 +1,114 @@
+"""Throughput race between stream candidates.
+
+Mirrors offering the same resolution often differ a lot in real speed. The
+race briefly downloads the start of every candidate in parallel – the first
+HLS segments or the first bytes of a progressive file – and measures time to
+first byte and sustained throughput. As soon as one candidate has fetched
+``max_bytes`` (or the time window is over) all other connections are
+cancelled.
+"""
+
+from __future__ import annotations
+
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Optional
+
+from manifest import parse_hls
+
+
+class Measurement:
+    def __init__(self, url: str):
+        self.url = url
+        self.ttfb: Optional[float] = None
+        self.bytes = 0
+        self.transfer = 0.0
+        self.error: Optional[str] = None
+
+    @property
+    def throughput(self) -> float:
+        """Bytes per second after the first byte arrived."""
+        return self.bytes / self.transfer if self.transfer > 0 else 0.0
+
+    def summary(self) -> str:
+        if self.error or self.ttfb is None:
+            return "-"
+        return f"{self.throughput / 1048576:.1f} MiB/s, TTFB {self.ttfb * 1000:.0f} ms"
+
+
+class _Racer:
+    def __init__(self, client, stop: threading.Event, deadline: float, max_bytes: int):
+        self.client = client
+        self.stop = stop
+        self.deadline = deadline
+        self.max_bytes = max_bytes
+
+    def _done(self, m: Measurement) -> bool:
+        return self.stop.is_set() or time.monotonic() > self.deadline or m.bytes >= self.max_bytes
+
+    def _stream(self, url: str, headers: dict, m: Measurement, start: float) -> None:
+        resp = self.client.get(url, headers=headers, stream=True, timeout=10)
+        try:
+            resp.raise_for_status()
+            first: Optional[float] = None
+            for chunk in resp.iter_content(64 * 1024):
+                now = time.monotonic()
+                if first is None:
+                    first = now
+                    if m.ttfb is None:
+                        m.ttfb = now - start
+                m.bytes += len(chunk)
+                if self._done(m):
+                    break
+            if first is not None:
+                m.transfer += time.monotonic() - first
+        finally:
+            resp.close()
+
+    def run(self, candidate: str, locate: Callable[[str], tuple[str, dict]]) -> Measurement:
+        m = Measurement(candidate)
+        start = time.monotonic()
+        try:
+            url, headers = locate(candidate)
+            headers = headers or {}
+            if url.split("?")[0].lower().endswith(".m3u8"):
+                info = parse_hls(self.client.fetch_text(url, timeout=10), url)
+                if info["variants"]:
+                    best = max(info["variants"], key=lambda v: (v["height"], v["bandwidth"]))
+                    info = parse_hls(self.client.fetch_text(best["url"], timeout=10), best["url"])
+                for seg in info["segments"]:
+                    self._stream(seg["url"], headers, m, start)
+                    if self._done(m):
+                        break
+            else:
+                self._stream(url, {**headers, "Range": f"bytes=0-{self.max_bytes - 1}"}, m, start)
+            if m.bytes >= self.max_bytes:
+                # the first candidate to finish wins; cancel the others
+                self.stop.set()
+        except Exception as e:
+            m.error = str(e)
+        return m
+
+
+def race(
+    candidates: list[str],
+    locate: Callable[[str], tuple[str, dict]],
+    client,
+    seconds: float = 4.0,
+    max_bytes: int = 8 * 1048576,
+) -> dict[str, Measurement]:
+    """Measure every candidate; ``locate`` maps a candidate to its media URL
+    and request headers."""
+    if not candidates:
+        return {}
+    stop = threading.Event()
+    racer = _Racer(client, stop, time.monotonic() + seconds, max_bytes)
+    with ThreadPoolExecutor(max_workers=len(candidates), thread_name_prefix="race") as ex:
+        futures = {c: ex.submit(racer.run, c, locate) for c in candidates}
+        return {c: f.result() for c, f in futures.items()}
+
+
+def rank(items: list, results: dict[str, Measurement]) -> list:
+    """Order ``(url, info)`` items by measured throughput, unmeasured last."""
+    return sorted(items, key=lambda x: results[x[0]].throughput if x[0] in results else -1.0, reverse=True)
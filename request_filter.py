@@ -0,0 +1,221 @@
+"""Request filtering for Playwright sniffs.
+
+A sniff only needs the documents, scripts and XHR/fetch calls that bring a
+player to the point where it requests its manifest. Images, fonts and
+stylesheets are aborted by resource type, and requests to ad and tracker
+domains by a blocklist. The blocklist is read from hosts files
+(``0.0.0.0 ads.example``) or EasyList-style filter lists (``||ads.example^``)
+and held in a trie over the reversed domain labels, so a lookup costs one
+step per label of the request's host instead of a scan over all rules.
+
+Aborted requests never reach the network, so their size is unknown;
+:class:`FilterStats` estimates the bytes saved from typical sizes per
+resource type.
+"""
+
+from __future__ import annotations
+
+import threading
+from pathlib import Path
+from typing import Iterable, Optional
+from urllib.parse import urlsplit
+
+# resource types a player needs; everything else is aborted. "script" and
+# "fetch" stay allowed since players load and query their config with them
+ALLOW_TYPES = ("document", "script", "xhr", "fetch", "media", "other")
+
+# always blocked, even without any blocklist file
+DEFAULT_DOMAINS = (
+    "doubleclick.net",
+    "googlesyndication.com",
+    "googleadservices.com",
+    "adservice.google.com",
+    "google-analytics.com",
+    "googletagmanager.com",
+    "popads.net",
+    "popcash.net",
+    "propellerads.com",
+    "adsterra.com",
+    "exoclick.com",
+    "juicyads.com",
+)
+
+# rough transfer sizes (bytes) per resource type, for the savings estimate
+TYPICAL_BYTES = {
+    "image": 40_000,
+    "font": 60_000,
+    "stylesheet": 30_000,
+    "script": 80_000,
+    "media": 500_000,
+}
+DEFAULT_BYTES = 10_000
+
+# the key marking the end of a blocked domain in the trie
+_END = ""
+_HOSTS_ADDRESSES = ("0.0.0.0", "127.0.0.1", "::", "::1")
+
+
+class DomainTrie:
+    """Set of domains matched together with all their subdomains."""
+
+    def __init__(self, domains: Iterable[str] = ()):
+        self._root: dict = {}
+        self.size = 0
+        for domain in domains:
+            self.add(domain)
+
+    def add(self, domain: str) -> None:
+        node = self._root
+        for label in reversed(domain.lower().strip(".").split(".")):
+            if _END in node:
+                return  # a parent domain is blocked already
+            node = node.setdefault(label, {})
+        if _END not in node:
+            self.size -= _count(node)
+            node.clear()  # subdomains are covered now
+            node[_END] = True
+            self.size += 1
+
+    def match(self, host: str) -> bool:
+        node = self._root
+        for label in reversed(host.lower().rstrip(".").split(".")):
+            node = node.get(label)
+            if node is None:
+                return False
+            if _END in node:
+                return True
+        return False
+
+
+def _count(node: dict) -> int:
+    """Number of domains stored in the subtree below ``node``."""
+    count, stack = 0, [node]
+    while stack:
+        for key, child in stack.pop().items():
+            if key == _END:
+                count += 1
+            else:
+                stack.append(child)
+    return count
+
+
+def parse_rule(line: str) -> Optional[str]:
+    """Return the domain a hosts-file or filter-list line blocks, if any.
+
+    Only whole-domain rules are understood: ``0.0.0.0 example.com``,
+    ``example.com`` and ``||example.com^`` (options after ``$`` are ignored).
+    Exceptions, cosmetic filters and rules with paths are skipped.
+    """
+    line = line.strip()
+    if not line or line.startswith(("!", "#", "[", "@@")) or "##" in line or "#@#" in line:
+        return None
+    if line.startswith("||"):
+        rule = line[2:].split("$", 1)[0]
+        if not rule.endswith("^") or "/" in rule or "*" in rule:
+            return None
+        domain = rule[:-1]
+    else:
+        parts = line.split("#", 1)[0].split()
+        if len(parts) == 2 and parts[0] in _HOSTS_ADDRESSES:
+            domain = parts[1]
+        elif len(parts) == 1 and not parts[0].startswith(("/", "|", "-", "&", ".")):
+            domain = parts[0]
+        else:
+            return None
+    domain = domain.lower().strip(".")
+    if "." not in domain or domain in ("localhost", "localhost.localdomain") or not all(
+        c.isalnum() or c in "-._" for c in domain
+    ):
+        return None
+    return domain
+
+
+def load_blocklist(paths: list[str], ui=None) -> DomainTrie:
+    """Build the trie from :data:`DEFAULT_DOMAINS` and the files in ``paths``."""
+    trie = DomainTrie(DEFAULT_DOMAINS)
+    for path in paths:
+        try:
+            with open(Path(path).expanduser(), encoding="utf-8", errors="replace") as f:
+                for line in f:
+                    domain = parse_rule(line)
+                    if domain:
+                        trie.add(domain)
+        except OSError as e:
+            if ui:
+                ui.log(f"Blockliste {path} nicht lesbar: {e}")
+    return trie
+
+
+class FilterStats:
+    """Requests one sniff let through or aborted."""
+
+    def __init__(self):
+        self.allowed = 0
+        self.by_type = 0
+        self.by_domain = 0
+        self.bytes_saved = 0
+
+    @property
+    def blocked(self) -> int:
+        return self.by_type + self.by_domain
+
+    def summary(self) -> str:
+        return (
+            f"{self.blocked} Requests blockiert ({self.by_type} nach Typ, {self.by_domain} nach Domain), "
+            f"~{self.bytes_saved / 1048576:.1f} MiB gespart"
+        )
+
+
+class RequestFilter:
+    def __init__(self, allow_types: Iterable[str] = ALLOW_TYPES, blocklist: Optional[DomainTrie] = None):
+        self.allow_types = frozenset(allow_types)
+        self.blocklist = blocklist if blocklist is not None else DomainTrie(DEFAULT_DOMAINS)
+
+    def blocks(self, url: str, resource_type: str, stats: Optional[FilterStats] = None) -> bool:
+        """Return whether the request should be aborted and count it in ``stats``."""
+        if resource_type not in self.allow_types:
+            reason = "by_type"
+        elif self.blocklist.match(urlsplit(url).hostname or ""):
+            reason = "by_domain"
+        else:
+            if stats is not None:
+                stats.allowed += 1
+            return False
+        if stats is not None:
+            setattr(stats, reason, getattr(stats, reason) + 1)
+            stats.bytes_saved += TYPICAL_BYTES.get(resource_type, DEFAULT_BYTES)
+        return True
+
+    async def route(self, route, stats: Optional[FilterStats] = None) -> None:
+        """Playwright route handler: abort or continue ``route``."""
+        request = route.request
+        if self.blocks(request.url, request.resource_type, stats):
+            await route.abort("blockedbyclient")
+        else:
+            await route.continue_()
+
+
+_FILTER: Optional[RequestFilter] = None
+_PATHS: list[str] = []
+_ALLOW: tuple[str, ...] = ALLOW_TYPES
+_FILTER_LOCK = threading.Lock()
+
+
+def configure(cfg) -> None:
+    """Remember the settings; the blocklist is compiled on the first sniff."""
+    global _FILTER, _PATHS, _ALLOW
+    with _FILTER_LOCK:
+        _FILTER = None
+        _PATHS = list(cfg.sniff_blocklists)
+        _ALLOW = tuple(cfg.sniff_allow_types)
+
+
+def get_filter(ui=None) -> RequestFilter:
+    global _FILTER
+    with _FILTER_LOCK:
+        if _FILTER is None:
+            trie = load_blocklist(_PATHS, ui)
+            _FILTER = RequestFilter(_ALLOW, trie)
+            if ui and _PATHS:
+                ui.log(f"Blockliste mit {trie.size} Domains geladen")
+        return _FILTER
@@ -0,0 +1,315 @@
+"""Downloads that survive expiring stream tokens.
+
+Many hosts sign their stream URLs with short-lived tokens (``expires=…``).
+When such a token lapses in the middle of a long HLS download, yt-dlp fails
+and the whole transfer starts over on a fresh URL. The downloader here keeps
+track of the last completed segment (or byte offset for progressive files),
+obtains a fresh URL for the same rendition through a ``refresh`` callback
+when the server answers 401/403/404/410 – or shortly before the ``expires``
+deadline – and continues where it stopped. Progress is kept in a small state
+file next to the output so a restarted run resumes as well.
+"""
+
+from __future__ import annotations
+
+import json
+import os
+import shutil
+import subprocess
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Callable, Optional
+from urllib.parse import parse_qsl, urlsplit
+
+from manifest import parse_hls
+from probe_cache import normalize_url
+
+# responses that mean "this signed URL is no longer valid"
+TOKEN_STATUS = (401, 403, 404, 410)
+EXPIRY_PARAMS = ("expires", "expire", "exp", "e", "validto")
+
+
+class TokenExpired(Exception):
+    pass
+
+
+class Unsupported(Exception):
+    """The stream needs features this downloader doesn't implement."""
+
+
+def token_expiry(url: str) -> Optional[float]:
+    """Return the unix time encoded in ``url``'s expiry parameter, if any."""
+    for key, value in parse_qsl(urlsplit(url).query):
+        if key.lower() in EXPIRY_PARAMS and value.isdigit() and len(value) >= 9:
+            return float(value[:10])
+    return None
+
+
+def pick_variant(variants: list[dict], height: int, bandwidth: int = 0) -> dict:
+    """Return the variant matching ``height`` (closest bandwidth wins)."""
+    same = [v for v in variants if v["height"] == height] or variants
+    return min(same, key=lambda v: abs(v["bandwidth"] - bandwidth))
+
+
+class ResumableDownloader:
+    def __init__(
+        self,
+        client,
+        refresh: Callable[[], str],
+        headers: Optional[dict] = None,
+        workers: int = 4,
+        retries: int = 3,
+        refresh_margin: float = 60,
+        max_refreshes: int = 5,
+        max_reconnects: int = 5,
+        progress: Optional[Callable[[dict], None]] = None,
+    ):
+        self.client = client
+        self.refresh = refresh
+        self.headers = headers or {}
+        self.workers = workers
+        self.retries = retries
+        self.refresh_margin = refresh_margin
+        self.max_refreshes = max_refreshes
+        self.max_reconnects = max_reconnects
+        self.progress = progress
+        self.refreshes = 0
+
+    def _get(self, url: str, extra_headers: Optional[dict] = None, **kwargs):
+        last: Optional[Exception] = None
+        headers = {**self.headers, **(extra_headers or {})}
+        for attempt in range(self.retries + 1):
+            if attempt:
+                time.sleep(2 ** (attempt - 1))
+            try:
+                resp = self.client.get(url, headers=headers, timeout=30, **kwargs)
+            except Exception as e:
+                last = e
+                continue
+            if resp.status_code in TOKEN_STATUS:
+                raise TokenExpired(f"HTTP {resp.status_code} für {url}")
+            if resp.status_code < 400:
+                return resp
+            last = RuntimeError(f"HTTP {resp.status_code} für {url}")
+        raise last
+
+    def _renew(self, reason: str, ui) -> str:
+        if self.refreshes >= self.max_refreshes:
+            raise RuntimeError(f"Token-Erneuerung aufgegeben: {reason}")
+        self.refreshes += 1
+        ui.log(f"{reason} – hole frische Stream-URL ({self.refreshes}/{self.max_refreshes})")
+        return self.refresh()
+
+    def _expiring(self, url: str) -> bool:
+        exp = token_expiry(url)
+        return exp is not None and time.time() > exp - self.refresh_margin
+
+    def _report(self, ui, out: Path, part: Path, done: int, total: Optional[int], start: float, sent: int):
+        ui.update_progress(out.name, done, total)
+        if self.progress:
+            speed = sent / max(time.monotonic() - start, 1e-6)
+            self.progress({
+                "status": "downloading",
+                "downloaded_bytes": done,
+                "speed": speed,
+                "total_bytes_estimate": total,
+                "tmpfilename": str(part),
+                "filename": str(out),
+            })
+
+    # -- HLS --------------------------------------------------------------
+
+    def _media_playlist(self, url: str, height: int, bandwidth: int) -> tuple[dict, int, int]:
+        text = self._get(url).text
+        if "#EXT-X-KEY" in text and "METHOD=NONE" not in text:
+            raise Unsupported("verschlüsselter HLS-Stream")
+        info = parse_hls(text, url)
+        if info["variants"]:
+            variant = pick_variant(info["variants"], height, bandwidth)
+            height, bandwidth = variant["height"], variant["bandwidth"]
+            return self._media_playlist(variant["url"], height, bandwidth)
+        if "#EXT-X-MAP" in text:
+            raise Unsupported("fMP4-HLS mit Init-Segment")
+        if not info["segments"]:
+            raise Unsupported("leere Playlist")
+        info["url"] = url
+        return info, height, bandwidth
+
+    def hls(self, url: str, out: Path, ui, height: int = 0) -> Path:
+        part = out.with_name(out.name + ".part")
+        state_path = out.with_name(out.name + ".resume")
+        state = _load(state_path)
+        source = normalize_url(url)
+        if state and state.get("source") != source:
+            ui.log(f"Fortsetzungsstand von {out.name} gehört zu einem anderen Stream – beginne neu")
+            state = {}
+
+        bandwidth = state.get("bandwidth", 0)
+        height = state.get("height", height)
+        playlist, height, bandwidth = self._media_playlist(url, height, bandwidth)
+        rendition = normalize_url(playlist["url"])
+        if state and state.get("rendition") != rendition:
+            # segments of another variant must not be spliced in
+            ui.log(f"Variante von {out.name} hat sich geändert – beginne neu")
+            state = {}
+
+        index = state.get("segment", 0)
+        written = state.get("bytes", 0)
+        if part.exists() and part.stat().st_size >= written:
+            with part.open("r+b") as f:
+                f.truncate(written)
+        else:
+            index, written = 0, 0
+            part.write_bytes(b"")
+        if index:
+            ui.log(f"Setze {out.name} bei Segment {index} fort")
+        segments = playlist["segments"]
+        total_duration = playlist["duration"] or 1
+        start = time.monotonic()
+        sent = 0
+
+        with part.open("ab") as f:
+            while index < len(segments):
+                if self._expiring(playlist["url"]) or self._expiring(segments[index]["url"]):
+                    url = self._renew("Token läuft gleich ab", ui)
+                    playlist, height, bandwidth = self._media_playlist(url, height, bandwidth)
+                    segments = playlist["segments"]
+                    continue
+                try:
+                    for data in self._fetch_ordered(segments, index):
+                        f.write(data)
+                        f.flush()
+                        index += 1
+                        written += len(data)
+                        sent += len(data)
+                        _save(state_path, {
+                            "source": source,
+                            "rendition": rendition,
+                            "segment": index,
+                            "bytes": written,
+                            "height": height,
+                            "bandwidth": bandwidth,
+                        })
+                        done_duration = sum(s["duration"] for s in segments[:index])
+                        estimate = int(written / max(done_duration, 1e-6) * total_duration)
+                        self._report(ui, out, part, written, estimate, start, sent)
+                        if self._expiring(segments[min(index, len(segments) - 1)]["url"]):
+                            break
+                except TokenExpired as e:
+                    url = self._renew(str(e), ui)
+                    playlist, height, bandwidth = self._media_playlist(url, height, bandwidth)
+                    if len(playlist["segments"]) != len(segments):
+                        ui.log("Neue Playlist hat andere Segmentzahl – Position wird beibehalten")
+                    segments = playlist["segments"]
+
+        part.replace(out)
+        state_path.unlink(missing_ok=True)
+        ui.update_progress(out.name, written, written, finished=True)
+        return _remux(out, ui)
+
+    def _fetch_ordered(self, segments: list[dict], start: int):
+        """Yield segment payloads in order, fetching a few ahead."""
+        with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="segment") as ex:
+            pending = {}
+            nxt = start
+            try:
+                for i in range(start, len(segments)):
+                    while nxt < len(segments) and len(pending) < self.workers * 2:
+                        pending[nxt] = ex.submit(lambda u: self._get(u).content, segments[nxt]["url"])
+                        nxt += 1
+                    yield pending.pop(i).result()
+            finally:
+                for fut in pending.values():
+                    fut.cancel()
+
+    # -- progressive ------------------------------------------------------
+
+    def progressive(self, url: str, out: Path, ui) -> Path:
+        part = out.with_name(out.name + ".part")
+        offset = part.stat().st_size if part.exists() else 0
+        if offset:
+            ui.log(f"Setze {out.name} bei {offset / 1048576:.1f} MiB fort")
+        start = time.monotonic()
+        sent = 0
+        total: Optional[int] = None
+        # consecutive broken connections without any new data
+        failures = 0
+        while True:
+            if self._expiring(url):
+                url = self._renew("Token läuft gleich ab", ui)
+            try:
+                resp = self._get(url, {"Range": f"bytes={offset}-"} if offset else None, stream=True)
+            except TokenExpired as e:
+                url = self._renew(str(e), ui)
+                continue
+            if offset and resp.status_code != 206:
+                # server ignored the range request; start over
+                offset = 0
+                part.write_bytes(b"")
+            length = int(resp.headers.get("Content-Length") or 0)
+            total = offset + length if length else total
+            complete = False
+            before = offset
+            try:
+                with part.open("ab") as f:
+                    for chunk in resp.iter_content(1 << 20):
+                        f.write(chunk)
+                        offset += len(chunk)
+                        sent += len(chunk)
+                        self._report(ui, out, part, offset, total, start, sent)
+                        if self._expiring(url):
+                            break
+                    else:
+                        complete = True
+            except Exception as e:
+                failures = 0 if offset > before else failures + 1
+                if failures > self.max_reconnects:
+                    raise RuntimeError(
+                        f"Verbindung {failures}× ohne Fortschritt abgebrochen: {e}"
+                    ) from e
+                ui.log(f"Verbindung abgebrochen bei {offset / 1048576:.1f} MiB: {e}")
+                time.sleep(min(2 ** failures, 30))
+            finally:
+                resp.close()
+            if (total and offset >= total) or (complete and not total):
+                break
+            if complete:
+                # the response ended short of the known size
+                failures = 0 if offset > before else failures + 1
+                if failures > self.max_reconnects:
+                    raise RuntimeError(
+                        f"Server liefert {failures}× keine weiteren Daten "
+                        f"({offset / 1048576:.1f} von {total / 1048576:.1f} MiB)"
+                    )
+                if failures:
+                    time.sleep(min(2 ** failures, 30))
+        part.replace(out)
+        ui.update_progress(out.name, offset, offset, finished=True)
+        return out
+
+
+def _load(path: Path) -> dict:
+    try:
+        return json.loads(path.read_text())
+    except (OSError, ValueError):
+        return {}
+
+
+def _save(path: Path, state: dict) -> None:
+    tmp = path.with_name(path.name + ".tmp")
+    tmp.write_text(json.dumps(state))
+    os.replace(tmp, path)
+
+
+def _remux(path: Path, ui) -> Path:
+    """Remux an MPEG-TS file into MP4 when ffmpeg is available."""
+    if not shutil.which("ffmpeg"):
+        return path
+    target = path.with_suffix(".mp4")
+    cmd = ["ffmpeg", "-v", "error", "-y", "-i", str(path), "-c", "copy", str(target)]
+    if subprocess.run(cmd, capture_output=True).returncode == 0:
+        path.unlink()
+        return target
+    ui.log(f"Remux von {path.name} fehlgeschlagen – behalte TS-Datei")
+    return path
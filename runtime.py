@@ -0,0 +1,136 @@
+"""The one event loop all resolution work runs on.
+
+Probing, sniffing and page resolution are coroutines scheduled on a single
+long-lived loop in a background thread, so the work of many jobs overlaps
+instead of every call creating and tearing down its own loop. Blocking
+calls (``requests``, yt-dlp's extractor, SQLite) go to the loop's bounded
+default executor; external tools run as asyncio subprocesses.
+
+Synchronous code (worker threads, the Tk GUI) uses :func:`run` to wait for
+a coroutine. It must not be called from the loop thread itself.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import contextvars
+import functools
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Optional
+
+_LOOP: Optional[asyncio.AbstractEventLoop] = None
+_THREAD: Optional[threading.Thread] = None
+_LOCK = threading.Lock()
+
+# threads for blocking calls made from coroutines
+BLOCKING_WORKERS = 16
+
+# profiles of the job running under the profiler (see metrics.profiled);
+# blocking calls made on its behalf are profiled in their executor thread
+PROFILES: contextvars.ContextVar[Optional[list]] = contextvars.ContextVar("profiles", default=None)
+
+
+def get_loop() -> asyncio.AbstractEventLoop:
+    """Return the shared loop, starting it on first use."""
+    global _LOOP, _THREAD
+    with _LOCK:
+        if _LOOP is None:
+            loop = asyncio.new_event_loop()
+            loop.set_default_executor(ThreadPoolExecutor(BLOCKING_WORKERS, thread_name_prefix="blocking"))
+            thread = threading.Thread(target=loop.run_forever, name="runtime", daemon=True)
+            thread.start()
+            _LOOP, _THREAD = loop, thread
+        return _LOOP
+
+
+async def _in_context(ctx: contextvars.Context, coro):
+    for var, value in ctx.items():
+        var.set(value)
+    return await coro
+
+
+def submit(coro) -> Future:
+    """Schedule ``coro`` on the shared loop and return a thread-safe future.
+
+    The caller's context variables (e.g. the current job for logging) are
+    visible inside ``coro``.
+    """
+    return asyncio.run_coroutine_threadsafe(_in_context(contextvars.copy_context(), coro), get_loop())
+
+
+def call_in_loop(fn):
+    """Call the plain function ``fn`` in the loop thread and return its result."""
+    loop = get_loop()
+    if threading.current_thread() is _THREAD:
+        return fn()
+    fut: Future = Future()
+
+    def call():
+        try:
+            fut.set_result(fn())
+        except BaseException as e:
+            fut.set_exception(e)
+
+    loop.call_soon_threadsafe(call)
+    return fut.result()
+
+
+def run(coro):
+    """Run ``coro`` on the shared loop and block until it finishes."""
+    if threading.current_thread() is _THREAD:
+        coro.close()
+        raise RuntimeError("runtime.run() darf nicht im Event-Loop-Thread laufen")
+    return submit(coro).result()
+
+
+async def run_blocking(fn, *args, **kwargs):
+    """Run the blocking ``fn`` in the loop's executor."""
+    loop = asyncio.get_running_loop()
+    call = functools.partial(fn, *args, **kwargs)
+    profiles = PROFILES.get()
+    if profiles is not None:
+        call = functools.partial(_profiled, profiles, call)
+    return await loop.run_in_executor(None, call)
+
+
+def _profiled(profiles: list, call):
+    import cProfile
+
+    profile = cProfile.Profile()
+    profiles.append(profile)
+    return profile.runcall(call)
+
+
+async def run_process(*cmd: str, timeout: float = 30) -> tuple[int, str]:
+    """Run ``cmd`` and return its exit code and stdout.
+
+    The process is killed after ``timeout`` seconds and reported as ``-1``.
+    A missing executable is reported as ``127``.
+    """
+    try:
+        proc = await asyncio.create_subprocess_exec(
+            *cmd, stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.DEVNULL
+        )
+    except FileNotFoundError:
+        return 127, ""
+    try:
+        out, _ = await asyncio.wait_for(proc.communicate(), timeout)
+    except asyncio.TimeoutError:
+        proc.kill()
+        await proc.wait()
+        return -1, ""
+    return proc.returncode, out.decode(errors="replace")
+
+
+def shutdown() -> None:
+    """Stop the shared loop; the next use starts a new one."""
+    global _LOOP, _THREAD
+    with _LOCK:
+        loop, thread = _LOOP, _THREAD
+        _LOOP = _THREAD = None
+    if loop is None:
+        return
+    loop.call_soon_threadsafe(loop.stop)
+    thread.join(timeout=5)
+    loop.close()
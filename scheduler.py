@@ -0,0 +1,245 @@
+"""Concurrent job scheduling with per-host limits.
+
+Jobs are queued per host and handed out round-robin, so a host with a long
+backlog (or slow jobs) can never starve the others. A global worker count
+bounds the total number of running jobs and ``per_host`` bounds how many of
+them may hit the same host at once. Interactive front ends instead keep the
+order the user arranged (``fair=False``): the first waiting job whose host
+has room starts next.
+"""
+
+from __future__ import annotations
+
+import threading
+import time
+from collections import deque
+from typing import Callable, Optional
+from urllib.parse import urlsplit
+
+from extractors import extractor_for
+
+
+def host_key(url: str) -> str:
+    """Return the scheduling key for ``url``.
+
+    Known embed hosts are grouped under the name of their extractor (see
+    ``extractors``) so that e.g. all ``kinoger.*`` mirrors share one limit;
+    every other URL is keyed on its network location.
+    """
+    extractor = extractor_for(url)
+    if extractor is not None:
+        return extractor.name
+    return urlsplit(url).netloc.lower() or url
+
+
+class Job:
+    def __init__(self, url: str, key: str, data=None):
+        self.url = url
+        self.key = key
+        self.data = data
+        self.state = "queued"
+        self.owner: Optional["Scheduler"] = None
+        self.error: Optional[BaseException] = None
+
+
+class Scheduler:
+    """Run ``handler(job)`` for submitted URLs on a bounded worker pool.
+
+    With ``maxsize`` set, :meth:`put` blocks while that many jobs are
+    waiting, which lets a fast producer feed a slow consumer without
+    piling up work. With ``fair=False`` jobs start in queue order instead of
+    round-robin per host, and waiting jobs can be reordered.
+    """
+
+    def __init__(
+        self,
+        handler: Callable[[Job], None],
+        workers: int = 4,
+        per_host: int = 2,
+        maxsize: int = 0,
+        name: str = "job",
+        fair: bool = True,
+    ):
+        self.handler = handler
+        self.workers = max(1, workers)
+        self.per_host = max(1, per_host)
+        self.maxsize = maxsize
+        self.name = name
+        self.fair = fair
+        self.jobs: list[Job] = []
+        self.busy = 0.0
+        self._pending: dict[str, deque[Job]] = {}
+        self._order: deque[str] = deque()
+        # waiting jobs in queue order when not fair
+        self._queue: deque[Job] = deque()
+        self._active: dict[str, int] = {}
+        # the key whose per-host slot each running job holds
+        self._slots: dict[Job, Optional[str]] = {}
+        self._cond = threading.Condition()
+        self._closed = False
+        self._threads: list[threading.Thread] = []
+
+    def submit(self, url: str, key: Optional[str] = None, data=None) -> Job:
+        job = Job(url, key or host_key(url), data)
+        self.put(job)
+        return job
+
+    def put(self, job: Job, block: bool = True) -> None:
+        """Queue ``job``; waits for room if the queue is bounded and ``block``."""
+        with self._cond:
+            while block and self.maxsize and self.depth() >= self.maxsize:
+                self._cond.wait()
+            job.state = "queued"
+            if self.fair:
+                if job.key not in self._pending:
+                    self._pending[job.key] = deque()
+                    self._order.append(job.key)
+                self._pending[job.key].append(job)
+            else:
+                self._queue.append(job)
+            if job not in self.jobs:
+                self.jobs.append(job)
+            self._cond.notify_all()
+
+    def depth(self) -> int:
+        """Number of jobs waiting for a worker."""
+        return sum(len(q) for q in self._pending.values()) + len(self._queue)
+
+    def running(self) -> int:
+        return sum(self._active.values())
+
+    def waiting(self) -> list[Job]:
+        """Jobs waiting for a worker, in the order they would start."""
+        with self._cond:
+            if not self.fair:
+                return list(self._queue)
+            return [job for key in self._order for job in self._pending[key]]
+
+    def remove(self, job: Job) -> bool:
+        """Take a waiting job out of the queue; ``False`` if it isn't waiting."""
+        with self._cond:
+            queue = self._queue if not self.fair else self._pending.get(job.key, ())
+            if job not in queue:
+                return False
+            queue.remove(job)
+            self._cond.notify_all()
+            return True
+
+    def forget(self, jobs) -> None:
+        """Drop finished ``jobs`` from :attr:`jobs` in long-running queues."""
+        gone = set(jobs)
+        with self._cond:
+            self.jobs = [j for j in self.jobs if j not in gone]
+
+    def move(self, job: Job, delta: int) -> bool:
+        """Move a waiting job ``delta`` places towards the end of the queue.
+
+        Only queues without ``fair`` have an order to change.
+        """
+        with self._cond:
+            if self.fair or job not in self._queue:
+                return False
+            i = self._queue.index(job)
+            j = min(max(i + delta, 0), len(self._queue) - 1)
+            del self._queue[i]
+            self._queue.insert(j, job)
+            return True
+
+    def rekey(self, job: Job, key: str, check: Optional[Callable[[], None]] = None) -> None:
+        """Move a running job's per-host slot to ``key``.
+
+        Waits while ``key`` is at its limit; ``check`` is called meanwhile
+        and may raise to give up, leaving the job without a slot.
+        """
+        with self._cond:
+            old = self._slots[job]
+            if old == key:
+                return
+            if old is not None:
+                self._active[old] -= 1
+                self._slots[job] = None
+                self._cond.notify_all()
+            while self._active.get(key, 0) >= self.per_host:
+                if check is not None:
+                    check()
+                self._cond.wait(1)
+            self._active[key] = self._active.get(key, 0) + 1
+            self._slots[job] = key
+            job.key = key
+
+    def _next(self) -> Optional[Job]:
+        if not self.fair:
+            # the first job in queue order whose host has room
+            for job in self._queue:
+                if self._active.get(job.key, 0) < self.per_host:
+                    self._queue.remove(job)
+                    self._active[job.key] = self._active.get(job.key, 0) + 1
+                    return job
+            return None
+        # Rotate through the hosts so each one gets a turn before any host
+        # gets a second job; hosts at their cap are skipped for now.
+        for _ in range(len(self._order)):
+            key = self._order[0]
+            self._order.rotate(-1)
+            queue = self._pending[key]
+            if queue and self._active.get(key, 0) < self.per_host:
+                self._active[key] = self._active.get(key, 0) + 1
+                return queue.popleft()
+        return None
+
+    def _idle(self) -> bool:
+        return not self._queue and not any(self._pending.values()) and not any(self._active.values())
+
+    def _work(self) -> None:
+        while True:
+            with self._cond:
+                job = self._next()
+                while job is None:
+                    if self._closed and self._idle():
+                        self._cond.notify_all()
+                        return
+                    self._cond.wait()
+                    job = self._next()
+                self._slots[job] = job.key
+                job.owner = self
+                job.state = "running"
+                # a slot in the bounded queue just became free
+                self._cond.notify_all()
+            start = time.monotonic()
+            try:
+                self.handler(job)
+                # the handler may have passed the job on to another scheduler
+                if job.state == "running" and job.owner is self:
+                    job.state = "done"
+            except Exception as e:
+                job.state = "failed"
+                job.error = e
+            finally:
+                with self._cond:
+                    self.busy += time.monotonic() - start
+                    key = self._slots.pop(job)
+                    if key is not None:
+                        self._active[key] -= 1
+                    self._cond.notify_all()
+
+    def start(self) -> None:
+        for i in range(self.workers):
+            t = threading.Thread(target=self._work, name=f"{self.name}-{i}", daemon=True)
+            t.start()
+            self._threads.append(t)
+
+    def join(self, timeout: Optional[float] = None) -> None:
+        """Wait until every submitted job has finished (or ``timeout`` passed)."""
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        deadline = None if timeout is None else time.monotonic() + timeout
+        for t in self._threads:
+            t.join(None if deadline is None else max(deadline - time.monotonic(), 0))
+
+    def run(self, urls) -> list[Job]:
+        for url in urls:
+            self.submit(url)
+        self.start()
+        self.join()
+        return self.jobs
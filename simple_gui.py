@@ -5,23 +5,26 @@ ensure_venv()
 import tkinter as tk
 from tkinter import ttk
 from tkinter.scrolledtext import ScrolledText
-from threading import Thread
-from queue import Queue
-from downloader import process
+from collections import deque
+from threading import Lock
+from downloader import configure, shutdown
 from config import load_config
+from daemon_client import DaemonClient, RemoteJobQueue, daemon_token
+from jobqueue import JobQueue, job_snapshot
+from logs import INFO, get_logs
+from progress import ProgressAggregator
 
 
 def append_log(msg: str) -> None:
     """Add a message to the queue for display in the GUI."""
-    log_queue.put(msg)
+    log_queue.append(msg)
 
-def queue_progress(name: str, percent: float, speed: str, eta: str) -> None:
-    """Forward progress updates to the main thread."""
-    progress_queue.put((name, percent, speed, eta))
 
-def queue_progress(name: str, percent: float, speed: str, eta: str) -> None:
-    """Forward progress updates to the main thread."""
-    progress_queue.put((name, percent, speed, eta))
+def publish_progress(snaps, total) -> None:
+    """Keep only the newest aggregated progress for the main thread."""
+    global latest_progress
+    with progress_lock:
+        latest_progress = (snaps, total)
 
 
 class TkConsole:
@@ -37,60 +40,124 @@ class TkUI:
     def __init__(self):
         self.console = TkConsole()
 
-    def log(self, msg: str) -> None:
-        append_log(str(msg))
-
-    def update_progress(self, name: str, percent: float, speed: str = "", eta: str = "") -> None:
-        queue_progress(name, percent, speed, eta)
-
-
-def worker(url: str) -> None:
-    append_log(f"Starte Download: {url}")
-    ui = TkUI()
-    cfg = load_config([])
-    try:
-        process(url, cfg, ui)
-        append_log("Fertig.")
-    except Exception as e:
-        append_log(f"Fehler: {e}")
-    finally:
-        done_queue.put(True)
-
-
-def start_download() -> None:
-    url = entry.get().strip()
-    if not url:
-        return
-    entry.config(state=tk.DISABLED)
-    btn.config(state=tk.DISABLED)
-    progress_var.set(0)
-    pb.config(mode="indeterminate")
-    pb.start(10)
-    status_var.set("Verbinde…")
-    Thread(target=worker, args=(url,), daemon=True).start()
+    def log(self, msg: str, level: int = INFO) -> None:
+        get_logs().emit(level, msg)
+        if level >= INFO:
+            append_log(str(msg))
+
+    def update_progress(self, name: str, done: int, total=None, finished: bool = False) -> None:
+        aggregator.update(name, done, total, finished)
+
+
+STATE_LABELS = {
+    "queued": "wartend",
+    "resolving": "löse auf",
+    "downloading": "lädt",
+    "verifying": "prüft",
+    "uploading": "lädt hoch",
+    "done": "fertig",
+    "failed": "fehlgeschlagen",
+    "cancelled": "abgebrochen",
+}
+
+
+def add_urls(event=None) -> None:
+    # several URLs may be pasted at once
+    for url in entry.get().split():
+        try:
+            jobs.submit(url)
+        except Exception as e:
+            append_log(f"{url} nicht eingereiht: {e}")
+            return
+    entry.delete(0, tk.END)
+
+
+def selected_ids() -> list[int]:
+    return [int(iid) for iid in table.selection()]
+
+
+def cancel_selected() -> None:
+    for job_id in selected_ids():
+        jobs.cancel(job_id)
+
+
+def move_selected(delta: int) -> None:
+    # moving down, the last one has to go first to keep their order
+    ids = sorted(selected_ids(), key=lambda i: table.index(str(i)), reverse=delta > 0)
+    for job_id in ids:
+        jobs.move(job_id, delta)
+
+
+def clear_finished() -> None:
+    for job in jobs.clear_finished():
+        rows.pop(str(job.id), None)
+        if table.exists(str(job.id)):
+            table.delete(str(job.id))
+
+
+def trim_log() -> None:
+    lines = int(text.index("end-1c").split(".")[0])
+    excess = lines - cfg.gui_log_lines
+    if excess > 0:
+        text.delete("1.0", f"{excess + 1}.0")
+
+
+def job_row(job, snaps: dict) -> tuple:
+    snap = job_snapshot(job, snaps)
+    running = snap is not None and not job.finished
+    if job.state == "done":
+        percent = "100.0%"
+    else:
+        percent = f"{snap.percent:5.1f}%" if snap is not None else ""
+    return (
+        job.url,
+        STATE_LABELS.get(job.state, job.state),
+        f"{job.height}p" if job.height else "",
+        percent,
+        snap.speed_str() if running else "",
+        snap.eta_str() if running else "",
+    )
+
+
+def refresh_table(snaps: dict) -> None:
+    current = jobs.jobs()
+    for index, job in enumerate(current):
+        iid = str(job.id)
+        values = job_row(job, snaps)
+        if iid not in rows:
+            table.insert("", index, iid=iid, values=values)
+        else:
+            if rows[iid] != values:
+                table.item(iid, values=values)
+            if table.index(iid) != index:
+                table.move(iid, "", index)
+        rows[iid] = values
+        if job.finished and job.id not in retired:
+            retired.add(job.id)
+            aggregator.discard(job.names)
 
 
 def poll_queues() -> None:
-    while not log_queue.empty():
-        text.insert(tk.END, log_queue.get() + "\n")
+    lines = []
+    while log_queue:
+        lines.append(log_queue.popleft())
+    if lines:
+        text.insert(tk.END, "\n".join(lines) + "\n")
+        trim_log()
         text.see(tk.END)
 
-    while not progress_queue.empty():
-        name, percent, speed, eta = progress_queue.get()
-        if str(pb.cget("mode")) == "indeterminate":
-            pb.stop()
-            pb.config(mode="determinate")
-        progress_var.set(percent)
-        status_var.set(f"{name}: {percent:5.1f}% {speed} ETA {eta}")
-
-    while not done_queue.empty():
-        done_queue.get()
-        pb.stop()
-        pb.config(mode="determinate")
-        progress_var.set(0)
-        status_var.set("Bereit")
-        entry.config(state=tk.NORMAL)
-        btn.config(state=tk.NORMAL)
+    global latest_progress, latest_snaps
+    with progress_lock:
+        update, latest_progress = latest_progress, None
+    if update is not None:
+        snaps, total = update
+        latest_snaps = {s.name: s for s in snaps}
+        progress_var.set(total.percent)
+        if snaps:
+            status_var.set(f"{total.name}: {total.percent:5.1f}% {total.speed_str()} ETA {total.eta_str()}")
+        else:
+            status_var.set("Bereit")
+    refresh_table(latest_snaps)
 
     root.after(100, poll_queues)
 
@@ -112,25 +179,74 @@ frame.columnconfigure(0, weight=1)
 
 entry = ttk.Entry(frame, width=50)
 entry.grid(row=0, column=0, padx=5, pady=5, sticky="ew")
+entry.bind("<Return>", add_urls)
 
-btn = ttk.Button(frame, text="Download", command=start_download)
+btn = ttk.Button(frame, text="Hinzufügen", command=add_urls)
 btn.grid(row=0, column=1, padx=5, pady=5)
 
+columns = {
+    "url": ("URL", 320),
+    "state": ("Status", 100),
+    "height": ("Auflösung", 80),
+    "percent": ("Fortschritt", 80),
+    "speed": ("Tempo", 90),
+    "eta": ("ETA", 60),
+}
+table = ttk.Treeview(frame, columns=list(columns), show="headings", height=8)
+for col, (heading, width) in columns.items():
+    table.heading(col, text=heading)
+    table.column(col, width=width, stretch=col == "url")
+table.grid(row=1, column=0, columnspan=2, sticky="nsew", padx=5, pady=5)
+
+buttons = ttk.Frame(frame)
+buttons.grid(row=2, column=0, columnspan=2, sticky="w")
+ttk.Button(buttons, text="Abbrechen", command=cancel_selected).pack(side="left", padx=5)
+ttk.Button(buttons, text="Nach oben", command=lambda: move_selected(-1)).pack(side="left", padx=5)
+ttk.Button(buttons, text="Nach unten", command=lambda: move_selected(1)).pack(side="left", padx=5)
+ttk.Button(buttons, text="Fertige entfernen", command=clear_finished).pack(side="left", padx=5)
+
 progress_var = tk.DoubleVar(value=0)
 pb = ttk.Progressbar(frame, variable=progress_var, maximum=100)
-pb.grid(row=1, column=0, columnspan=2, sticky="ew", padx=5, pady=5)
+pb.grid(row=3, column=0, columnspan=2, sticky="ew", padx=5, pady=5)
 
 status_var = tk.StringVar(value="Bereit")
 status = ttk.Label(frame, textvariable=status_var)
-status.grid(row=2, column=0, columnspan=2, sticky="w", padx=5)
-
-text = ScrolledText(frame, width=60, height=15)
-text.grid(row=3, column=0, columnspan=2, sticky="nsew", padx=5, pady=5)
-frame.rowconfigure(3, weight=1)
-
-log_queue: Queue[str] = Queue()
-progress_queue: Queue[tuple[str, float, str, str]] = Queue()
-done_queue: Queue[bool] = Queue()
+status.grid(row=4, column=0, columnspan=2, sticky="w", padx=5)
+
+text = ScrolledText(frame, width=60, height=12)
+text.grid(row=5, column=0, columnspan=2, sticky="nsew", padx=5, pady=5)
+frame.rowconfigure(1, weight=1)
+frame.rowconfigure(5, weight=1)
+
+cfg = load_config([])
+# bounded like the log ring buffer: if the window falls behind, the oldest
+# lines go (they would be trimmed from the widget anyway)
+log_queue: deque[str] = deque(maxlen=cfg.gui_log_lines)
+progress_lock = Lock()
+latest_progress = None
+latest_snaps: dict = {}
+# last values shown per table row, so unchanged rows aren't redrawn
+rows: dict[str, tuple] = {}
+retired: set[int] = set()
+aggregator = ProgressAggregator(publish_progress, cfg.progress_interval)
+
+client = DaemonClient(cfg.daemon_url, daemon_token(cfg))
+remote = client.available()
+if remote:
+    # a running daemon already has everything warm; only show its jobs
+    jobs = RemoteJobQueue(client, publish_progress)
+    append_log(f"Verbunden mit Dienst unter {cfg.daemon_url}")
+else:
+    # caches and the browser pool live as long as the window so repeated
+    # downloads don't pay their start-up cost again
+    configure(cfg)
+    jobs = JobQueue(cfg, TkUI(), cfg.workers, cfg.per_host)
+jobs.start()
 poll_queues()
 
 root.mainloop()
+jobs.close()
+aggregator.close()
+if not remote:
+    shutdown()
+get_logs().close()
@@ -0,0 +1,41 @@
+from pathlib import Path
+
+from light_sniff import decode_base64, stream_urls, unescape_js, unpack_packer
+
+FIXTURES = Path(__file__).parent / "fixtures"
+
+
+def fixture(name: str) -> str:
+    return (FIXTURES / name).read_text()
+
+
+def test_unpacks_radix_62_packer():
+    page = fixture("packed_player.html")
+    assert "master.m3u8" not in page
+    (code,) = unpack_packer(page)
+    # more than 62 words, so two-character tokens had to be resolved
+    assert code.startswith('var player=jwplayer("vplayer");var src=atob("aHR0cHM6')
+    assert "opt59:59" in code
+    assert decode_base64(code) == [
+        "https://cdn.vidhost.example/hls/Xk29fQ/master.m3u8?t=1893456000&s=c2lnbmF0dXJl"
+    ]
+
+
+def test_packed_page_stream_urls():
+    urls, decoded = stream_urls(fixture("packed_player.html"), "https://www.vidhost.example/e/Xk29fQ")
+    assert urls == ["https://cdn.vidhost.example/hls/Xk29fQ/master.m3u8?t=1893456000&s=c2lnbmF0dXJl"]
+    assert decoded == 2  # packer, then base64
+
+
+def test_base64_config_and_escaped_strings():
+    urls, decoded = stream_urls(fixture("base64_player.html"), "https://embed.example/v/8841")
+    assert urls == [
+        "https://media.example-cdn.net/v/8841/manifest.mpd",
+        "https://media.example-cdn.net/v/8841/720.mp4",
+        "https://media.example-cdn.net/v/8841/1080.mp4",
+    ]
+    assert decoded == 1
+
+
+def test_unescape_js():
+    assert unescape_js(r'"https\x3a\/\/a.example/v.m3u8"') == '"https://a.example/v.m3u8"'
@@ -0,0 +1,66 @@
+from pathlib import Path
+
+from manifest import parse_dash, parse_duration, parse_hls, probe_manifest
+
+FIXTURES = Path(__file__).parent / "fixtures"
+MASTER_URL = "https://cdn.example/vod/abc/master.m3u8?token=1"
+
+
+def fixture(name: str) -> str:
+    return (FIXTURES / name).read_text()
+
+
+def test_hls_master_resolves_relative_variant_uris():
+    info = parse_hls(fixture("master.m3u8"), MASTER_URL)
+    assert [v["url"] for v in info["variants"]] == [
+        "https://cdn.example/vod/abc/480p/index.m3u8",
+        "https://cdn.example/vod/abc/720p/index.m3u8?v=2",
+        "https://cdn.example/vod/alt/1080p.m3u8",
+    ]
+    assert not info["segments"]
+
+
+def test_hls_prefers_average_bandwidth():
+    variants = parse_hls(fixture("master.m3u8"), MASTER_URL)["variants"]
+    assert [(v["height"], v["bandwidth"]) for v in variants] == [
+        (480, 1100000),
+        (720, 2400000),
+        (1080, 5600000),  # no AVERAGE-BANDWIDTH, falls back to BANDWIDTH
+    ]
+
+
+def test_hls_skips_i_frame_playlists():
+    urls = [v["url"] for v in parse_hls(fixture("master.m3u8"), MASTER_URL)["variants"]]
+    assert not any("iframes" in u for u in urls)
+
+
+def test_hls_media_playlist_segments_and_duration():
+    info = parse_hls(fixture("media.m3u8"), "https://cdn.example/vod/abc/720p/index.m3u8")
+    assert not info["variants"]
+    assert info["segments"][0]["url"] == "https://cdn.example/vod/abc/720p/seg-00000.ts"
+    assert info["duration"] == 16.5
+
+
+def test_dash_representations_and_duration():
+    info = parse_dash(fixture("manifest.mpd"))
+    assert info["video"] == [{"height": 480, "bandwidth": 1100000}, {"height": 1080, "bandwidth": 4800000}]
+    assert info["audio"] == [{"height": 0, "bandwidth": 128000}]
+    assert info["duration"] == 3723.5
+
+
+def test_parse_duration():
+    assert parse_duration("PT1H2M3.5S") == 3723.5
+    assert parse_duration("P1DT30M") == 88200
+    assert parse_duration("PT45S") == 45
+    assert parse_duration("") == 0
+    assert parse_duration("garbage") == 0
+
+
+def test_probe_manifest_reads_best_variant_and_estimates_size():
+    pages = {
+        MASTER_URL: fixture("master.m3u8"),
+        "https://cdn.example/vod/alt/1080p.m3u8": fixture("media.m3u8"),
+    }
+    assert probe_manifest(MASTER_URL, pages.__getitem__) == (1080, int(5600000 / 8 * 16.5))
+    dash = probe_manifest("https://cdn.example/vod/abc/manifest.mpd", lambda url: fixture("manifest.mpd"))
+    assert dash == (1080, int((4800000 + 128000) / 8 * 3723.5))
@@ -1,10 +1,13 @@
 from rich.console import Console
 from rich.progress import BarColumn, Progress, TextColumn
-from pathlib import Path
+import threading
+
+from logs import DEBUG, ERROR, INFO, WARNING, get_logs
+from progress import ProgressAggregator, Snapshot
 
 
 class UI:
-    def __init__(self, log_path: str = "downloader.log"):
+    def __init__(self, level: int = INFO, progress_interval: float = 0.5):
         self.console = Console()
         self.phase = ""
         self.progress = Progress(
@@ -17,26 +20,49 @@ class UI:
         )
         self.progress.start()
         self.tasks = {}
-        self.log_path = Path(log_path).resolve()
-        self.log_file = self.log_path.open("w", encoding="utf-8")
-        self.console.log(f"Logging to {self.log_path}")
+        self._lock = threading.Lock()
+        self.aggregator = ProgressAggregator(self._render, progress_interval)
+        # printing and file writes happen on the log pipeline's threads
+        self.logs = get_logs()
+        self.logs.set_console(self.console.log, level)
+        self.log_path = self.logs.path
+        self.log(f"Logging to {self.log_path}")
 
     def set_phase(self, phase):
         self.phase = phase
         self.log(f"[bold blue]Phase:[/bold blue] {phase}")
 
-    def log(self, msg):
-        self.console.log(msg)
-        self.log_file.write(str(msg) + "\n")
-        self.log_file.flush()
+    def log(self, msg, level: int = INFO):
+        self.logs.emit(level, msg)
+
+    def debug(self, msg):
+        self.log(msg, DEBUG)
+
+    def warning(self, msg):
+        self.log(f"[yellow]{msg}[/yellow]", WARNING)
 
-    def update_progress(self, name, percent, speed=None, eta=None):
-        task = self.tasks.get(name)
+    def error(self, msg):
+        self.log(f"[red]{msg}[/red]", ERROR)
+
+    def update_progress(self, name, done, total=None, finished=False):
+        self.aggregator.update(name, done, total, finished)
+
+    def _show(self, snap: Snapshot):
+        task = self.tasks.get(snap.name)
         if task is None:
-            task = self.progress.add_task(name, total=100, speed="", eta="")
-            self.tasks[name] = task
-        self.progress.update(task, completed=percent, speed=speed or "", eta=eta or "")
+            task = self.progress.add_task(snap.name, total=100, speed="", eta="")
+            self.tasks[snap.name] = task
+        self.progress.update(task, completed=snap.percent, speed=snap.speed_str(), eta=snap.eta_str())
+
+    def _render(self, snaps, total: Snapshot):
+        # called by the aggregator a few times a second
+        with self._lock:
+            for snap in snaps:
+                self._show(snap)
+            if len(snaps) > 1:
+                self._show(total)
 
     def close(self):
+        self.aggregator.close()
+        self.logs.close()
         self.progress.stop()
-        self.log_file.close()
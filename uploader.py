@@ -0,0 +1,219 @@
+"""Resumable WebDAV uploads for Koofr.
+
+Servers that advertise SabreDAV partial updates (``DAV: sabredav-partialupdate``)
+receive the file in chunks: the file is written to ``<name>.part`` with
+``PATCH``/``X-Update-Range`` requests, several chunks in parallel, and moved
+into place once complete. The contiguous range confirmed by the server is
+kept in a ``.upload`` file next to the local file, so an interrupted upload
+resumes from there. Other servers get one streaming ``PUT``. Either way every
+request is retried with exponential backoff and progress is reported through
+``ui.update_progress``.
+"""
+
+from __future__ import annotations
+
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Callable, Optional
+
+from progress import MB, format_rate
+
+
+class _Progress:
+    def __init__(self, ui, name: str, total: int, done: int = 0):
+        self.ui = ui
+        self.name = name
+        self.total = max(total, 1)
+        self.done = done
+        self.sent = 0
+        self._lock = threading.Lock()
+
+    def add(self, n: int) -> None:
+        with self._lock:
+            self.done += n
+            self.sent += n
+            done = self.done
+        # the UI's aggregator coalesces these and computes speed and ETA
+        self.ui.update_progress(self.name, done, self.total, finished=done >= self.total)
+
+    def restart(self) -> None:
+        """Forget the bytes of a failed attempt that is sent again from 0."""
+        with self._lock:
+            self.done = 0
+
+
+class _ProgressReader:
+    """File wrapper with a known length that reports what has been read."""
+
+    def __init__(self, path: str, progress: _Progress):
+        self._f = open(path, "rb")
+        self._len = os.path.getsize(path)
+        self._progress = progress
+
+    def __len__(self) -> int:
+        return self._len
+
+    def read(self, n: int = -1) -> bytes:
+        data = self._f.read(n)
+        self._progress.add(len(data))
+        return data
+
+    def close(self) -> None:
+        self._f.close()
+
+
+class UploadError(RuntimeError):
+    pass
+
+
+class WebDAVUploader:
+    def __init__(
+        self,
+        client,
+        auth,
+        chunk_size: int = 32 * MB,
+        workers: int = 2,
+        retries: int = 5,
+        backoff: float = 1.0,
+    ):
+        self.client = client
+        self.auth = auth
+        self.chunk_size = chunk_size
+        self.workers = max(1, workers)
+        self.retries = retries
+        self.backoff = backoff
+
+    def _call(self, method: str, url: str, ok=(200, 201, 204), body: Optional[Callable] = None, **kwargs):
+        """Send a request, retrying network errors and 5xx with backoff.
+
+        ``body`` is called per attempt to produce fresh request data.
+        """
+        last: Optional[BaseException] = None
+        for attempt in range(self.retries + 1):
+            if attempt:
+                time.sleep(self.backoff * 2 ** (attempt - 1))
+            data = body() if body else None
+            try:
+                resp = self.client.request(method, url, data=data, auth=self.auth, timeout=120, **kwargs)
+            except Exception as e:
+                last = e
+                continue
+            finally:
+                if hasattr(data, "close"):
+                    data.close()
+            if resp.status_code in ok:
+                return resp
+            last = UploadError(f"{method} {url}: HTTP {resp.status_code}")
+            if resp.status_code < 500 and resp.status_code not in (408, 429):
+                break
+        raise last
+
+    def remote_size(self, url: str) -> Optional[int]:
+        resp = self._call("HEAD", url, ok=(200, 404))
+        if resp.status_code == 404:
+            return None
+        return int(resp.headers.get("Content-Length") or 0)
+
+    def supports_partial(self, url: str) -> bool:
+        try:
+            resp = self._call("OPTIONS", url, ok=(200, 204))
+        except Exception:
+            return False
+        return "sabredav-partialupdate" in resp.headers.get("DAV", "").lower()
+
+    def upload(self, local_path: str, url: str, ui) -> None:
+        size = os.path.getsize(local_path)
+        name = Path(local_path).name
+        if self.remote_size(url) == size:
+            ui.log(f"{name} ist bereits vollständig hochgeladen")
+            _sidecar(local_path).unlink(missing_ok=True)
+            return
+        start = time.monotonic()
+        if self.supports_partial(url):
+            sent = self._upload_chunked(local_path, url, size, ui)
+        else:
+            progress = _Progress(ui, f"Upload {name}", size)
+
+            def body():
+                progress.restart()
+                return _ProgressReader(local_path, progress)
+
+            self._call("PUT", url, body=body)
+            sent = progress.sent
+        elapsed = max(time.monotonic() - start, 1e-6)
+        ui.log(f"Upload {name}: {sent / MB:.1f} MiB in {elapsed:.1f}s ({format_rate(sent / elapsed)})")
+
+    def _upload_chunked(self, local_path: str, url: str, size: int, ui) -> int:
+        part = url + ".part"
+        state = _load_state(local_path, part, size)
+        offset = state.get("offset", 0)
+        if offset and self.remote_size(part) is None:
+            offset = 0
+        if offset == 0:
+            self._call("PUT", part, body=lambda: b"")
+        elif offset < size:
+            ui.log(f"Setze Upload bei {offset / MB:.1f} MiB fort")
+
+        progress = _Progress(ui, f"Upload {Path(local_path).name}", size, done=offset)
+        chunks = [(o, min(self.chunk_size, size - o)) for o in range(offset, size, self.chunk_size)]
+        finished: set[int] = set()
+        lock = threading.Lock()
+        confirmed = [offset]
+
+        def send(chunk):
+            start, length = chunk
+
+            def body():
+                with open(local_path, "rb") as f:
+                    f.seek(start)
+                    return f.read(length)
+
+            self._call(
+                "PATCH",
+                part,
+                body=body,
+                headers={
+                    "Content-Type": "application/x-sabredav-partialupdate",
+                    "X-Update-Range": f"bytes={start}-{start + length - 1}",
+                },
+            )
+            progress.add(length)
+            with lock:
+                finished.add(start)
+                # only the contiguous prefix counts as confirmed, chunks
+                # sent in parallel may complete out of order
+                while confirmed[0] in finished:
+                    confirmed[0] = min(confirmed[0] + self.chunk_size, size)
+                _save_state(local_path, part, size, confirmed[0])
+
+        with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="upload") as ex:
+            for fut in [ex.submit(send, c) for c in chunks]:
+                fut.result()
+
+        self._call("MOVE", part, headers={"Destination": url, "Overwrite": "T"})
+        _sidecar(local_path).unlink(missing_ok=True)
+        return progress.sent
+
+
+def _sidecar(local_path: str) -> Path:
+    return Path(local_path + ".upload")
+
+
+def _load_state(local_path: str, url: str, size: int) -> dict:
+    try:
+        state = json.loads(_sidecar(local_path).read_text())
+    except (OSError, ValueError):
+        return {}
+    mtime = os.path.getmtime(local_path)
+    if state.get("url") != url or state.get("size") != size or state.get("mtime") != mtime:
+        return {}
+    return state
+
+
+def _save_state(local_path: str, url: str, size: int, offset: int) -> None:
+    state = {"url": url, "size": size, "mtime": os.path.getmtime(local_path), "offset": offset}
+    _sidecar(local_path).write_text(json.dumps(state))
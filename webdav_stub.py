@@ -0,0 +1,157 @@
+#!/usr/bin/env python3
+"""Minimal local WebDAV server standing in for Koofr.
+
+Supports the subset used by the uploader: ``OPTIONS``, ``HEAD``, ``GET``,
+``PUT``, ``PATCH`` with SabreDAV's ``X-Update-Range``, ``MOVE``, ``DELETE``
+and ``MKCOL``. Partial-update support can be switched off and a failure rate
+can be set to exercise the retry and resume logic.
+
+Run with: ``python webdav_stub.py --root /tmp/dav --port 8081`` and point
+``KOOFR_DAV_URL`` at ``http://127.0.0.1:8081``.
+"""
+
+from __future__ import annotations
+
+import argparse
+import random
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from urllib.parse import unquote, urlsplit
+
+
+class DavHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    server: "DavServer"
+
+    def log_message(self, *args) -> None:
+        pass
+
+    def _path(self, url: str) -> Path:
+        rel = unquote(urlsplit(url).path).lstrip("/")
+        path = (self.server.root / rel).resolve()
+        if not str(path).startswith(str(self.server.root)):
+            raise PermissionError(url)
+        return path
+
+    def _reply(self, code: int, body: bytes = b"", headers: dict | None = None) -> None:
+        self.send_response(code)
+        for k, v in (headers or {}).items():
+            self.send_header(k, v)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        if body and self.command != "HEAD":
+            self.wfile.write(body)
+
+    def _body(self) -> bytes:
+        return self.rfile.read(int(self.headers.get("Content-Length") or 0))
+
+    def _flaky(self) -> bool:
+        """Drop the connection for a random share of uploads."""
+        if random.random() < self.server.fail_rate:
+            self._body()
+            self.close_connection = True
+            self._reply(503)
+            return True
+        return False
+
+    def do_OPTIONS(self) -> None:
+        dav = "1, 2, sabredav-partialupdate" if self.server.partial else "1, 2"
+        self._reply(200, headers={"DAV": dav, "Allow": "OPTIONS, HEAD, GET, PUT, PATCH, MOVE, DELETE, MKCOL"})
+
+    def do_HEAD(self) -> None:
+        path = self._path(self.path)
+        if not path.is_file():
+            return self._reply(404)
+        self.send_response(200)
+        self.send_header("Content-Length", str(path.stat().st_size))
+        self.end_headers()
+
+    def do_GET(self) -> None:
+        path = self._path(self.path)
+        if not path.is_file():
+            return self._reply(404)
+        self._reply(200, path.read_bytes())
+
+    def do_PUT(self) -> None:
+        if self._flaky():
+            return
+        path = self._path(self.path)
+        data = self._body()
+        path.parent.mkdir(parents=True, exist_ok=True)
+        existed = path.exists()
+        with self.server.lock:
+            path.write_bytes(data)
+        self._reply(204 if existed else 201)
+
+    def do_PATCH(self) -> None:
+        if not self.server.partial:
+            return self._reply(405)
+        if self._flaky():
+            return
+        path = self._path(self.path)
+        rng = self.headers.get("X-Update-Range", "")
+        data = self._body()
+        if not path.is_file() or not rng.startswith("bytes="):
+            return self._reply(400)
+        start = int(rng[6:].split("-")[0])
+        with self.server.lock, path.open("r+b") as f:
+            f.seek(start)
+            f.write(data)
+        self._reply(204)
+
+    def do_MOVE(self) -> None:
+        src = self._path(self.path)
+        dst = self._path(self.headers.get("Destination", ""))
+        if not src.exists():
+            return self._reply(404)
+        existed = dst.exists()
+        dst.parent.mkdir(parents=True, exist_ok=True)
+        src.replace(dst)
+        self._reply(204 if existed else 201)
+
+    def do_DELETE(self) -> None:
+        path = self._path(self.path)
+        if not path.exists():
+            return self._reply(404)
+        path.unlink()
+        self._reply(204)
+
+    def do_MKCOL(self) -> None:
+        self._path(self.path).mkdir(parents=True, exist_ok=True)
+        self._reply(201)
+
+
+class DavServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, addr, root: str, partial: bool = True, fail_rate: float = 0.0):
+        super().__init__(addr, DavHandler)
+        self.root = Path(root).resolve()
+        self.root.mkdir(parents=True, exist_ok=True)
+        self.partial = partial
+        self.fail_rate = fail_rate
+        self.lock = threading.Lock()
+
+
+def serve(root: str, port: int = 0, partial: bool = True, fail_rate: float = 0.0) -> DavServer:
+    """Start a stub server in a background thread and return it."""
+    server = DavServer(("127.0.0.1", port), root, partial, fail_rate)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Lokaler WebDAV-Stub")
+    parser.add_argument("--root", default="dav-root")
+    parser.add_argument("--port", type=int, default=8081)
+    parser.add_argument("--no-partial", action="store_true", help="keine Teil-Uploads anbieten")
+    parser.add_argument("--fail-rate", type=float, default=0.0, help="Anteil fehlschlagender Uploads")
+    args = parser.parse_args()
+    server = DavServer(("127.0.0.1", args.port), args.root, not args.no_partial, args.fail_rate)
+    print(f"WebDAV-Stub auf http://127.0.0.1:{args.port} ({server.root})")
+    server.serve_forever()
+
+
+if __name__ == "__main__":
+    main()